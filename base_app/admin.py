@@ -1,3 +1,60 @@
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
+
+from .models import PerfilCapturado
 
 # Register your models here.
+
+
+@admin.register(PerfilCapturado)
+class PerfilCapturadoAdmin(admin.ModelAdmin):
+	"""
+	Perfiles capturados con PERFILADO (los más recientes primero), con sus
+	funciones más costosas y las consultas SQL con su plan.
+	"""
+	list_display = ('id', 'fecha', 'metodo', 'ruta', 'estado', 'duracion_ms', 'num_consultas', 'sql_ms', 'funcion_principal', 'consulta_mas_lenta')
+	list_filter = ('metodo', 'motor', 'fecha')
+	search_fields = ('ruta', 'usuario')
+	ordering = ('-fecha',)
+	exclude = ('funciones', 'consultas')
+	readonly_fields = (
+		'fecha', 'metodo', 'ruta', 'usuario', 'estado', 'duracion_ms', 'motor', 'archivo',
+		'num_consultas', 'sql_ms', 'tabla_funciones', 'tabla_consultas',
+	)
+
+	def has_add_permission(self, request):
+		return False
+
+	def has_change_permission(self, request, obj=None):
+		return False
+
+	@admin.display(description='función más costosa')
+	def funcion_principal(self, obj):
+		# las primeras son del manejador de Django: se muestra la más costosa del proyecto
+		fila = next((f for f in obj.funciones if f.get('propia')), obj.funciones[0] if obj.funciones else None)
+		return f"{fila['funcion']} ({fila['acumulado_ms']:.0f} ms)" if fila else '-'
+
+	@admin.display(description='consulta más lenta')
+	def consulta_mas_lenta(self, obj):
+		if not obj.consultas:
+			return '-'
+		consulta = max(obj.consultas, key=lambda c: c['ms'])
+		return f"{consulta['ms']:.1f} ms: {consulta['sql'][:80]}"
+
+	@admin.display(description='funciones')
+	def tabla_funciones(self, obj):
+		return format_html(
+			'<table><tr><th>función</th><th>llamadas</th><th>propio (ms)</th><th>acumulado (ms)</th></tr>{}</table>',
+			format_html_join('', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>', (
+				(f['funcion'], f['llamadas'], f['propio_ms'], f['acumulado_ms']) for f in obj.funciones
+			)),
+		)
+
+	@admin.display(description='consultas')
+	def tabla_consultas(self, obj):
+		return format_html(
+			'<table><tr><th>base</th><th>ms</th><th>SQL</th><th>plan</th></tr>{}</table>',
+			format_html_join('', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td><td><pre>{}</pre></td></tr>', (
+				(c['alias'], c['ms'], c['sql'], '\n'.join(c.get('plan') or [])) for c in obj.consultas
+			)),
+		)
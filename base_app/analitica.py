@@ -0,0 +1,207 @@
+import functools
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import FileResponse, StreamingHttpResponse
+
+try:
+    import fcntl
+except ImportError:  # Windows: sólo se evitan las copias simultáneas dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ALIAS = 'analitica'
+
+# lecturas de la petición en curso dirigidas a la copia de analítica
+_en_analitica: ContextVar[bool] = ContextVar('en_analitica', default=False)
+
+_hilo = None
+_hilo_lock = threading.Lock()
+_refresco_lock = threading.Lock()
+
+
+def _ruta() -> Optional[Path]:
+    ruta = getattr(settings, 'ANALITICA_DB', None)
+    return Path(ruta) if ruta and ALIAS in settings.DATABASES else None
+
+
+def configurada() -> bool:
+    return _ruta() is not None
+
+
+def antiguedad() -> Optional[float]:
+    """
+    Segundos desde el último refresco de la copia (None si no existe).
+    """
+    ruta = _ruta()
+    try:
+        return time.time() - ruta.stat().st_mtime if ruta else None
+    except FileNotFoundError:
+        return None
+
+
+def disponible() -> bool:
+    """
+    La copia existe y no supera ANALITICA_MAX_SEGUNDOS de antigüedad.
+    """
+    edad = antiguedad()
+    return edad is not None and edad <= getattr(settings, 'ANALITICA_MAX_SEGUNDOS', 300)
+
+
+@contextmanager
+def _bloqueo(ruta: Path) -> Iterator[bool]:
+    """
+    Lock no bloqueante entre procesos (flock sobre `<copia>.lock`): indica si
+    este proceso es el único que refresca. El sistema lo suelta si el proceso
+    muere a mitad de copia.
+    """
+    if not _refresco_lock.acquire(blocking=False):
+        yield False
+        return
+    try:
+        if fcntl is None:
+            yield True
+            return
+        with open(ruta.with_name(ruta.name + '.lock'), 'a') as fichero:
+            try:
+                fcntl.flock(fichero, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+    finally:
+        _refresco_lock.release()
+
+
+def refrescar(max_antiguedad: Optional[float] = None) -> Optional[float]:
+    """
+    Copia la base principal con la API de backup de SQLite a un fichero
+    temporal y lo sustituye de forma atómica: las conexiones abiertas siguen
+    leyendo la copia anterior y las nuevas ven la nueva. La principal va en
+    modo WAL (settings), así que la copia sólo abre una transacción de lectura
+    y no bloquea a los escritores.
+
+    Sólo copia un proceso a la vez: si otro worker está copiando no se hace
+    nada, y con `max_antiguedad` tampoco si la copia actual es más reciente.
+    Devuelve la duración en segundos, o None si no se copió.
+    """
+    ruta = _ruta()
+    principal = connections[DEFAULT_DB_ALIAS]
+    if ruta is None or principal.is_in_memory_db():
+        return None
+    with _bloqueo(ruta) as unico:
+        if not unico:
+            return None
+        edad = antiguedad()
+        if max_antiguedad is not None and edad is not None and edad < max_antiguedad:
+            return None
+        inicio = time.perf_counter()
+        # temporal en el mismo directorio, para que os.replace sea atómico
+        fd, temporal = tempfile.mkstemp(prefix=ruta.name + '.', suffix='.tmp', dir=ruta.parent)
+        os.close(fd)
+        try:
+            origen = sqlite3.connect(str(principal.settings_dict['NAME']))
+            destino = sqlite3.connect(temporal)
+            try:
+                origen.backup(destino)
+                # la copia se abre en solo lectura (mode=ro), que no puede crear
+                # los ficheros -wal/-shm: se deja con journal clásico
+                destino.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                destino.close()
+                origen.close()
+            os.replace(temporal, ruta)
+        except BaseException:
+            os.unlink(temporal)
+            raise
+    return time.perf_counter() - inicio
+
+
+def _bucle(intervalo: float):
+    while True:
+        try:
+            # los hilos de todos los workers comparten la copia: basta uno por intervalo
+            refrescar(max_antiguedad=intervalo)
+        except Exception:
+            logger.exception("Error refrescando la base de analítica")
+        time.sleep(intervalo)
+
+
+def iniciar_refresco():
+    """
+    Arranca (una vez por proceso) el hilo que refresca la copia cada
+    ANALITICA_REFRESCO_SEGUNDOS. Con 0 el refresco queda a cargo de
+    `manage.py refrescar_analitica`.
+    """
+    global _hilo
+    intervalo = getattr(settings, 'ANALITICA_REFRESCO_SEGUNDOS', 60)
+    if _ruta() is None or not intervalo or intervalo <= 0:
+        return
+    with _hilo_lock:
+        if _hilo is not None and _hilo.is_alive():
+            return
+        _hilo = threading.Thread(target=_bucle, args=(intervalo,), name='refresco-analitica', daemon=True)
+        _hilo.start()
+
+
+def _iterar(contenido):
+    token = _en_analitica.set(True)
+    try:
+        yield from contenido
+    finally:
+        _en_analitica.reset(token)
+
+
+def lectura_analitica(vista):
+    """
+    Dirige las lecturas de la vista a la copia de analítica si está al día
+    (ANALITICA_MAX_SEGUNDOS); si no, a la base principal. En respuestas en
+    streaming el contenido, que se genera después de la vista, también se lee
+    de la copia.
+    """
+    @functools.wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        iniciar_refresco()
+        if not disponible():
+            return vista(request, *args, **kwargs)
+        token = _en_analitica.set(True)
+        try:
+            respuesta = vista(request, *args, **kwargs)
+        finally:
+            _en_analitica.reset(token)
+        # un FileResponse ya está generado; sólo los generadores leen después
+        if isinstance(respuesta, StreamingHttpResponse) and not isinstance(respuesta, FileResponse) and not respuesta.is_async:
+            respuesta.streaming_content = _iterar(respuesta.streaming_content)
+        return respuesta
+    return envoltura
+
+
+class AnaliticaRouter:
+    """
+    Envía a la copia de analítica las lecturas de las vistas marcadas con
+    `lectura_analitica`; las escrituras y el resto de lecturas van a la
+    principal. La copia nunca se migra: es un duplicado de la principal.
+    """
+
+    def db_for_read(self, model, **hints):
+        return ALIAS if _en_analitica.get() else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == ALIAS else None
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BaseAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base_app'
+
+    def ready(self):
+        from . import checks  # noqa: F401  (registra los checks del proyecto)
+        from .shards import preparar_shard
+        post_migrate.connect(preparar_shard, sender=self)
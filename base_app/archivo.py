@@ -0,0 +1,201 @@
+import re
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Union
+
+from django.db import connections, models, router
+from django.utils import timezone
+
+from .models import VisiblesManager
+from .shards import atomico
+
+# filas movidas por transacción (límite de variables de SQLite en el IN)
+LOTE_ARCHIVO = 500
+
+Limite = Optional[Union[date, datetime]]
+
+# modelos con tablas de archivo: las ventas y compras (`manage.py archivar`) y
+# los eventos de venta, que se archivan junto a la venta en que se compactaron
+MODELOS_ARCHIVO = ('venta.Venta', 'venta.EventoVenta', 'compra.Compra')
+
+_modelos = {}
+_lock = threading.Lock()
+
+
+def tabla_archivo(modelo, ano: int) -> str:
+    return f"{modelo._meta.db_table}_archivo_{ano}"
+
+
+def modelo_archivo(modelo, ano: int):
+    """
+    Modelo no gestionado (sin migraciones) sobre la tabla de archivo del año,
+    con las mismas columnas que `modelo`: admite los mismos filtros
+    (`producto__tienda_id`, `fecha_creacion__gte`...) y uniones con él.
+    Se crea una vez por proceso.
+    """
+    clave = (modelo._meta.label, ano)
+    with _lock:
+        if clave in _modelos:
+            return _modelos[clave]
+        tabla = tabla_archivo(modelo, ano)
+        atributos = {'__module__': modelo.__module__}
+        for campo in modelo._meta.concrete_fields:
+            if campo.is_relation:
+                # sin restricción ni relación inversa: archivar no debe frenar ni
+                # encarecer el borrado de productos
+                atributos[campo.name] = models.ForeignKey(
+                    campo.related_model, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+                )
+            else:
+                atributos[campo.name] = campo.clone()
+        # como en la tabla viva: `visibles` oculta las filas de productos pendientes de borrado
+        atributos['objects'] = models.Manager()
+        atributos['visibles'] = VisiblesManager('producto__eliminado')
+        atributos['Meta'] = type('Meta', (), {
+            'app_label': modelo._meta.app_label,
+            'db_table': tabla,
+            'managed': False,
+            'indexes': [
+                models.Index(fields=['fecha_creacion'], name=f'{tabla}_fecha'),
+                models.Index(fields=['producto', 'fecha_creacion'], name=f'{tabla}_prod'),
+            ],
+        })
+        _modelos[clave] = type(f"{modelo.__name__}Archivo{ano}", (models.Model,), atributos)
+        return _modelos[clave]
+
+
+def anos_archivados(modelo) -> List[int]:
+    patron = re.compile(rf"^{re.escape(modelo._meta.db_table)}_archivo_(\d{{4}})$")
+    conexion = connections[router.db_for_read(modelo)]
+    with conexion.cursor() as cursor:
+        tablas = conexion.introspection.table_names(cursor)
+    return sorted(int(m.group(1)) for m in map(patron.match, tablas) if m)
+
+
+def _ano(limite: Limite) -> Optional[int]:
+    if limite is None:
+        return None
+    if isinstance(limite, datetime):
+        return timezone.localtime(limite).year if timezone.is_aware(limite) else limite.year
+    return limite.year
+
+
+def querysets(modelo, desde: Limite = None, hasta: Limite = None) -> list:
+    """
+    Querysets (tabla viva primero) que pueden contener filas entre `desde` y
+    `hasta`: las tablas de archivo sólo se incluyen si el rango alcanza su año,
+    así que las consultas recientes tocan únicamente la tabla viva.
+    Aplicar los filtros a cada queryset y combinar con `unir` o sumando.
+    Son de lectura: no incluyen las filas de productos pendientes de borrado.
+    """
+    primero, ultimo = _ano(desde), _ano(hasta)
+    resultado = [modelo.visibles.all()]
+    for ano in anos_archivados(modelo):
+        if (primero is None or ano >= primero) and (ultimo is None or ano <= ultimo):
+            resultado.append(modelo_archivo(modelo, ano).visibles.all())
+    return resultado
+
+
+def unir(qs_list: list):
+    """
+    UNION ALL de querysets ya filtrados (mismas columnas), que admite
+    order_by, count y slicing (paginación).
+    """
+    primero, *resto = qs_list
+    return primero.union(*resto, all=True) if resto else primero
+
+
+def sumar(qs_list: list, **agregados) -> dict:
+    """
+    `aggregate(**agregados)` sobre cada queryset, sumando los resultados
+    (agregados aditivos: Sum, Count).
+    """
+    totales = {}
+    for qs in qs_list:
+        for nombre, valor in qs.aggregate(**agregados).items():
+            if valor is not None:
+                totales[nombre] = totales.get(nombre, 0) + valor
+    return {nombre: totales.get(nombre) for nombre in agregados}
+
+
+def _asegurar_tabla(modelo, ano: int):
+    if ano in anos_archivados(modelo):
+        return
+    with connections[router.db_for_write(modelo)].schema_editor() as editor:
+        editor.create_model(modelo_archivo(modelo, ano))
+
+
+def _dependientes(modelo) -> list:
+    """
+    Relaciones inversas con CASCADE (p.ej. EventoVenta.venta): sus filas se
+    archivan con las de `modelo` en vez de borrarse.
+    """
+    return [r for r in modelo._meta.related_objects if r.on_delete is models.CASCADE and not r.many_to_many]
+
+
+def _mover(conexion, modelo, ano: int, columna: str, pks: list):
+    """Copia a la tabla de archivo del año las filas con `columna` IN pks y las borra."""
+    q = conexion.ops.quote_name
+    columnas = ', '.join(q(f.column) for f in modelo._meta.concrete_fields)
+    origen, destino = q(modelo._meta.db_table), q(tabla_archivo(modelo, ano))
+    marcas = ', '.join(['%s'] * len(pks))
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {destino} ({columnas}) SELECT {columnas} FROM {origen} WHERE {q(columna)} IN ({marcas})", pks,
+        )
+        cursor.execute(f"DELETE FROM {origen} WHERE {q(columna)} IN ({marcas})", pks)
+
+
+def archivar(modelo, antes: datetime, lote: int = LOTE_ARCHIVO) -> Dict[int, int]:
+    """
+    Mueve por lotes las filas de `modelo` anteriores a `antes` a su tabla de
+    archivo por año (según la fecha local), creándola si no existe. Cada lote
+    se copia (INSERT ... SELECT) y se borra con un DELETE directo en una
+    transacción. Las filas que dependen de él con CASCADE (los eventos de una
+    venta) no se borran: pasan a su propia tabla de archivo del mismo año.
+    Devuelve las filas archivadas por año.
+    """
+    conexion = connections[router.db_for_write(modelo)]
+    clave = modelo._meta.pk.column
+    dependientes = _dependientes(modelo)
+    movidas = defaultdict(int)
+    while True:
+        filas = list(
+            modelo.objects.filter(fecha_creacion__lt=antes).order_by('pk').values_list('pk', 'fecha_creacion')[:lote]
+        )
+        if not filas:
+            return dict(movidas)
+        por_ano = defaultdict(list)
+        for pk, fecha in filas:
+            por_ano[timezone.localtime(fecha).year].append(pk)
+        # el editor de esquema de SQLite no puede usarse dentro de una transacción
+        for ano in por_ano:
+            for archivado in [modelo] + [r.related_model for r in dependientes]:
+                _asegurar_tabla(archivado, ano)
+        with atomico():
+            for ano, pks in por_ano.items():
+                # primero los dependientes: su clave foránea apunta a estas filas
+                for relacion in dependientes:
+                    _mover(conexion, relacion.related_model, ano, relacion.field.column, pks)
+                _mover(conexion, modelo, ano, clave, pks)
+                movidas[ano] += len(pks)
+
+
+def filtrar_por_fecha(modelo, dia: Optional[int] = None, mes: Optional[int] = None, ano: Optional[int] = None,
+                      *, select_related=(), **filtros):
+    """
+    Filas de `modelo` con `filtros` y los filtros de día/mes/año de los
+    listados. Con `ano` sólo se consulta el archivo de ese año (si existe);
+    sin él, todos. `select_related` se aplica a cada parte de la unión.
+    """
+    if dia is not None:
+        filtros['fecha_creacion__day'] = dia
+    if mes is not None:
+        filtros['fecha_creacion__month'] = mes
+    if ano is not None:
+        filtros['fecha_creacion__year'] = ano
+        rango = (date(ano, 1, 1), date(ano, 12, 31))
+    else:
+        rango = (None, None)
+    return unir([qs.select_related(*select_related).filter(**filtros) for qs in querysets(modelo, *rango)])
@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+from django.conf import settings
+
+# dependencias pesadas que sólo deben cargarse cuando se usan
+PEREZOSOS = ('numpy', 'PIL', 'openpyxl', 'pyinstrument')
+
+# qué se carga en cada fase, en un proceso nuevo
+FASES = {
+    # django.setup(): settings, modelos y admin (lo que paga cada `manage.py`)
+    'setup': "import django; django.setup()",
+    # la aplicación WSGI con sus middlewares (arranque de un worker)
+    'wsgi': "from django.core.wsgi import get_wsgi_application; get_wsgi_application()",
+    # además las URLs con todos los routers de la API (primera petición)
+    'urls': (
+        "from django.core.wsgi import get_wsgi_application; get_wsgi_application(); "
+        "from django.urls import get_resolver; get_resolver().url_patterns"
+    ),
+}
+
+_SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+{codigo}
+print(json.dumps({{'segundos': time.perf_counter() - inicio, 'modulos': sorted(sys.modules)}}))
+"""
+
+
+def _importaciones(stderr: str) -> List[dict]:
+    # líneas de `-X importtime`: "import time: propio | acumulado | modulo", con
+    # el módulo sangrado dos espacios por nivel de anidamiento
+    filas = []
+    for linea in stderr.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, modulo = linea[len('import time:'):].split('|')
+        nivel = (len(modulo) - len(modulo.lstrip()) - 1) // 2
+        filas.append({'modulo': modulo.strip(), 'nivel': nivel, 'propio_us': int(propio), 'acumulado_us': int(acumulado)})
+    return filas
+
+
+def medir_arranque(fase: str = 'wsgi') -> dict:
+    """
+    Carga la fase en un intérprete nuevo con `-X importtime` y devuelve los
+    segundos que tardó, el tiempo de importación de cada módulo, su suma
+    (`importacion_segundos`, menos sensible al ruido de la máquina que el
+    reloj) y los módulos cargados al terminar.
+    """
+    entorno = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _SCRIPT.format(codigo=FASES[fase])],
+        cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+    )
+    if proceso.returncode:
+        raise RuntimeError(f"No se pudo cargar la fase {fase}:\n{proceso.stderr[-2000:]}")
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    resultado['importaciones'] = _importaciones(proceso.stderr)
+    # el acumulado de cada importación de primer nivel ya incluye sus anidadas
+    resultado['importacion_segundos'] = sum(f['acumulado_us'] for f in resultado['importaciones'] if f['nivel'] == 0) / 1e6
+    return resultado
+
+
+def por_paquete(importaciones: List[dict]) -> Dict[str, int]:
+    """
+    Microsegundos propios de importación sumados por paquete de primer nivel.
+    """
+    totales = defaultdict(int)
+    for fila in importaciones:
+        totales[fila['modulo'].split('.')[0]] += fila['propio_us']
+    return dict(sorted(totales.items(), key=lambda item: item[1], reverse=True))
+
+
+def perezosos_cargados(modulos: List[str]) -> List[str]:
+    return [nombre for nombre in PEREZOSOS if nombre in modulos]
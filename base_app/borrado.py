@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import List, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from producto.pronostico import invalidar_pronostico
+from .archivo import MODELOS_ARCHIVO, anos_archivados, modelo_archivo
+from .models import TareaBorrado
+from .shards import TABLAS_TIENDA, actual, atomico, usar_shard
+from .sincronizacion import registrar_eliminaciones
+
+logger = logging.getLogger(__name__)
+
+# filas borradas por transacción (límite de variables de SQLite en el IN)
+LOTE_BORRADO = 500
+
+# una tarea en curso cuyo borrador no avanza en este tiempo puede reclamarla otro
+RECLAMO_CADUCA = timedelta(minutes=5)
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def borrar_tienda(tienda) -> TareaBorrado:
+    """
+    Marca la tienda y sus productos como eliminados (dejan de verse al
+    instante) y encola el borrado de sus filas. Dos UPDATE, sin cargar nada.
+    """
+    Tienda = type(tienda)
+    Producto = apps.get_model('producto', 'Producto')
+    with transaction.atomic():
+        Tienda._base_manager.using(DEFAULT_DB_ALIAS).filter(pk=tienda.pk).update(eliminado=True)
+        registrar_eliminaciones('tienda', [(tienda.pk, tienda.pk)])
+        tarea = TareaBorrado.objects.create(modelo='tienda', objeto_id=tienda.pk, tienda_id=tienda.pk, shard=tienda.shard)
+        with usar_shard(tienda.shard), atomico():
+            if tienda.shard:
+                Tienda._base_manager.using(tienda.shard).filter(pk=tienda.pk).update(eliminado=True)
+            Producto._base_manager.filter(tienda_id=tienda.pk).update(eliminado=True)
+        transaction.on_commit(iniciar_borrador)
+    return tarea
+
+
+def borrar_producto(producto) -> TareaBorrado:
+    """
+    Marca el producto como eliminado (con sus ventas y compras deja de verse
+    al instante) y encola el borrado de sus filas. Llamar en el shard del producto.
+    """
+    shard = actual()
+    with transaction.atomic(), atomico():
+        type(producto)._base_manager.filter(pk=producto.pk).update(eliminado=True)
+        registrar_eliminaciones('producto', [(producto.pk, producto.tienda_id)])
+        # sus ventas dejan de contar en el pronóstico y el heatmap
+        invalidar_pronostico([producto.tienda_id])
+        tarea = TareaBorrado.objects.create(
+            modelo='producto', objeto_id=producto.pk, tienda_id=producto.tienda_id,
+            shard='' if shard == DEFAULT_DB_ALIAS else shard,
+        )
+        transaction.on_commit(iniciar_borrador)
+    return tarea
+
+
+def _pasos(tarea: TareaBorrado) -> List[Tuple[object, str, int]]:
+    """
+    (modelo, filtro, valor) a borrar en orden: primero las tablas de archivo
+    y los dependientes (los eventos antes que las ventas que enlazan) y al final
+    los productos.
+    """
+    if tarea.modelo == 'tienda':
+        filtro, valor = 'producto__tienda_id', tarea.tienda_id
+        final = (apps.get_model('producto', 'Producto'), 'tienda_id', tarea.tienda_id)
+    else:
+        filtro, valor = 'producto_id', tarea.objeto_id
+        final = (apps.get_model('producto', 'Producto'), 'pk', tarea.objeto_id)
+    pasos = []
+    for etiqueta in MODELOS_ARCHIVO:
+        modelo = apps.get_model(etiqueta)
+        pasos += [(modelo_archivo(modelo, ano), filtro, valor) for ano in anos_archivados(modelo)]
+    pasos += [(apps.get_model(etiqueta), filtro, valor) for etiqueta, _filtro in reversed(TABLAS_TIENDA[1:])]
+    return pasos + [final]
+
+
+def _borrar(modelo, alias: str, pks: list) -> int:
+    conexion = connections[alias]
+    q = conexion.ops.quote_name
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {q(modelo._meta.db_table)} WHERE {q(modelo._meta.pk.column)} IN ({', '.join(['%s'] * len(pks))})",
+            pks,
+        )
+        return cursor.rowcount
+
+
+def _borrar_lote(tarea: TareaBorrado, modelo, filtro: str, valor: int, lote: int) -> int:
+    pks = list(modelo._base_manager.filter(**{filtro: valor}).order_by().values_list('pk', flat=True)[:lote])
+    if not pks:
+        return 0
+    with atomico():
+        if tarea.modelo == 'producto' and modelo._meta.label in ('venta.Venta', 'compra.Compra'):
+            # tombstones de las filas que se van con el producto
+            registrar_eliminaciones(modelo._meta.model_name, ((pk, tarea.tienda_id) for pk in pks))
+        # las filas que de verdad se borraron, no las leídas
+        return _borrar(modelo, router.db_for_write(modelo), pks)
+
+
+def procesar_tarea(tarea: TareaBorrado, lote: int = LOTE_BORRADO) -> int:
+    """
+    Borra por lotes (DELETE por ids, sin el recolector de Django) las filas
+    de la tarea y, al final, la propia tienda o producto. Cada lote es una
+    transacción corta y el progreso queda en la tarea. Si se interrumpe,
+    volver a procesarla continúa donde se quedó. La tarea debe estar
+    reclamada (`reclamar`).
+    """
+    total = 0
+    with usar_shard(tarea.shard):
+        pasos = _pasos(tarea)
+        if tarea.filas_totales is None:
+            tarea.filas_totales = sum(m._base_manager.filter(**{f: v}).count() for m, f, v in pasos) + (tarea.modelo == 'tienda')
+            TareaBorrado.objects.filter(pk=tarea.pk).update(filas_totales=tarea.filas_totales)
+        for modelo, filtro, valor in pasos:
+            while True:
+                n = _borrar_lote(tarea, modelo, filtro, valor, lote)
+                if not n:
+                    break
+                total += n
+                # el progreso renueva el reclamo
+                TareaBorrado.objects.filter(pk=tarea.pk).update(
+                    filas_borradas=F('filas_borradas') + n, reclamada=timezone.now(),
+                )
+    if tarea.modelo == 'tienda':
+        # el catálogo y, si la tienda tenía shard, su réplica
+        borradas = max(
+            _borrar(apps.get_model('tienda', 'Tienda'), alias, [tarea.tienda_id])
+            for alias in {DEFAULT_DB_ALIAS, tarea.shard or DEFAULT_DB_ALIAS}
+        )
+        total += borradas
+        TareaBorrado.objects.filter(pk=tarea.pk).update(filas_borradas=F('filas_borradas') + borradas)
+    invalidar_pronostico([tarea.tienda_id])
+    TareaBorrado.objects.filter(pk=tarea.pk).update(estado='completada', fecha_fin=timezone.now())
+    return total
+
+
+def reclamar(tarea: TareaBorrado, reintentar: bool = False) -> bool:
+    """
+    Pasa la tarea a 'en_curso' con un UPDATE condicionado a su estado: sólo un
+    borrador (hilo o `manage.py procesar_borrados`) la gana. Las que quedaron
+    en curso sin avanzar durante RECLAMO_CADUCA (un proceso que murió) pueden
+    reclamarse de nuevo.
+    """
+    ahora = timezone.now()
+    libre = Q(estado__in=['pendiente'] + (['error'] if reintentar else [])) | Q(
+        Q(reclamada__isnull=True) | Q(reclamada__lt=ahora - RECLAMO_CADUCA), estado='en_curso',
+    )
+    return TareaBorrado.objects.filter(libre, pk=tarea.pk).update(estado='en_curso', reclamada=ahora) == 1
+
+
+def procesar_pendientes(lote: int = LOTE_BORRADO, reintentar: bool = False) -> int:
+    """
+    Procesa las tareas pendientes (y las que quedaron a medias) por orden de
+    llegada. Con `reintentar`, también las que fallaron. Devuelve las tareas
+    completadas.
+    """
+    estados = ['pendiente', 'en_curso'] + (['error'] if reintentar else [])
+    completadas = 0
+    for tarea in TareaBorrado.objects.filter(estado__in=estados).order_by('pk'):
+        if not reclamar(tarea, reintentar):
+            continue  # la procesa otro borrador
+        try:
+            procesar_tarea(tarea, lote)
+            completadas += 1
+        except Exception as exc:
+            logger.exception("Error borrando %s %s", tarea.modelo, tarea.objeto_id)
+            TareaBorrado.objects.filter(pk=tarea.pk).update(estado='error', error=str(exc))
+    return completadas
+
+
+def _bucle(intervalo: float):
+    while True:
+        try:
+            procesar_pendientes()
+        except Exception:
+            logger.exception("Error procesando borrados")
+        finally:
+            connections.close_all()
+        time.sleep(intervalo)
+
+
+def iniciar_borrador():
+    """
+    Arranca (una vez por proceso) el hilo que procesa los borrados cada
+    BORRADO_SEGUNDOS. Con 0 el hilo no se usa y los borrados quedan a cargo
+    de `manage.py procesar_borrados`.
+    """
+    global _hilo
+    intervalo = getattr(settings, 'BORRADO_SEGUNDOS', 5)
+    if not intervalo or intervalo <= 0:
+        return
+    with _hilo_lock:
+        if _hilo is not None and _hilo.is_alive():
+            return
+        _hilo = threading.Thread(target=_bucle, args=(intervalo,), name='borrador', daemon=True)
+        _hilo.start()
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(deploy=True)
+def cache_compartida(app_configs, **kwargs):
+    """
+    `check --deploy`: las invalidaciones de caché (pronóstico, heatmap) sólo
+    llegan a todos los workers con una caché compartida; LocMemCache vale en
+    desarrollo.
+    """
+    if settings.CACHES.get('default', {}).get('BACKEND') != LOCMEM:
+        return []
+    return [Warning(
+        "CACHES['default'] es LocMemCache: con varios workers cada uno invalida sólo su copia del pronóstico.",
+        hint="Usa una caché compartida (Redis, Memcached o FileBasedCache).",
+        id='base_app.W001',
+    )]
@@ -0,0 +1,34 @@
+from typing import Optional
+
+from django.db.models import F
+from django.utils import timezone
+from ninja.errors import HttpError
+
+
+def guardar_cambios(obj, cambios: dict, version: Optional[int] = None) -> list:
+    """
+    Aplica `cambios` a `obj` y los guarda con un UPDATE condicional
+    (`... WHERE id = ? AND version = ?`) que sólo escribe las columnas que
+    cambiaron e incrementa `version`.
+
+    `version` es la que el cliente leyó; si no la envía se usa la cargada en
+    `obj`. Si otra escritura modificó la fila entretanto responde 409 en vez de
+    sobrescribirla. Devuelve la lista de campos modificados.
+    """
+    esperada = obj.version if version is None else version
+    campos = [attr for attr, value in cambios.items() if getattr(obj, attr) != value]
+    for attr in campos:
+        setattr(obj, attr, cambios[attr])
+    if not campos and esperada == obj.version:
+        return []
+
+    ahora = timezone.now()
+    valores = {obj._meta.get_field(attr).attname: getattr(obj, attr) for attr in campos}
+    actualizadas = type(obj).objects.filter(pk=obj.pk, version=esperada).update(
+        **valores, version=F('version') + 1, ultima_actualicacion=ahora,
+    )
+    if not actualizadas:
+        raise HttpError(409, f"{obj._meta.verbose_name} {obj.pk} fue modificado por otra petición (version != {esperada})")
+    obj.version = esperada + 1
+    obj.ultima_actualicacion = ahora
+    return campos
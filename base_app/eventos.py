@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EventoTienda
+from .shards import actual
+
+# eventos pendientes por conexión; si un cliente lento los acumula se descartan
+MAX_COLA = 1000
+
+
+def _backend() -> str:
+    return getattr(settings, 'EVENTOS_BACKEND', 'memoria')
+
+
+class Difusor:
+    """
+    Difusor en memoria (por proceso) de eventos por tienda. Cada conexión SSE
+    se suscribe con una asyncio.Queue; `publicar` puede llamarse desde
+    cualquier hilo y entrega el evento en el event loop de cada suscriptor.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = defaultdict(set)  # tienda_id -> {(loop, cola)}
+        self._ids = itertools.count(1)
+
+    def activo(self) -> bool:
+        return bool(self._suscriptores)
+
+    def conexiones(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._suscriptores.values())
+
+    def suscribir(self, tienda_id: int) -> asyncio.Queue:
+        cola = asyncio.Queue(maxsize=MAX_COLA)
+        with self._lock:
+            self._suscriptores[tienda_id].add((asyncio.get_running_loop(), cola))
+        return cola
+
+    def cancelar(self, tienda_id: int, cola: asyncio.Queue):
+        with self._lock:
+            subs = self._suscriptores.get(tienda_id)
+            if subs is None:
+                return
+            subs.difference_update({s for s in subs if s[1] is cola})
+            if not subs:
+                del self._suscriptores[tienda_id]
+
+    def publicar(self, tienda_id: int, tipo: str, datos: dict):
+        evento = {'id': next(self._ids), 'tipo': tipo, 'datos': datos}
+        with self._lock:
+            subs = list(self._suscriptores.get(tienda_id, ()))
+        for loop, cola in subs:
+            loop.call_soon_threadsafe(_encolar, cola, evento)
+
+
+def _encolar(cola: asyncio.Queue, evento: dict):
+    try:
+        cola.put_nowait(evento)
+    except asyncio.QueueFull:
+        pass
+
+
+difusor = Difusor()
+
+
+def hay_oyentes() -> bool:
+    """
+    Permite a los caminos de escritura evitar trabajo extra si nadie escucha.
+    """
+    return _backend() == 'sqlite' or difusor.activo()
+
+
+def publicar(tienda_id: int, tipo: str, datos: dict):
+    """
+    Publica un evento para la tienda cuando confirme la transacción en curso
+    del shard activo, que es donde se escribieron los cambios que anuncia.
+    Con EVENTOS_BACKEND = 'sqlite' el evento se guarda entonces en
+    `eventos_tienda` (en 'default') para los streams servidos por otros
+    workers: un cambio que se deshace no llega a anunciarse.
+    """
+    if not hay_oyentes():
+        return
+    datos = json.loads(json.dumps(datos, cls=DjangoJSONEncoder))
+    if _backend() == 'sqlite':
+        transaction.on_commit(lambda: _guardar(tienda_id, tipo, datos), using=actual())
+        return
+    transaction.on_commit(lambda: difusor.publicar(tienda_id, tipo, datos), using=actual())
+
+
+def _guardar(tienda_id: int, tipo: str, datos: dict):
+    evento = EventoTienda.objects.create(tienda_id=tienda_id, tipo=tipo, datos=datos)
+    if evento.pk % 1000 == 0:
+        retencion = timedelta(minutes=getattr(settings, 'EVENTOS_RETENCION_MINUTOS', 60))
+        EventoTienda.objects.filter(fecha__lt=timezone.now() - retencion).delete()
+
+
+def _sse(evento_id, tipo: str, datos: dict) -> str:
+    return f"id: {evento_id}\nevent: {tipo}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n"
+
+
+def publicar_operacion(tipo: str, fila, tienda_id: int, accion: str, delta_total):
+    """
+    Publica el cambio de una fila de venta/compra y el delta que supone para el
+    resumen de la tienda (`ventas_total` o `compras_total`).
+    """
+    if not hay_oyentes():
+        return
+    publicar(tienda_id, tipo, {
+        'accion': accion,
+        'id': fila.pk,
+        'producto_id': fila.producto_id,
+        'cantidad': fila.cantidad,
+        'total_precio': fila.total_precio,
+        'fecha_creacion': fila.fecha_creacion,
+    })
+    if delta_total:
+        publicar(tienda_id, 'resumen', {f'{tipo}s_total': delta_total})
+
+
+async def stream_eventos(tienda_id: int, ultimo_id: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Generador asíncrono de eventos SSE para una tienda, con comentarios de
+    keep-alive cada EVENTOS_HEARTBEAT_SEGUNDOS. Necesita un servidor ASGI: con
+    WSGI cada conexión abierta retiene un hilo del worker.
+    """
+    heartbeat = getattr(settings, 'EVENTOS_HEARTBEAT_SEGUNDOS', 15)
+    yield "retry: 3000\n\n"
+    eventos = _eventos_sqlite(tienda_id, ultimo_id, heartbeat) if _backend() == 'sqlite' else _eventos_memoria(tienda_id, heartbeat)
+    async for chunk in eventos:
+        yield chunk
+
+
+async def _eventos_memoria(tienda_id: int, heartbeat: float) -> AsyncIterator[str]:
+    cola = difusor.suscribir(tienda_id)
+    try:
+        while True:
+            try:
+                evento = await asyncio.wait_for(cola.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield _sse(evento['id'], evento['tipo'], evento['datos'])
+    finally:
+        difusor.cancelar(tienda_id, cola)
+
+
+async def _eventos_sqlite(tienda_id: int, ultimo_id: Optional[int], heartbeat: float) -> AsyncIterator[str]:
+    # alternativa multi-worker: sondeo de la tabla eventos_tienda
+    intervalo = getattr(settings, 'EVENTOS_POLL_SEGUNDOS', 1)
+    if ultimo_id is None:
+        ultimo = await EventoTienda.objects.filter(tienda_id=tienda_id).order_by('-id').afirst()
+        ultimo_id = ultimo.pk if ultimo else 0
+    espera = 0.0
+    while True:
+        eventos = await sync_to_async(list)(
+            EventoTienda.objects.filter(tienda_id=tienda_id, id__gt=ultimo_id).order_by('id')[:500]
+        )
+        for evento in eventos:
+            ultimo_id = evento.pk
+            yield _sse(evento.pk, evento.tipo, evento.datos)
+        espera = 0.0 if eventos else espera + intervalo
+        if espera >= heartbeat:
+            espera = 0.0
+            yield ": ping\n\n"
+        await asyncio.sleep(intervalo)
@@ -0,0 +1,92 @@
+import csv
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Iterable, Sequence, Tuple
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from ninja.errors import HttpError
+
+# filas por bloque enviado al cliente y por fetchmany() del cursor
+FILAS_POR_BLOQUE = 2000
+
+
+class _Eco:
+    """Pseudo-fichero para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def rango_fechas(desde: date, hasta: date) -> Tuple[datetime, datetime]:
+    """
+    Convierte un rango de días [desde, hasta] (ambos incluidos) en un rango de
+    datetimes aware [inicio, fin) apto para filtrar por índice sobre fecha_creacion.
+    """
+    if hasta < desde:
+        raise HttpError(400, "`hasta` debe ser posterior o igual a `desde`")
+    tz = timezone.get_default_timezone()
+    inicio = timezone.make_aware(datetime.combine(desde, time.min), tz)
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min), tz)
+    return inicio, fin
+
+
+def _celda(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).replace(tzinfo=None) if timezone.is_aware(valor) else valor
+    return valor
+
+
+def respuesta_csv(nombre: str, cabecera: Sequence[str], filas: Iterable[Sequence]) -> StreamingHttpResponse:
+    """
+    Respuesta CSV en streaming: las filas se consumen del iterador por bloques,
+    así que la memoria no depende del tamaño de la exportación y el primer byte
+    sale antes de que termine la consulta.
+    """
+    writer = csv.writer(_Eco())
+
+    def generar():
+        # BOM para que Excel detecte UTF-8
+        yield '\ufeff' + writer.writerow(cabecera)
+        bloque = []
+        for fila in filas:
+            bloque.append(writer.writerow([_celda(v) for v in fila]))
+            if len(bloque) >= FILAS_POR_BLOQUE:
+                yield ''.join(bloque)
+                bloque = []
+        if bloque:
+            yield ''.join(bloque)
+
+    response = StreamingHttpResponse(generar(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return response
+
+
+def respuesta_xlsx(nombre: str, cabecera: Sequence[str], filas: Iterable[Sequence]) -> FileResponse:
+    """
+    Respuesta XLSX generada con un workbook write-only de openpyxl (dependencia
+    opcional). openpyxl vuelca las filas a disco a medida que se añaden y el
+    fichero resultante se envía por bloques, por lo que la memoria se mantiene
+    constante; a diferencia del CSV, el envío empieza al cerrar el libro.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise HttpError(400, "La exportación XLSX requiere openpyxl; use formato=csv")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=nombre[:31])
+    ws.append(list(cabecera))
+    for fila in filas:
+        ws.append([float(v) if isinstance(v, Decimal) else _celda(v) for v in fila])
+
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f"{nombre}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
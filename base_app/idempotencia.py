@@ -0,0 +1,118 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from ninja.errors import HttpError
+
+from .models import ClaveIdempotencia
+from .shards import actual, atomico
+
+CABECERA = 'Idempotency-Key'
+
+
+def _ttl() -> timedelta:
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCIA_TTL_HORAS', 24))
+
+
+def _en_curso() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCIA_EN_CURSO_SEGUNDOS', 300))
+
+
+def _llamante(request) -> str:
+    """
+    Ámbito de las claves: el usuario autenticado o, sin sesión, la IP de
+    origen. Un cliente no puede leer la respuesta guardada de otro adivinando
+    su clave.
+    """
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_authenticated:
+        return f"usuario:{usuario.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def _huella(request) -> str:
+    h = hashlib.sha256()
+    h.update(request.method.encode())
+    h.update(request.path.encode())
+    h.update(request.body)
+    return h.hexdigest()
+
+
+def _serializar(schema, resultado):
+    if isinstance(resultado, (list, tuple)):
+        datos = [schema.from_orm(r).dict() for r in resultado]
+    else:
+        datos = schema.from_orm(resultado).dict()
+    return json.loads(json.dumps(datos, cls=DjangoJSONEncoder))
+
+
+def idempotente(schema):
+    """
+    Hace idempotente un endpoint de creación cuando el cliente envía la cabecera
+    Idempotency-Key: la primera petición se ejecuta y su respuesta (serializada
+    con `schema`) se guarda junto a la huella de la petición; las repeticiones
+    del mismo llamante devuelven la respuesta guardada sin volver a ejecutar la
+    vista (ni tocar stock).
+
+    Las claves se guardan en la base de la vista (el shard en curso, `actual()`)
+    para que la respuesta se confirme en la misma transacción que los cambios.
+    La clave se reserva en una transacción propia antes de ejecutar la vista,
+    así una repetición concurrente la ve y recibe 409 en vez de esperar al
+    bloqueo de escritura (con shards, `en_shard` ya abrió la transacción y la
+    repetición espera a que termine y recibe la respuesta guardada). Si la
+    vista falla se libera; una reserva sin respuesta durante
+    IDEMPOTENCIA_EN_CURSO_SEGUNDOS se da por abandonada. Reutilizar la clave
+    con otro cuerpo devuelve 422.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            clave = request.headers.get(CABECERA)
+            if not clave:
+                return vista(request, *args, **kwargs)
+            if len(clave) > 255:
+                raise HttpError(400, f"{CABECERA} no puede superar 255 caracteres")
+            huella = _huella(request)
+            ahora = timezone.now()
+            alias = actual()
+            claves = ClaveIdempotencia.objects.using(alias).filter(llamante=_llamante(request), clave=clave, ruta=request.path)
+
+            with transaction.atomic(using=alias):
+                # una clave caducada (o abandonada a medias) se puede reutilizar
+                claves.filter(Q(expira__lt=ahora) | Q(estado__isnull=True, fecha_creacion__lt=ahora - _en_curso())).delete()
+                try:
+                    with transaction.atomic(using=alias):
+                        registro = ClaveIdempotencia.objects.using(alias).create(
+                            llamante=_llamante(request), clave=clave, ruta=request.path, huella=huella, expira=ahora + _ttl()
+                        )
+                except IntegrityError:
+                    registro = claves.get()
+                    if registro.huella != huella:
+                        raise HttpError(422, f"{CABECERA} ya usada con una petición distinta")
+                    if registro.estado is None:
+                        raise HttpError(409, "La petición original con esta clave sigue en curso")
+                    response = JsonResponse(registro.respuesta, status=registro.estado, safe=False)
+                    response['Idempotent-Replayed'] = 'true'
+                    return response
+
+            try:
+                # la respuesta se guarda en la misma transacción que los cambios de la vista
+                with atomico():
+                    resultado = vista(request, *args, **kwargs)
+                    registro.estado = 200
+                    registro.respuesta = _serializar(schema, resultado)
+                    registro.save(using=alias, update_fields=['estado', 'respuesta'])
+            except BaseException:
+                # la vista no dejó cambios: un reintento con la misma clave debe ejecutarla
+                registro.delete(using=alias)
+                raise
+            return resultado
+        return envoltura
+    return decorador
@@ -0,0 +1,51 @@
+import time
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from base_app.archivo import LOTE_ARCHIVO, archivar
+from base_app.shards import todos, usar_shard
+
+ARCHIVABLES = {
+    'ventas': 'venta.Venta',
+    'compras': 'compra.Compra',
+}
+
+
+class Command(BaseCommand):
+    help = "Mueve las ventas/compras antiguas a tablas de archivo por año (<tabla>_archivo_AAAA)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antes', type=str, default=None, help="Archivar las filas anteriores a esta fecha (AAAA-MM-DD).")
+        parser.add_argument('--dias', type=int, default=None, help="Archivar las filas con más de N días (por defecto ARCHIVO_DIAS).")
+        parser.add_argument('--tabla', choices=[*ARCHIVABLES, 'todas'], default='todas')
+        parser.add_argument('--lote', type=int, default=LOTE_ARCHIVO, help="Filas por transacción.")
+
+    def handle(self, *args, **options):
+        if options['antes']:
+            try:
+                corte = datetime.strptime(options['antes'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError("--antes debe tener el formato AAAA-MM-DD")
+            corte = timezone.make_aware(corte)
+        else:
+            dias = options['dias'] if options['dias'] is not None else getattr(settings, 'ARCHIVO_DIAS', 730)
+            corte = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias)
+
+        tablas = ARCHIVABLES if options['tabla'] == 'todas' else {options['tabla']: ARCHIVABLES[options['tabla']]}
+        for nombre, etiqueta in tablas.items():
+            inicio = time.perf_counter()
+            movidas = {}
+            for alias in todos():
+                with usar_shard(alias):
+                    for ano, n in archivar(apps.get_model(etiqueta), corte, options['lote']).items():
+                        movidas[ano] = movidas.get(ano, 0) + n
+            duracion = time.perf_counter() - inicio
+            for ano, n in sorted(movidas.items()):
+                self.stdout.write(f"  {nombre}_archivo_{ano}: {n} filas")
+            self.stdout.write(self.style.SUCCESS(
+                f"{nombre}: {sum(movidas.values())} filas anteriores a {corte:%Y-%m-%d} archivadas en {duracion:.2f}s"
+            ))
@@ -0,0 +1,71 @@
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from base_app.eventos import difusor, stream_eventos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cuántas conexiones SSE puede mantener un worker: memoria por conexión "
+        "y latencia de reparto de un evento a todas ellas (difusor en memoria)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conexiones', type=int, default=5000)
+        parser.add_argument('--tiendas', type=int, default=10)
+        parser.add_argument('--eventos', type=int, default=20)
+
+    def handle(self, *args, **options):
+        asyncio.run(self._medir(options['conexiones'], options['tiendas'], options['eventos']))
+
+    async def _medir(self, n, tiendas, eventos):
+        recibidos = [0]
+        listo = asyncio.Event()
+        esperado = [0]
+
+        async def cliente(tienda_id):
+            gen = stream_eventos(tienda_id)
+            await gen.__anext__()  # retry
+            try:
+                async for _chunk in gen:
+                    recibidos[0] += 1
+                    if recibidos[0] >= esperado[0]:
+                        listo.set()
+            finally:
+                await gen.aclose()
+
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        tareas = [asyncio.create_task(cliente(i % tiendas)) for i in range(n)]
+        while difusor.conexiones() < n:
+            await asyncio.sleep(0.01)
+        memoria = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+        self.stdout.write(f"{n} conexiones abiertas: {memoria / 1024 / 1024:.1f} MiB ({memoria / n / 1024:.1f} KiB por conexión)")
+
+        latencias = []
+        for i in range(eventos):
+            recibidos[0] = 0
+            esperado[0] = n
+            listo.clear()
+            t0 = time.perf_counter()
+            # publicar desde otro hilo, como lo haría una petición síncrona de venta
+            hilos = [threading.Thread(target=difusor.publicar, args=(t, 'venta', {'i': i})) for t in range(tiendas)]
+            for h in hilos:
+                h.start()
+            await asyncio.wait_for(listo.wait(), timeout=30)
+            latencias.append((time.perf_counter() - t0) * 1000)
+
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        latencias.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f"reparto a {n} conexiones: media={statistics.mean(latencias):.1f}ms "
+            f"p50={latencias[len(latencias) // 2]:.1f}ms max={latencias[-1]:.1f}ms"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base_app.models import ClaveIdempotencia
+from base_app.shards import todos
+
+
+class Command(BaseCommand):
+    help = "Borra las claves de idempotencia caducadas (IDEMPOTENCIA_TTL_HORAS) de cada shard."
+
+    def handle(self, *args, **options):
+        borradas = 0
+        for alias in todos():
+            n, _ = ClaveIdempotencia.objects.using(alias).filter(expira__lt=timezone.now()).delete()
+            borradas += n
+        self.stdout.write(self.style.SUCCESS(f"{borradas} claves caducadas borradas"))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from base_app.shards import mover_tienda, shards
+from tienda.models import Tienda
+
+
+class Command(BaseCommand):
+    help = "Mueve una tienda (productos, ventas, compras y stock) a otro shard ('default' para sacarla de los shards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tienda', type=int)
+        parser.add_argument('destino', type=str, help="Alias del shard destino (ver SHARDS) o 'default'.")
+
+    def handle(self, *args, **options):
+        destino = options['destino']
+        if destino != DEFAULT_DB_ALIAS and destino not in shards():
+            raise CommandError(f"El shard {destino} no está configurado en SHARDS")
+        tienda = Tienda.objects.using(DEFAULT_DB_ALIAS).filter(pk=options['tienda']).first()
+        if tienda is None:
+            raise CommandError(f"La tienda {options['tienda']} no existe")
+
+        origen = tienda.shard or DEFAULT_DB_ALIAS
+        inicio = time.perf_counter()
+        copiadas = mover_tienda(tienda, destino)
+        duracion = time.perf_counter() - inicio
+        for tabla, n in copiadas.items():
+            self.stdout.write(f"  {tabla}: {n} filas")
+        self.stdout.write(self.style.SUCCESS(
+            f"{tienda.nombre}: {origen} -> {destino} ({sum(copiadas.values())} filas en {duracion:.2f}s)"
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base_app.borrado import LOTE_BORRADO, procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Borra por lotes las tiendas y productos marcados como eliminados (tareas de borrado pendientes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_BORRADO, help="Filas por transacción.")
+        parser.add_argument('--reintentar', action='store_true', help="Reintentar también las tareas con error.")
+        parser.add_argument('--loop', type=float, default=0, help="Repetir cada N segundos (0 = una sola pasada).")
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            completadas = procesar_pendientes(options['lote'], options['reintentar'])
+            if completadas or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{completadas} borrados completados en {time.perf_counter() - inicio:.2f}s"
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
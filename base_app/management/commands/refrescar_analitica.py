@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base_app.analitica import configurada, refrescar
+
+
+class Command(BaseCommand):
+    help = "Refresca la copia de solo lectura de analítica (ANALITICA_DB) desde la base principal."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, default=0, help="Repetir cada N segundos (0 = una sola vez).")
+
+    def handle(self, *args, **options):
+        if not configurada():
+            raise CommandError("La base de analítica no está configurada (ANALITICA_DB / DATABASES['analitica'])")
+        while True:
+            duracion = refrescar()
+            if duracion is None:
+                self.stdout.write("Otro proceso está refrescando la copia de analítica")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Copia de analítica refrescada en {duracion:.2f}s"))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from base_app.arranque import FASES, medir_arranque, perezosos_cargados, por_paquete
+
+
+class Command(BaseCommand):
+    help = "Mide el arranque en frío (proceso nuevo) y el tiempo de importación de cada módulo y paquete."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fase', choices=sorted(FASES), default='wsgi', help="Qué cargar: setup, wsgi (worker) o urls (primera petición).")
+        parser.add_argument('--top', type=int, default=20, help="Módulos y paquetes a listar.")
+        parser.add_argument('--repeticiones', type=int, default=3, help="Se informa la medición más rápida.")
+        parser.add_argument('--estricto', action='store_true', help="Fallar si se supera ARRANQUE_MAX_SEGUNDOS.")
+
+    def handle(self, *args, **options):
+        medicion = min(
+            (medir_arranque(options['fase']) for _ in range(max(options['repeticiones'], 1))),
+            key=lambda m: m['segundos'],
+        )
+        maximo = getattr(settings, 'ARRANQUE_MAX_SEGUNDOS', 2.0)
+        self.stdout.write(f"Fase {options['fase']}: {medicion['segundos']:.3f}s (presupuesto {maximo:.2f}s), importaciones {medicion['importacion_segundos']:.3f}s")
+
+        self.stdout.write("\nMódulos (tiempo acumulado):")
+        lentos = sorted(medicion['importaciones'], key=lambda f: f['acumulado_us'], reverse=True)[:options['top']]
+        for fila in lentos:
+            self.stdout.write(f"  {fila['acumulado_us'] / 1000:9.1f} ms  {fila['modulo']}")
+
+        self.stdout.write("\nPaquetes (tiempo propio):")
+        for paquete, propio in list(por_paquete(medicion['importaciones']).items())[:options['top']]:
+            self.stdout.write(f"  {propio / 1000:9.1f} ms  {paquete}")
+
+        cargados = perezosos_cargados(medicion['modulos'])
+        if cargados:
+            self.stdout.write(self.style.WARNING(f"\nDependencias pesadas cargadas al arrancar: {', '.join(cargados)}"))
+        if medicion['segundos'] > maximo:
+            mensaje = f"El arranque ({medicion['segundos']:.3f}s) supera ARRANQUE_MAX_SEGUNDOS ({maximo:.2f}s)"
+            if options['estricto']:
+                raise CommandError(mensaje)
+            self.stdout.write(self.style.ERROR(mensaje))
+        else:
+            self.stdout.write(self.style.SUCCESS("\nDentro del presupuesto de arranque"))
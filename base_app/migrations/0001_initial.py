@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('tienda_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'eliminaciones',
+                'indexes': [models.Index(fields=['tienda_id', 'fecha', 'id'], name='eliminacion_tienda_fecha')],
+            },
+        ),
+    ]
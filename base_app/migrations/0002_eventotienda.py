@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoTienda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tienda_id', models.PositiveBigIntegerField()),
+                ('tipo', models.CharField(max_length=20)),
+                ('datos', models.JSONField(default=dict)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'eventos_tienda',
+                'indexes': [models.Index(fields=['tienda_id', 'id'], name='evento_tienda_id')],
+            },
+        ),
+    ]
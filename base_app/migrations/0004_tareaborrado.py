@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0003_claveidempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaBorrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('tienda_id', models.PositiveBigIntegerField()),
+                ('shard', models.CharField(blank=True, default='', max_length=50)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('completada', 'Completada'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('filas_borradas', models.PositiveBigIntegerField(default=0)),
+                ('filas_totales', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'tareas_borrado',
+                'indexes': [models.Index(fields=['estado', 'id'], name='tarea_borrado_estado')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0004_tareaborrado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilCapturado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('metodo', models.CharField(max_length=10)),
+                ('ruta', models.CharField(max_length=500)),
+                ('usuario', models.CharField(blank=True, default='', max_length=150)),
+                ('estado', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('duracion_ms', models.FloatField()),
+                ('motor', models.CharField(max_length=20)),
+                ('archivo', models.CharField(blank=True, default='', max_length=500)),
+                ('num_consultas', models.PositiveIntegerField(default=0)),
+                ('sql_ms', models.FloatField(default=0)),
+                ('funciones', models.JSONField(default=list)),
+                ('consultas', models.JSONField(default=list)),
+            ],
+            options={
+                'db_table': 'perfiles_capturados',
+            },
+        ),
+    ]
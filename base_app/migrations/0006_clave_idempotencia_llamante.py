@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0005_perfilcapturado'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='claveidempotencia',
+            name='unique_clave_idempotencia_ruta',
+        ),
+        migrations.AddField(
+            model_name='claveidempotencia',
+            name='llamante',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(fields=('llamante', 'clave', 'ruta'), name='unique_clave_idempotencia_llamante'),
+        ),
+    ]
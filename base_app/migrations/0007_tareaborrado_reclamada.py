@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base_app', '0006_clave_idempotencia_llamante'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tareaborrado',
+            name='reclamada',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,9 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django import forms
+from django.core import exceptions
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 class BaseModel(models.Model):
@@ -7,3 +12,214 @@ class BaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class VisiblesManager(models.Manager):
+    """
+    Manager que oculta las filas marcadas para borrado en segundo plano
+    (`campo` = True), p.ej. 'eliminado' o 'producto__eliminado'. El borrado y
+    las relaciones usan `_base_manager`, que las ve todas.
+
+    En Tienda y Producto es el manager por defecto. Ventas y compras lo tienen
+    como `visibles` para los listados e informes: filtrar por
+    'producto__eliminado' cruza con productos en cada consulta, y las
+    escrituras por pk no deben pagarlo.
+    """
+
+    def __init__(self, campo: str = 'eliminado'):
+        super().__init__()
+        self.campo = campo
+
+    def get_queryset(self):
+        return super().get_queryset().filter(**{self.campo: False})
+
+
+class CentavosField(models.Field):
+    """
+    Importe guardado como entero de céntimos (10^-decimal_places unidades) y
+    expuesto como Decimal: las sumas de SQL son enteras y exactas y no pasan
+    por coma flotante. Al guardar se redondea al céntimo (mitad hacia arriba).
+
+    En expresiones (F() + valor) el valor debe ir en un
+    Value(..., output_field=CentavosField()) para que se convierta a céntimos,
+    y las operaciones entre importes necesitan output_field=CentavosField().
+    """
+    description = "Importe en céntimos expuesto como Decimal"
+    empty_strings_allowed = False
+
+    def __init__(self, *args, decimal_places: int = 2, **kwargs):
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.decimal_places != 2:
+            kwargs['decimal_places'] = self.decimal_places
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        return 'CentavosField'
+
+    def db_type(self, connection):
+        return connection.data_types['BigIntegerField']
+
+    def cast_db_type(self, connection):
+        return self.db_type(connection)
+
+    def _a_decimal(self, centavos) -> Decimal:
+        return Decimal(int(round(centavos))).scaleb(-self.decimal_places)
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else self._a_decimal(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value)).quantize(Decimal(1).scaleb(-self.decimal_places), rounding=ROUND_HALF_UP)
+        except (InvalidOperation, ValueError):
+            raise exceptions.ValidationError(f"“{value}” no es un importe válido", code='invalid')
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return int(self.to_python(value).scaleb(self.decimal_places).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.DecimalField, 'decimal_places': self.decimal_places, **kwargs})
+
+
+class Eliminacion(models.Model):
+    """
+    Registro de borrados (tombstones) para que los clientes que sincronizan
+    de forma incremental sepan qué filas deben eliminar.
+    """
+    modelo = models.CharField(max_length=20)
+    objeto_id = models.PositiveBigIntegerField()
+    tienda_id = models.PositiveBigIntegerField(null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'eliminaciones'
+        indexes = [
+            models.Index(fields=['tienda_id', 'fecha', 'id'], name='eliminacion_tienda_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id}"
+
+
+class EventoTienda(models.Model):
+    """
+    Eventos de cambios por tienda. Sólo se escriben con EVENTOS_BACKEND = 'sqlite',
+    para que varios workers puedan servir el stream SSE leyendo esta tabla.
+    """
+    tienda_id = models.PositiveBigIntegerField()
+    tipo = models.CharField(max_length=20)
+    datos = models.JSONField(default=dict)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'eventos_tienda'
+        indexes = [
+            models.Index(fields=['tienda_id', 'id'], name='evento_tienda_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.tienda_id} {self.tipo}"
+
+
+class ClaveIdempotencia(models.Model):
+    """
+    Respuesta guardada para una cabecera Idempotency-Key, de forma que los
+    reintentos de una misma petición devuelvan el resultado original.
+    """
+    # quién envió la clave (usuario o IP): cada llamante tiene su espacio de claves
+    llamante = models.CharField(max_length=100, default='')
+    clave = models.CharField(max_length=255)
+    ruta = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64)  # sha256 del método, ruta y cuerpo
+    estado = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'claves_idempotencia'
+        constraints = [
+            models.UniqueConstraint(fields=['llamante', 'clave', 'ruta'], name='unique_clave_idempotencia_llamante'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} {self.ruta}"
+
+
+class TareaBorrado(models.Model):
+    """
+    Borrado en segundo plano de una tienda o un producto: la fila queda marcada
+    (`eliminado`) y oculta al instante y el borrador (base_app/borrado.py)
+    elimina después sus dependientes por lotes.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+        ('error', 'Error'),
+    ]
+
+    modelo = models.CharField(max_length=20)  # 'tienda' o 'producto'
+    objeto_id = models.PositiveBigIntegerField()
+    tienda_id = models.PositiveBigIntegerField()
+    # shard con los productos, ventas y compras a borrar ('' = 'default')
+    shard = models.CharField(max_length=50, blank=True, default='')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    filas_borradas = models.PositiveBigIntegerField(default=0)
+    # estimación al empezar (dependientes + la propia fila)
+    filas_totales = models.PositiveBigIntegerField(null=True, blank=True)
+    # último avance del borrador que la procesa (reclamo de la tarea)
+    reclamada = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'tareas_borrado'
+        indexes = [
+            models.Index(fields=['estado', 'id'], name='tarea_borrado_estado'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} ({self.estado})"
+
+
+class PerfilCapturado(models.Model):
+    """
+    Perfil de una petición capturado bajo demanda (base_app/perfilado.py): las
+    funciones más costosas y las consultas SQL con su plan. El perfil completo
+    queda en `archivo` (PERFILADO_DIR).
+    """
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    metodo = models.CharField(max_length=10)
+    ruta = models.CharField(max_length=500)
+    usuario = models.CharField(max_length=150, blank=True, default='')
+    estado = models.PositiveSmallIntegerField(null=True, blank=True)
+    duracion_ms = models.FloatField()
+    motor = models.CharField(max_length=20)  # 'cProfile' o 'pyinstrument'
+    archivo = models.CharField(max_length=500, blank=True, default='')
+    num_consultas = models.PositiveIntegerField(default=0)
+    sql_ms = models.FloatField(default=0)
+    # [{funcion, llamadas, propio_ms, acumulado_ms, propia}] de mayor a menor coste
+    funciones = models.JSONField(default=list)
+    # [{alias, sql, params, ms, plan}] en orden de ejecución
+    consultas = models.JSONField(default=list)
+
+    class Meta:
+        db_table = 'perfiles_capturados'
+
+    def __str__(self):
+        return f"{self.metodo} {self.ruta} ({self.duracion_ms:.0f} ms)"
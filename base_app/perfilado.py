@@ -0,0 +1,256 @@
+import cProfile
+import json
+import logging
+import pstats
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import PerfilCapturado
+
+logger = logging.getLogger(__name__)
+
+# activación por petición: cabecera `X-Perfilar: 1` o `?perfilar=1`
+CABECERA = 'HTTP_X_PERFILAR'
+PARAMETRO = 'perfilar'
+# valores que activan el perfilado (sin distinguir mayúsculas); `?perfilar=0`
+# o `X-Perfilar: false` no perfilan
+VERDADEROS = frozenset({'1', 'true', 'yes', 'on', 'si', 'sí'})
+
+# funciones guardadas por perfil y consultas a las que se pide el plan
+TOP_FUNCIONES = 30
+MAX_PLANES = 200
+
+
+def _activado(valor: Optional[str]) -> bool:
+    return (valor or '').strip().lower() in VERDADEROS
+
+
+def solicitado(request) -> bool:
+    """
+    PERFILADO activo, usuario staff y la cabecera o el parámetro con un valor
+    verdadero (ver VERDADEROS).
+    """
+    if not getattr(settings, 'PERFILADO', False):
+        return False
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not (usuario.is_active and usuario.is_staff):
+        return False
+    return _activado(request.META.get(CABECERA)) or _activado(request.GET.get(PARAMETRO))
+
+
+def _profiler():
+    # import perezoso: pyinstrument sólo se carga al perfilar una petición
+    try:
+        from pyinstrument import Profiler
+    except ImportError:  # dependencia opcional: sin pyinstrument se usa cProfile
+        return None
+    return Profiler
+
+
+def _valor(param):
+    return param if isinstance(param, (int, float, str, bool, type(None))) else str(param)
+
+
+class RegistroConsultas:
+    """
+    execute_wrapper que anota cada consulta de una conexión con su duración.
+    """
+
+    def __init__(self, alias: str, consultas: list):
+        self.alias = alias
+        self.consultas = consultas
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append({
+                'alias': self.alias,
+                'sql': sql,
+                # en executemany sólo el número de filas
+                'params': len(params) if many else [_valor(p) for p in params or ()],
+                'ms': round((time.perf_counter() - inicio) * 1000, 3),
+                'many': many,
+            })
+
+
+def plan_consulta(alias: str, sql: str, params) -> Optional[List[str]]:
+    """
+    Líneas del EXPLAIN QUERY PLAN de un SELECT (None si no es un SELECT).
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [fila[-1] for fila in cursor.fetchall()]
+    except DatabaseError as exc:
+        return [f"(sin plan: {exc})"]
+
+
+def _explicar(consultas: list):
+    """
+    Añade el EXPLAIN QUERY PLAN de cada SELECT (una vez por sentencia distinta).
+    """
+    planes = {}
+    for consulta in consultas:
+        clave = (consulta['alias'], consulta['sql'])
+        if clave not in planes and not consulta['many'] and len(planes) < MAX_PLANES:
+            planes[clave] = plan_consulta(consulta['alias'], consulta['sql'], consulta['params'])
+        consulta['plan'] = planes.get(clave)
+
+
+def _ruta_corta(archivo: str) -> str:
+    for marca in ('site-packages/', str(settings.BASE_DIR) + '/'):
+        if marca in archivo:
+            return archivo.split(marca, 1)[1]
+    return archivo
+
+
+def _propia(archivo: str) -> bool:
+    # código del proyecto (no de Django, librerías ni la biblioteca estándar)
+    return archivo.startswith(str(settings.BASE_DIR)) and 'site-packages' not in archivo and archivo != __file__
+
+
+def _funciones_cprofile(perfil: cProfile.Profile) -> list:
+    estadisticas = pstats.Stats(perfil).stats
+    filas = sorted(estadisticas.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCIONES]
+    return [
+        {
+            'funcion': f"{funcion} ({_ruta_corta(archivo)}:{linea})",
+            'llamadas': llamadas,
+            'propio_ms': round(propio * 1000, 3),
+            'acumulado_ms': round(acumulado * 1000, 3),
+            'propia': _propia(archivo),
+        }
+        for (archivo, linea, funcion), (_primitivas, llamadas, propio, acumulado, _llamadores) in filas
+    ]
+
+
+def _funciones_pyinstrument(raiz) -> list:
+    # pyinstrument muestrea un árbol de llamadas: se agrega por función
+    totales = {}
+    pendientes = [raiz] if raiz is not None else []
+    while pendientes:
+        marco = pendientes.pop()
+        pendientes.extend(marco.children)
+        clave = f"{marco.function} ({_ruta_corta(marco.file_path or '')}:{marco.line_no})"
+        fila = totales.setdefault(clave, {
+            'funcion': clave, 'llamadas': 0, 'propio_ms': 0.0, 'acumulado_ms': 0.0,
+            'propia': _propia(marco.file_path or ''),
+        })
+        fila['llamadas'] += 1
+        fila['propio_ms'] += marco.total_self_time * 1000
+        fila['acumulado_ms'] += marco.time * 1000
+    filas = sorted(totales.values(), key=lambda f: f['acumulado_ms'], reverse=True)[:TOP_FUNCIONES]
+    for fila in filas:
+        fila['propio_ms'] = round(fila['propio_ms'], 3)
+        fila['acumulado_ms'] = round(fila['acumulado_ms'], 3)
+    return filas
+
+
+def _directorio() -> Path:
+    directorio = Path(getattr(settings, 'PERFILADO_DIR', Path(settings.BASE_DIR) / 'perfiles'))
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def _podar():
+    maximo = getattr(settings, 'PERFILADO_MAX', 100)
+    viejos = PerfilCapturado.objects.order_by('-fecha', '-pk')[maximo:]
+    for perfil in viejos:
+        if perfil.archivo:
+            Path(perfil.archivo).unlink(missing_ok=True)
+            Path(perfil.archivo).with_suffix('.json').unlink(missing_ok=True)
+    PerfilCapturado.objects.filter(pk__in=[p.pk for p in viejos]).delete()
+
+
+class PerfiladoMiddleware:
+    """
+    Perfila bajo demanda las peticiones de usuarios staff (ver `solicitado`):
+    ejecuta la vista con pyinstrument si está instalado (muestreo) o con
+    cProfile, anota las consultas SQL de todas las conexiones y su
+    EXPLAIN QUERY PLAN, y guarda el perfil en PERFILADO_DIR y un
+    PerfilCapturado visible en el admin. La respuesta lleva `X-Perfil` con su id.
+
+    Sólo se mide el hilo de la petición: el contenido de las respuestas en
+    streaming y las consultas en paralelo (scatter-gather) quedan fuera.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not solicitado(request):
+            return self.get_response(request)
+
+        consultas = []
+        Profiler = _profiler()
+        if Profiler is not None:
+            motor, perfil = 'pyinstrument', Profiler()
+            iniciar, detener = perfil.start, perfil.stop
+        else:
+            motor, perfil = 'cProfile', cProfile.Profile()
+            iniciar, detener = perfil.enable, perfil.disable
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(RegistroConsultas(alias, consultas)))
+            try:
+                iniciar()
+            except (RuntimeError, ValueError):
+                # otro perfilador activo en el proceso: la petición sigue sin perfilar
+                return self.get_response(request)
+            inicio = time.perf_counter()
+            try:
+                respuesta = self.get_response(request)
+            finally:
+                detener()
+            duracion = time.perf_counter() - inicio
+
+        try:
+            capturado = self._guardar(request, respuesta, perfil, motor, duracion, consultas)
+            respuesta['X-Perfil'] = str(capturado.pk)
+        except Exception:
+            logger.exception("No se pudo guardar el perfil de %s", request.path)
+        return respuesta
+
+    def _guardar(self, request, respuesta, perfil, motor, duracion, consultas) -> PerfilCapturado:
+        _explicar(consultas)
+        if motor == 'pyinstrument':
+            funciones = _funciones_pyinstrument(perfil.last_session.root_frame())
+        else:
+            funciones = _funciones_cprofile(perfil)
+        capturado = PerfilCapturado.objects.create(
+            metodo=request.method,
+            ruta=request.get_full_path()[:500],
+            usuario=request.user.get_username(),
+            estado=respuesta.status_code,
+            duracion_ms=round(duracion * 1000, 3),
+            motor=motor,
+            num_consultas=len(consultas),
+            sql_ms=round(sum(c['ms'] for c in consultas), 3),
+            funciones=funciones,
+            consultas=consultas,
+        )
+        base = _directorio() / f"{timezone.localtime(capturado.fecha):%Y%m%d-%H%M%S}-{capturado.pk}"
+        if motor == 'pyinstrument':
+            archivo = base.with_suffix('.html')
+            archivo.write_text(perfil.output_html(), encoding='utf-8')
+        else:
+            archivo = base.with_suffix('.prof')
+            perfil.dump_stats(archivo)
+        base.with_suffix('.json').write_text(json.dumps({
+            'metodo': capturado.metodo, 'ruta': capturado.ruta, 'estado': capturado.estado,
+            'duracion_ms': capturado.duracion_ms, 'funciones': funciones, 'consultas': consultas,
+        }, ensure_ascii=False, indent=1, default=str), encoding='utf-8')
+        PerfilCapturado.objects.filter(pk=capturado.pk).update(archivo=str(archivo))
+        capturado.archivo = str(archivo)
+        _podar()
+        return capturado
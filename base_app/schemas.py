@@ -0,0 +1,15 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Annotated
+
+from ninja.orm import register_field
+from pydantic import AfterValidator
+
+CENTIMO = Decimal('0.01')
+
+# al céntimo también cuando el objeto aún tiene el valor recibido (Decimal('3')
+# tras create o guardar_cambios): la respuesta es "3.00", igual que al releerlo
+Importe = Annotated[Decimal, AfterValidator(lambda valor: valor.quantize(CENTIMO, rounding=ROUND_HALF_UP))]
+
+# los CentavosField (base_app.models) se exponen en la API como Decimal, no
+# como el entero de céntimos guardado; importar antes de crear los ModelSchema
+register_field('CentavosField', Importe)
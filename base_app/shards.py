@@ -0,0 +1,343 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count
+from django.http import FileResponse, StreamingHttpResponse
+
+# apps cuyas tablas viven en el shard de su tienda (y `tienda`, replicada en él)
+APPS_POR_TIENDA = {'producto', 'venta', 'compra'}
+
+# ids reservados a cada shard: el shard i (1..n) numera desde i · RANGO_IDS
+RANGO_IDS = 10 ** 12
+
+# shard de la petición/tarea en curso (None = 'default')
+_actual: ContextVar[Optional[str]] = ContextVar('shard_actual', default=None)
+
+
+def shards() -> List[str]:
+    """
+    Alias de los shards configurados en SHARDS (sin 'default').
+    """
+    return list(getattr(settings, 'SHARDS', {}))
+
+
+def activo() -> bool:
+    return bool(shards())
+
+
+def todos() -> List[str]:
+    """
+    'default' (tiendas sin shard asignado) y todos los shards.
+    """
+    return [DEFAULT_DB_ALIAS, *shards()]
+
+
+def actual() -> str:
+    return _actual.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def usar_shard(alias: Optional[str]):
+    """
+    Dirige a `alias` las consultas de productos, ventas y compras del bloque.
+    """
+    token = _actual.set(None if alias in (None, '', DEFAULT_DB_ALIAS) else alias)
+    try:
+        yield
+    finally:
+        _actual.reset(token)
+
+
+def atomico():
+    """
+    transaction.atomic() sobre el shard en curso.
+    """
+    return transaction.atomic(using=actual())
+
+
+def shard_de_tienda(tienda_id: int) -> str:
+    """
+    Shard de la tienda según el mapa del catálogo ('default').
+    """
+    if not activo():
+        return DEFAULT_DB_ALIAS
+    Tienda = apps.get_model('tienda', 'Tienda')
+    shard = Tienda.objects.using(DEFAULT_DB_ALIAS).filter(pk=tienda_id).values_list('shard', flat=True).first()
+    return shard or DEFAULT_DB_ALIAS
+
+
+def _shard_por_rango(pk: int) -> str:
+    indice = pk // RANGO_IDS
+    return shards()[indice - 1] if 0 < indice <= len(shards()) else DEFAULT_DB_ALIAS
+
+
+def shard_de_objeto(modelo, pk: int) -> str:
+    """
+    Shard que contiene la fila `pk` de `modelo`. Los ids son únicos entre
+    shards (RANGO_IDS), así que se prueba primero el shard que lo numeró y,
+    si la tienda se movió después, el resto.
+    """
+    if not activo():
+        return DEFAULT_DB_ALIAS
+    inicial = _shard_por_rango(pk)
+    for alias in [inicial, *(a for a in todos() if a != inicial)]:
+        if modelo._base_manager.using(alias).filter(pk=pk).exists():
+            return alias
+    return inicial
+
+
+def shard_comun(modelo, pks: Iterable[int]) -> str:
+    """
+    Shard común a varias filas; una petición no puede abarcar varios shards.
+    """
+    encontrados = {shard_de_objeto(modelo, pk) for pk in set(pks)}
+    if len(encontrados) > 1:
+        # import perezoso: el router se carga en cada `manage.py` y ninja pesa
+        from ninja.errors import HttpError
+        raise HttpError(400, "La petición mezcla productos de tiendas en shards distintos")
+    return encontrados.pop() if encontrados else DEFAULT_DB_ALIAS
+
+
+def _iterar(alias: str, contenido):
+    with usar_shard(alias):
+        yield from contenido
+
+
+def en_shard(resolver: Callable[[dict], str]):
+    """
+    Ejecuta la vista en el shard que devuelve `resolver(kwargs)`, dentro de una
+    transacción de ese shard salvo en los GET. Sin SHARDS no hace nada.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not activo():
+                return vista(request, *args, **kwargs)
+            alias = resolver(kwargs)
+            with usar_shard(alias):
+                if request.method == 'GET':
+                    respuesta = vista(request, *args, **kwargs)
+                else:
+                    with atomico():
+                        respuesta = vista(request, *args, **kwargs)
+            # el contenido en streaming se genera después de la vista
+            if isinstance(respuesta, StreamingHttpResponse) and not isinstance(respuesta, FileResponse) and not respuesta.is_async:
+                respuesta.streaming_content = _iterar(alias, respuesta.streaming_content)
+            return respuesta
+        return envoltura
+    return decorador
+
+
+por_tienda = en_shard(lambda kwargs: shard_de_tienda(kwargs['tienda_id']))
+
+
+def por_objeto(etiqueta: str, parametro: str):
+    """
+    Vista sobre una fila concreta: el shard se busca por su id (`parametro`).
+    """
+    return en_shard(lambda kwargs: shard_de_objeto(apps.get_model(etiqueta), kwargs[parametro]))
+
+
+def _ejecutar(alias: str, funcion: Callable):
+    try:
+        with usar_shard(alias):
+            return funcion()
+    finally:
+        connections.close_all()
+
+
+def en_cada_shard(funcion: Callable, aliases: Optional[Iterable[str]] = None) -> List[Tuple[str, object]]:
+    """
+    Scatter-gather: ejecuta `funcion()` en cada shard (en paralelo, un hilo
+    por shard) y devuelve [(alias, resultado)]. Sin SHARDS se ejecuta una vez
+    en 'default'.
+    """
+    aliases = list(aliases) if aliases is not None else todos()
+    if len(aliases) == 1:
+        with usar_shard(aliases[0]):
+            return [(aliases[0], funcion())]
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        futuros = [(alias, pool.submit(copy_context().run, _ejecutar, alias, funcion)) for alias in aliases]
+        return [(alias, futuro.result()) for alias, futuro in futuros]
+
+
+def elegir_shard() -> str:
+    """
+    Shard para una tienda nueva: el que tiene menos tiendas.
+    """
+    Tienda = apps.get_model('tienda', 'Tienda')
+    cuentas = dict(
+        Tienda.objects.using(DEFAULT_DB_ALIAS).filter(shard__in=shards())
+        .values('shard').annotate(n=Count('pk')).values_list('shard', 'n')
+    )
+    return min(shards(), key=lambda alias: (cuentas.get(alias, 0), shards().index(alias)))
+
+
+def copiar_filas(modelo, qs, destino: str, actualizar: bool = False) -> int:
+    """
+    Copia a `destino` las filas de `qs` (de cualquier base) con sus ids y
+    valores tal cual (sin auto_now ni señales). Con `actualizar`, las que ya
+    existen se sobrescriben (UPSERT). Devuelve las filas copiadas.
+    """
+    conexion = connections[destino]
+    campos = modelo._meta.concrete_fields
+    q = conexion.ops.quote_name
+    columnas = ', '.join(q(f.column) for f in campos)
+    sql = (
+        f"INSERT INTO {q(modelo._meta.db_table)} ({columnas}) VALUES ({', '.join(['%s'] * len(campos))})"
+    )
+    if actualizar:
+        pk = q(modelo._meta.pk.column)
+        sql += f" ON CONFLICT({pk}) DO UPDATE SET " + ', '.join(
+            f"{q(f.column)} = excluded.{q(f.column)}" for f in campos if not f.primary_key
+        )
+    total = 0
+    filas = qs.values_list(*[f.attname for f in campos]).iterator(chunk_size=1000)
+    lote = []
+    with conexion.cursor() as cursor:
+        for fila in filas:
+            lote.append([f.get_db_prep_value(v, conexion, prepared=False) for f, v in zip(campos, fila)])
+            if len(lote) >= 1000:
+                cursor.executemany(sql, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            cursor.executemany(sql, lote)
+            total += len(lote)
+    return total
+
+
+def replicar_tienda(tienda):
+    """
+    Copia (o actualiza) la fila de la tienda en su shard, donde la necesitan
+    las claves foráneas de sus productos.
+    """
+    if tienda.shard:
+        copiar_filas(type(tienda), type(tienda).objects.using(DEFAULT_DB_ALIAS).filter(pk=tienda.pk), tienda.shard, actualizar=True)
+
+
+# tablas de una tienda, en orden de dependencia (la clave lleva a la tienda)
+TABLAS_TIENDA = [
+    ('producto.Producto', 'tienda_id'),
+    ('producto.MovimientoStock', 'producto__tienda_id'),
+    ('producto.CheckpointStock', 'producto__tienda_id'),
+    ('venta.Venta', 'producto__tienda_id'),
+    ('venta.EventoVenta', 'producto__tienda_id'),
+    ('compra.Compra', 'producto__tienda_id'),
+]
+
+
+def _secuencias(alias: str) -> dict:
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT name, seq FROM sqlite_sequence")
+        return dict(cursor.fetchall())
+
+
+def _restaurar_secuencias(alias: str, previas: dict):
+    # un INSERT con id explícito adelanta el AUTOINCREMENT del destino hasta el
+    # rango del origen; se devuelve al suyo para no invadir el de otro shard
+    with connections[alias].cursor() as cursor:
+        for tabla, seq in previas.items():
+            cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [seq, tabla])
+
+
+def mover_tienda(tienda, destino: str) -> Dict[str, int]:
+    """
+    Mueve los productos, ventas, compras (también las archivadas) y el
+    historial de stock de la tienda a `destino` conservando sus ids: primero
+    se copian, luego se cambia el mapa del catálogo y por último se borran del
+    origen. Devuelve las filas copiadas por tabla.
+    """
+    from .archivo import MODELOS_ARCHIVO, anos_archivados, modelo_archivo, _asegurar_tabla
+
+    origen = tienda.shard or DEFAULT_DB_ALIAS
+    if destino == origen:
+        return {}
+    Tienda = type(tienda)
+    tablas = [(apps.get_model(etiqueta), filtro) for etiqueta, filtro in TABLAS_TIENDA]
+    archivos = []
+    for etiqueta in MODELOS_ARCHIVO:
+        modelo = apps.get_model(etiqueta)
+        with usar_shard(origen):
+            anos = anos_archivados(modelo)
+        with usar_shard(destino):
+            # el editor de esquema de SQLite no puede usarse dentro de una transacción
+            for ano in anos:
+                _asegurar_tabla(modelo, ano)
+        archivos += [(modelo_archivo(modelo, ano), 'producto__tienda_id') for ano in anos]
+
+    copiadas = {}
+    with transaction.atomic(using=destino):
+        previas = _secuencias(destino)
+        if destino != DEFAULT_DB_ALIAS:
+            copiar_filas(Tienda, Tienda.objects.using(DEFAULT_DB_ALIAS).filter(pk=tienda.pk), destino, actualizar=True)
+        for modelo, filtro in tablas + archivos:
+            qs = modelo._base_manager.using(origen).filter(**{filtro: tienda.pk}).order_by('pk')
+            copiadas[modelo._meta.db_table] = copiar_filas(modelo, qs, destino)
+        _restaurar_secuencias(destino, previas)
+
+    Tienda.objects.using(DEFAULT_DB_ALIAS).filter(pk=tienda.pk).update(
+        shard='' if destino == DEFAULT_DB_ALIAS else destino
+    )
+    tienda.shard = '' if destino == DEFAULT_DB_ALIAS else destino
+
+    with transaction.atomic(using=origen):
+        for modelo, filtro in archivos:
+            modelo._base_manager.using(origen).filter(**{filtro: tienda.pk}).delete()
+        if origen == DEFAULT_DB_ALIAS:
+            # en 'default' la tienda se queda (es el catálogo): sólo sus productos
+            tablas[0][0]._base_manager.using(origen).filter(tienda_id=tienda.pk).delete()
+        else:
+            Tienda._base_manager.using(origen).filter(pk=tienda.pk).delete()
+    return copiadas
+
+
+def preparar_shard(using: str = DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Receptor de post_migrate: en cada shard, arranca los contadores
+    AUTOINCREMENT de sus tablas en su rango de ids para que los ids no se
+    repitan entre shards.
+    """
+    if using not in shards():
+        return
+    base = (shards().index(using) + 1) * RANGO_IDS
+    conexion = connections[using]
+    with conexion.cursor() as cursor:
+        tablas = set(conexion.introspection.table_names(cursor))
+        for modelo in apps.get_models():
+            tabla = modelo._meta.db_table
+            if modelo._meta.app_label not in APPS_POR_TIENDA or tabla not in tablas:
+                continue
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [tabla])
+            fila = cursor.fetchone()
+            if fila is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [tabla, base])
+            elif fila[0] < base:
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [base, tabla])
+
+
+class ShardRouter:
+    """
+    Con SHARDS configurado, las consultas de productos, ventas y compras (y
+    las lecturas de tiendas, replicadas en cada shard) van al shard en curso
+    (`usar_shard`); el resto de tablas, a 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in APPS_POR_TIENDA or model._meta.app_label == 'tienda':
+            return _actual.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in APPS_POR_TIENDA:
+            return _actual.get()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -0,0 +1,51 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from django.db.models import Q
+
+from .models import Eliminacion
+
+# (fecha, id): posición de una fila en el orden de sincronización
+Marca = Tuple[datetime, int]
+
+
+def registrar_eliminaciones(modelo: str, filas: Iterable[Tuple[int, Optional[int]]]):
+    """
+    Guarda un tombstone por cada (objeto_id, tienda_id) borrado.
+    Llamar dentro de la misma transacción que el borrado.
+    """
+    Eliminacion.objects.bulk_create(
+        [Eliminacion(modelo=modelo, objeto_id=objeto_id, tienda_id=tienda_id) for objeto_id, tienda_id in filas],
+        batch_size=1000,
+    )
+
+
+def cambios_desde(qs, campo_fecha: str, desde: Optional[Marca], corte: datetime, limite: int) -> Tuple[list, bool]:
+    """
+    Devuelve las filas de `qs` posteriores a la marca `desde` (orden por fecha e id)
+    y hasta `corte`, como máximo `limite`. El segundo valor indica si quedaron filas.
+    """
+    qs = qs.filter(**{f'{campo_fecha}__lte': corte})
+    if desde is not None:
+        fecha, pk = desde
+        qs = qs.filter(Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, 'pk__gt': pk}))
+    filas = list(qs.order_by(campo_fecha, 'pk')[:limite + 1])
+    return filas[:limite], len(filas) > limite
+
+
+def nueva_marca(resultados: List[Tuple[list, bool, str]], desde: Optional[Marca]) -> Tuple[Optional[Marca], bool]:
+    """
+    Calcula la marca que el cliente debe enviar en la próxima llamada.
+
+    Si alguna tabla se cortó por `limite`, la marca es la menor de las últimas
+    filas de las tablas cortadas: así ninguna fila queda sin enviar (algunas de
+    otras tablas pueden repetirse, y el cliente las aplica de forma idempotente).
+    Devuelve también si la sincronización está completa.
+    """
+    cortadas = [(getattr(filas[-1], campo), filas[-1].pk) for filas, truncado, campo in resultados if truncado]
+    if cortadas:
+        return min(cortadas), False
+    ultimas = [(getattr(filas[-1], campo), filas[-1].pk) for filas, _truncado, campo in resultados if filas]
+    if desde is not None:
+        ultimas.append(desde)
+    return (max(ultimas) if ultimas else None), True
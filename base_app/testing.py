@@ -0,0 +1,241 @@
+import json
+import re
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .perfilado import RegistroConsultas, plan_consulta
+
+# tablas que ningún endpoint debe recorrer enteras
+TABLAS_VIGILADAS = ('ventas', 'compras', 'productos')
+
+# tamaños de lote con los que se miden los endpoints masivos
+ELEMENTOS = (2, 10)
+
+# tamaño del conjunto de datos estándar
+TIENDAS = 2
+PRODUCTOS_POR_TIENDA = 25
+DIAS = 60
+
+_ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)\b"?')
+_SCAN = re.compile(r'\bSCAN (\w+)')
+
+
+@dataclass
+class Presupuesto:
+    """
+    Presupuesto de un endpoint: como mucho `max_consultas` consultas y ningún
+    SCAN completo de TABLAS_VIGILADAS salvo las de `scans_permitidos` (p.ej.
+    agregados de todas las tiendas). `ruta` admite {tienda}, {producto},
+    {venta} y {compra} del conjunto de datos estándar.
+
+    En los endpoints masivos `datos(ids, n)` genera un lote de n elementos y el
+    presupuesto es `max_consultas` + `por_elemento` · n: se mide con cada
+    tamaño de ELEMENTOS y cada elemento de más no puede costar más de
+    `por_elemento` consultas (un N+1 nuevo lo supera).
+    """
+    metodo: str
+    ruta: str
+    max_consultas: int
+    datos: Any = None
+    scans_permitidos: Sequence[str] = field(default_factory=tuple)
+    estado: int = 200
+    por_elemento: Optional[int] = None
+
+    def __str__(self):
+        return f"{self.metodo} {self.ruta}"
+
+
+def sembrar_datos() -> Dict[str, Any]:
+    """
+    Conjunto de datos estándar: TIENDAS tiendas con PRODUCTOS_POR_TIENDA
+    productos (algunos bajo el mínimo), una venta diaria por producto durante
+    DIAS días y una compra semanal. Devuelve los ids y fechas a sustituir en
+    las rutas de los presupuestos.
+    """
+    from compra.models import Compra
+    from producto.models import CheckpointStock, Producto
+    from tienda.models import Tienda
+    from venta.models import Venta
+
+    tiendas = Tienda.objects.bulk_create([Tienda(nombre=f"Tienda {i}") for i in range(TIENDAS)])
+    productos = Producto.objects.bulk_create([
+        Producto(tienda=tienda, nombre=f"Producto {i}", stock=40 - 10 * (i % 4), stock_minimo=15, precio=Decimal('2.50'), costo_promedio=Decimal('1.2500'))
+        for tienda in tiendas for i in range(PRODUCTOS_POR_TIENDA)
+    ])
+    CheckpointStock.objects.bulk_create([CheckpointStock(producto=p, stock=p.stock) for p in productos])
+    ventas = Venta.objects.bulk_create([
+        Venta(producto=p, cantidad=1 + dia % 3, total_precio=Decimal('2.50') * (1 + dia % 3), costo_total=Decimal('1.25') * (1 + dia % 3))
+        for p in productos for dia in range(DIAS)
+    ])
+    compras = Compra.objects.bulk_create([
+        Compra(producto=p, cantidad=10, total_precio=Decimal('12.50'))
+        for p in productos for _semana in range(DIAS // 7)
+    ])
+    # auto_now_add ignora la fecha en bulk_create: se reparte después por días
+    ahora = timezone.now()
+    for modelo, filas, paso in ((Venta, ventas, 1), (Compra, compras, 7)):
+        por_dia = {}
+        for i, fila in enumerate(filas):
+            por_dia.setdefault(i % (DIAS // paso), []).append(fila.pk)
+        for dia, pks in por_dia.items():
+            modelo.objects.filter(pk__in=pks).update(fecha_creacion=ahora - timedelta(days=dia * paso))
+    return {
+        'tienda': tiendas[0].pk,
+        'producto': productos[0].pk,
+        'venta': ventas[0].pk,
+        'compra': compras[0].pk,
+        'desde': (timezone.localdate() - timedelta(days=DIAS)).isoformat(),
+        'hoy': timezone.localdate().isoformat(),
+    }
+
+
+def scans_completos(sql: str, plan: Optional[List[str]], tablas: Sequence[str]) -> List[str]:
+    """
+    Líneas del plan que recorren entera alguna de `tablas` (también con su
+    alias U0, V0... de las subconsultas de Django).
+    """
+    alias = {corto: tabla for tabla, corto in _ALIAS.findall(sql)}
+    malas = []
+    for linea in plan or []:
+        m = _SCAN.search(linea)
+        if m and alias.get(m.group(1), m.group(1)) in tablas:
+            malas.append(linea)
+    return malas
+
+
+def _informe(presupuesto: Presupuesto, maximo: int, consultas: list, scans: list, elementos: Optional[int] = None) -> str:
+    """
+    Diferencia legible entre el presupuesto y lo ejecutado: consultas de más
+    (con las repetidas agrupadas, típico de un N+1) y planes con SCAN completo.
+    """
+    lineas = [f"{presupuesto}" + (f" ({elementos} elementos)" if elementos is not None else "")]
+    if len(consultas) > maximo:
+        lineas += [
+            f"- consultas: {maximo}",
+            f"+ consultas: {len(consultas)} (+{len(consultas) - maximo})",
+        ]
+        repetidas = [(sql, n) for sql, n in Counter(c['sql'] for c in consultas).most_common() if n > 1]
+        if repetidas:
+            lineas.append("  repetidas:")
+            lineas += [f"    {n}x {sql}" for sql, n in repetidas]
+        lineas.append("  ejecutadas:")
+        lineas += [f"    {i}. [{c['alias']}] {c['sql']}" for i, c in enumerate(consultas, start=1)]
+    for consulta, malas in scans:
+        lineas.append(f"+ SCAN completo en: {consulta['sql']}")
+        lineas += [f"    {linea}" for linea in malas]
+    return '\n'.join(lineas)
+
+
+# sin hilos en segundo plano ni copia de analítica: todo se lee de 'default'
+sin_segundo_plano = override_settings(
+    ANALITICA_MAX_SEGUNDOS=-1, ANALITICA_REFRESCO_SEGUNDOS=0,
+    VENTAS_EVENTOS_COMPACTAR_SEGUNDOS=0, BORRADO_SEGUNDOS=0, PERFILADO=False,
+)
+
+
+class _ClienteApi:
+    """Llamadas a la API con el cliente de Django."""
+
+    def api(self, metodo: str, ruta: str, datos: Any = None, **extra):
+        """
+        Llama a `ruta` con `datos` como query string (GET) o como cuerpo JSON
+        (resto de métodos). Las respuestas en streaming se consumen enteras.
+        """
+        if metodo == 'GET':
+            respuesta = self.client.get(ruta, datos, **extra)
+        else:
+            respuesta = self.client.generic(
+                metodo, ruta, json.dumps(datos) if datos is not None else '', content_type='application/json', **extra,
+            )
+        if getattr(respuesta, 'streaming', False):
+            respuesta.contenido = b''.join(respuesta.streaming_content)
+        return respuesta
+
+
+@sin_segundo_plano
+class ApiTestCase(_ClienteApi, TestCase):
+    """
+    TestCase para probar la API de punta a punta con el cliente de Django, sin
+    trabajos en segundo plano.
+    """
+
+
+@sin_segundo_plano
+class ApiTransactionTestCase(_ClienteApi, TransactionTestCase):
+    """
+    Como ApiTestCase, para los tests que cambian el esquema (el editor de
+    esquema de SQLite no puede usarse dentro de la transacción de TestCase).
+    """
+
+
+class PresupuestoConsultasTestCase(ApiTestCase):
+    """
+    Comprueba los `presupuestos` de la subclase contra el conjunto de datos
+    estándar. Cada presupuesto es un test propio (test_NN_<ruta>) y, como
+    todo TestCase, se deshace al terminar: los de escritura no afectan a los
+    siguientes.
+    """
+    presupuestos: List[Presupuesto] = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for i, presupuesto in enumerate(cls.presupuestos, start=1):
+            nombre = re.sub(r'\W+', '_', str(presupuesto)).strip('_').lower()
+            setattr(cls, f"test_{i:02d}_{nombre}", lambda self, p=presupuesto: self.comprobar(p))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = sembrar_datos()
+
+    def medir(self, presupuesto: Presupuesto, elementos: Optional[int] = None):
+        ruta = presupuesto.ruta.format(**self.ids)
+        if elementos is not None:
+            datos = presupuesto.datos(self.ids, elementos)
+        else:
+            datos = presupuesto.datos(self.ids) if callable(presupuesto.datos) else presupuesto.datos
+        consultas = []
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(RegistroConsultas(alias, consultas)))
+            respuesta = self.api(presupuesto.metodo, ruta, datos)
+        return respuesta, consultas
+
+    def comprobar(self, presupuesto: Presupuesto):
+        if presupuesto.por_elemento is None:
+            self.comprobar_medicion(presupuesto, presupuesto.max_consultas)
+            return
+        medidas = {
+            n: self.comprobar_medicion(presupuesto, presupuesto.max_consultas + presupuesto.por_elemento * n, n)
+            for n in ELEMENTOS
+        }
+        menos, mas = ELEMENTOS[0], ELEMENTOS[-1]
+        crecimiento = (medidas[mas] - medidas[menos]) / (mas - menos)
+        self.assertLessEqual(
+            crecimiento, presupuesto.por_elemento,
+            f"{presupuesto}: {medidas} consultas por tamaño de lote, {crecimiento:.1f} por elemento (máximo {presupuesto.por_elemento})",
+        )
+
+    def comprobar_medicion(self, presupuesto: Presupuesto, maximo: int, elementos: Optional[int] = None) -> int:
+        respuesta, consultas = self.medir(presupuesto, elementos)
+        self.assertEqual(
+            respuesta.status_code, presupuesto.estado,
+            f"{presupuesto}: {respuesta.status_code} {getattr(respuesta, 'content', b'')[:500]!r}",
+        )
+        vigiladas = [t for t in TABLAS_VIGILADAS if t not in presupuesto.scans_permitidos]
+        scans = []
+        for consulta in consultas:
+            if not consulta['many']:
+                malas = scans_completos(consulta['sql'], plan_consulta(consulta['alias'], consulta['sql'], consulta['params']), vigiladas)
+                if malas:
+                    scans.append((consulta, malas))
+        if len(consultas) > maximo or scans:
+            self.fail(_informe(presupuesto, maximo, consultas, scans, elementos))
+        return len(consultas)
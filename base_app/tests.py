@@ -1,3 +1,203 @@
-from django.test import TestCase
+import io
+import json
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, override_settings
+
+from producto.models import Producto
+from tienda.models import Tienda
+from venta.models import Venta
+
+from . import analitica
+from .arranque import medir_arranque, perezosos_cargados
+from .models import ClaveIdempotencia, PerfilCapturado
+from .shards import RANGO_IDS, replicar_tienda
+from .testing import ApiTestCase, ApiTransactionTestCase
+
+
+class ArranqueTest(SimpleTestCase):
+    """
+    Qué carga el arranque en frío, medido en un proceso nuevo. Si falla,
+    `manage.py tiempo_arranque` muestra qué módulos se importan y cuánto tardan.
+    """
+
+    def test_dependencias_pesadas_perezosas(self):
+        for fase in ('setup', 'wsgi', 'urls'):
+            with self.subTest(fase=fase):
+                self.assertEqual(perezosos_cargados(medir_arranque(fase)['modulos']), [])
+
+    def test_importaciones_dentro_del_presupuesto(self):
+        # se mide la suma de `-X importtime` (la mejor de dos) y no el reloj, y con
+        # el triple de margen: una máquina lenta no lo rompe, una importación
+        # pesada en el arranque sí
+        segundos = min(medir_arranque('wsgi')['importacion_segundos'] for _ in range(2))
+        self.assertLessEqual(segundos, settings.ARRANQUE_MAX_SEGUNDOS * 3)
+
+    def test_manage_py_no_carga_ninja(self):
+        self.assertNotIn('ninja', medir_arranque('setup')['modulos'])
+
+
+class RefrescoAnaliticaTest(SimpleTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        principal = self.directorio / 'principal.sqlite3'
+        with closing(sqlite3.connect(principal)) as conexion, conexion:
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("CREATE TABLE t (x INTEGER)")
+            conexion.execute("INSERT INTO t VALUES (7)")
+        self.copia = self.directorio / 'analitica.sqlite3'
+        ajustes = override_settings(ANALITICA_DB=str(self.copia))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        conexion = connections[DEFAULT_DB_ALIAS]
+        for parche in (
+            mock.patch.object(conexion, 'is_in_memory_db', return_value=False),
+            mock.patch.dict(conexion.settings_dict, NAME=str(principal)),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_copia_con_temporal_propio(self):
+        # temporal de otro worker a medio escribir: no se toca
+        ajeno = self.directorio / 'analitica.sqlite3.tmp'
+        ajeno.write_bytes(b'otro worker')
+        self.assertIsNotNone(analitica.refrescar())
+        self.assertIsNotNone(analitica.refrescar())
+        with closing(sqlite3.connect(self.copia)) as leida:
+            self.assertEqual(leida.execute("SELECT x FROM t").fetchall(), [(7,)])
+            # la copia se abre con mode=ro: sin WAL
+            self.assertEqual(leida.execute("PRAGMA journal_mode").fetchone(), ('delete',))
+        self.assertEqual(ajeno.read_bytes(), b'otro worker')
+        self.assertEqual(
+            sorted(p.name for p in self.directorio.iterdir() if not p.name.startswith('principal')),
+            ['analitica.sqlite3', 'analitica.sqlite3.lock', 'analitica.sqlite3.tmp'],
+        )
+
+    @unittest.skipIf(analitica.fcntl is None, "sin flock")
+    def test_un_solo_proceso_copia(self):
+        # otro worker tiene el lock: no se copia
+        with open(self.directorio / 'analitica.sqlite3.lock', 'a') as otro:
+            analitica.fcntl.flock(otro, analitica.fcntl.LOCK_EX)
+            self.assertIsNone(analitica.refrescar())
+        self.assertFalse(self.copia.exists())
+        # con el lock libre copia, y el hilo no repite mientras la copia esté al día
+        self.assertIsNotNone(analitica.refrescar(max_antiguedad=60))
+        self.assertIsNone(analitica.refrescar(max_antiguedad=60))
+        self.assertIsNotNone(analitica.refrescar())
+
+
+class MoverTiendaTest(ApiTransactionTestCase):
+    """
+    Una tienda en un shard de prueba (un fichero SQLite migrado para el test)
+    que se devuelve a 'default' con `manage.py mover_tienda`.
+    """
+    SHARD = 'shard_prueba'
+
+    @classmethod
+    def setUpClass(cls):
+        directorio = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directorio.cleanup)
+        connections.settings[cls.SHARD] = {**connections.settings[DEFAULT_DB_ALIAS], 'NAME': str(Path(directorio.name) / 'shard.sqlite3')}
+        cls.addClassCleanup(connections.settings.pop, cls.SHARD)
+        cls.addClassCleanup(connections.__delitem__, cls.SHARD)
+        cls.addClassCleanup(lambda: connections[cls.SHARD].close())
+        shards = override_settings(SHARDS={cls.SHARD: connections.settings[cls.SHARD]['NAME']})
+        shards.enable()
+        cls.addClassCleanup(shards.disable)
+        call_command('migrate', database=cls.SHARD, verbosity=0)
+        # el runner no conoce el alias: se añade después de preparar las bases
+        cls.databases = {DEFAULT_DB_ALIAS, cls.SHARD}
+        super().setUpClass()
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda", shard=self.SHARD)
+        replicar_tienda(self.tienda)
+        respuesta = self.client.post('/api/producto/create/', {'producto_in': json.dumps({
+            'tienda_id': self.tienda.pk, 'nombre': "Café", 'detalles': None, 'stock': 5, 'precio': '2.00',
+        })})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.producto_id = respuesta.json()['id']
+        self.venta = self.api('POST', '/api/venta/create/', {'producto_id': self.producto_id, 'cantidad': 2}).json()
+
+    def test_filas_en_el_shard_de_la_tienda(self):
+        # ids del rango del shard: no chocan con los de otras bases
+        self.assertGreaterEqual(self.producto_id, RANGO_IDS)
+        self.assertFalse(Producto.objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertEqual(Producto.objects.using(self.SHARD).get().stock, 3)
+
+    def test_claves_de_idempotencia_en_el_shard(self):
+        # la respuesta guardada se confirma con la venta, en la base de la tienda
+        datos = {'producto_id': self.producto_id, 'cantidad': 1}
+        primera = self.api('POST', '/api/venta/create/', datos, HTTP_IDEMPOTENCY_KEY='clave-1')
+        repetida = self.api('POST', '/api/venta/create/', datos, HTTP_IDEMPOTENCY_KEY='clave-1')
+        self.assertEqual((repetida['Idempotent-Replayed'], repetida.json()), ('true', primera.json()))
+        self.assertTrue(ClaveIdempotencia.objects.using(self.SHARD).filter(clave='clave-1', estado=200).exists())
+        self.assertFalse(ClaveIdempotencia.objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertEqual(Producto.objects.using(self.SHARD).get().stock, 2)
+
+    def test_mover_conserva_ids_y_lecturas(self):
+        call_command('mover_tienda', self.tienda.pk, DEFAULT_DB_ALIAS, stdout=io.StringIO())
+        self.assertFalse(Producto.objects.using(self.SHARD).exists())
+        self.assertEqual(list(Venta.objects.using(DEFAULT_DB_ALIAS).values_list('pk', flat=True)), [self.venta['id']])
+        self.assertEqual(Tienda.objects.get(pk=self.tienda.pk).shard, '')
+        ventas = self.api('GET', f'/api/venta/list/{self.tienda.pk}/').json()
+        self.assertEqual([v['id'] for v in ventas['items']], [self.venta['id']])
+        self.assertEqual(self.api('GET', f'/api/producto/detalle/{self.producto_id}/').json()['stock'], 3)
+
+
+class PerfiladoTest(ApiTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = Path(directorio.name)
+        self.enterContext(override_settings(PERFILADO=True, PERFILADO_DIR=self.directorio, PERFILADO_MAX=1))
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.usuario = User.objects.create_user('staff', is_staff=True)
+
+    def perfilar(self):
+        return self.api('GET', f'/api/producto/list/{self.tienda.pk}/', HTTP_X_PERFILAR='1')
+
+    def test_solo_staff_y_bajo_demanda(self):
+        self.assertFalse(self.perfilar().has_header('X-Perfil'))
+        self.client.force_login(self.usuario)
+        self.assertFalse(self.api('GET', f'/api/producto/list/{self.tienda.pk}/').has_header('X-Perfil'))
+        self.assertFalse(PerfilCapturado.objects.exists())
+
+    def test_valores_falsos_no_perfilan(self):
+        self.client.force_login(self.usuario)
+        ruta = f'/api/producto/list/{self.tienda.pk}/'
+        for valor in ('0', 'false', 'False', 'no', 'off', ''):
+            with self.subTest(valor=valor):
+                self.assertFalse(self.api('GET', ruta, HTTP_X_PERFILAR=valor).has_header('X-Perfil'))
+                self.assertFalse(self.api('GET', ruta, {'perfilar': valor}).has_header('X-Perfil'))
+        self.assertFalse(PerfilCapturado.objects.exists())
+        self.assertTrue(self.api('GET', ruta, {'perfilar': 'true'}).has_header('X-Perfil'))
+
+    def test_perfil_con_consultas_y_planes(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.perfilar()
+        self.assertEqual(respuesta.status_code, 200)
+        perfil = PerfilCapturado.objects.get(pk=respuesta['X-Perfil'])
+        self.assertEqual((perfil.usuario, perfil.estado, perfil.num_consultas), ('staff', 200, len(perfil.consultas)))
+        self.assertTrue(perfil.funciones)
+        consulta = next(c for c in perfil.consultas if 'productos' in c['sql'])
+        self.assertTrue(consulta['plan'])
+        self.assertTrue(Path(perfil.archivo).exists())
+
+        # sólo se conservan los PERFILADO_MAX últimos, con sus ficheros
+        siguiente = self.perfilar()
+        self.assertEqual(list(PerfilCapturado.objects.values_list('pk', flat=True)), [int(siguiente['X-Perfil'])])
+        self.assertFalse(Path(perfil.archivo).exists())
@@ -1,62 +1,101 @@
 from ninja import Router
+from ninja.errors import HttpError
 from .models import Compra
 from .schemas import CompraSchema, CompraInSchema
-from typing import List, Optional
+from typing import List, Literal, Optional
+from datetime import date
+from base_app.models import CentavosField
+from base_app.sincronizacion import registrar_eliminaciones
+from base_app.eventos import publicar_operacion
+from base_app.idempotencia import idempotente
+from base_app.concurrencia import guardar_cambios
+from base_app.shards import en_shard, por_objeto, por_tienda, shard_comun, shard_de_objeto
+from base_app.analitica import lectura_analitica
+from base_app.archivo import filtrar_por_fecha, querysets, unir
+from base_app.exportacion import FILAS_POR_BLOQUE, rango_fechas, respuesta_csv, respuesta_xlsx
 from ninja.pagination import paginate
 from django.shortcuts import get_object_or_404
 from producto.models import Producto
 from django.utils import timezone
-from django.db.models import F
-from decimal import Decimal, InvalidOperation
+from producto.stock import aplicar_movimiento, aplicar_movimientos
+from producto.costos import registrar_costo_compra, registrar_costos_compra
+from decimal import Decimal
 from tienda.models import Tienda
 from django.db import transaction
+from django.db.models import F, Value
 
 router = Router(tags=["Compra"])
 
 @router.get("/list/{tienda_id}/", response=List[CompraSchema])
+@por_tienda
 @paginate
 def list_compras(request, tienda_id: int, dia: Optional[int] = None, mes: Optional[int] = None, ano: Optional[int] = None):
     """
     List all compras for productos in a specific tienda with pagination.
     """
-    qs = Compra.objects.filter(producto__tienda_id=tienda_id)
-    if dia is not None:
-        qs = qs.filter(fecha_creacion__day=dia)
-    if mes is not None:
-        qs = qs.filter(fecha_creacion__month=mes)
-    if ano is not None:
-        qs = qs.filter(fecha_creacion__year=ano)
+    # incluye las tablas de archivo que alcance el filtro de año
+    qs = filtrar_por_fecha(Compra, dia, mes, ano, select_related=('producto',), producto__tienda_id=tienda_id)
     return qs.order_by('-fecha_creacion')
 
 @router.get("/get/{producto_id}/", response=List[CompraSchema])
+@por_objeto('producto.Producto', 'producto_id')
 @paginate
 def list_compras_by_producto(request, producto_id: int, dia: Optional[int] = None, mes: Optional[int] = None, ano: Optional[int] = None):
     """
     List all compras for a specific producto with pagination.
     """
-    qs = Compra.objects.filter(producto_id=producto_id)
-    if dia is not None:
-        qs = qs.filter(fecha_creacion__day=dia)
-    if mes is not None:
-        qs = qs.filter(fecha_creacion__month=mes)
-    if ano is not None:
-        qs = qs.filter(fecha_creacion__year=ano)
+    # incluye las tablas de archivo que alcance el filtro de año
+    qs = filtrar_por_fecha(Compra, dia, mes, ano, select_related=('producto',), producto_id=producto_id)
     return qs.order_by('-fecha_creacion')
 
+@router.get("/export/{tienda_id}/")
+@por_tienda
+@lectura_analitica
+def export_compras(request, tienda_id: int, desde: date, hasta: date, formato: Literal['csv', 'xlsx'] = 'csv'):
+    """
+    Exporta en streaming las compras de una tienda entre `desde` y `hasta` (incluidos).
+    `formato` puede ser csv (por defecto) o xlsx (requiere openpyxl).
+    """
+    inicio, fin = rango_fechas(desde, hasta)
+    filas = (
+        unir([
+            qs.filter(producto__tienda_id=tienda_id, fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+            .values_list('id', 'fecha_creacion', 'producto_id', 'producto__nombre', 'cantidad', 'total_precio')
+            for qs in querysets(Compra, inicio, fin)
+        ])
+        .order_by('fecha_creacion', 'id')
+        .iterator(chunk_size=FILAS_POR_BLOQUE)
+    )
+    cabecera = ['id', 'fecha', 'producto_id', 'producto', 'cantidad', 'total_precio']
+    nombre = f"compras_{tienda_id}_{desde.isoformat()}_{hasta.isoformat()}"
+    if formato == 'xlsx':
+        return respuesta_xlsx(nombre, cabecera, filas)
+    return respuesta_csv(nombre, cabecera, filas)
+
+
+def _sumar(compra_id: int, cantidad: int, total: Decimal):
+    """
+    Suma a la fila diaria con un UPDATE atómico (F()) para no perder
+    incrementos de peticiones concurrentes.
+    """
+    Compra.objects.filter(pk=compra_id).update(
+        cantidad=F('cantidad') + cantidad,
+        total_precio=F('total_precio') + Value(total, output_field=CentavosField()),
+        version=F('version') + 1,
+        ultima_actualicacion=timezone.now(),
+    )
+
+
 @router.post("/create/", response=CompraSchema)
+@en_shard(lambda kwargs: shard_de_objeto(Producto, kwargs['compra_in'].producto_id))
+@idempotente(CompraSchema)
 def create_compra(request, compra_in: CompraInSchema):
     """
     Create a new compra.
     """
     producto = get_object_or_404(Producto, id=compra_in.producto_id)
-    # calcular total (asegurar Decimal)
-    if compra_in.total_precio:
-        try:
-            total = Decimal(str(compra_in.total_precio))
-        except (InvalidOperation, TypeError):
-            total = Decimal(producto.precio) * Decimal(compra_in.cantidad)
-    else:
-        total = Decimal(producto.precio) * Decimal(compra_in.cantidad)
+    # sin total explícito: precio del producto por la cantidad
+    total = compra_in.total_precio or producto.precio * compra_in.cantidad
     # normalizar fecha_creacion si viene en el payload, usar hoy si no
     fecha_dt = None
     if getattr(compra_in, 'fecha_creacion', None):
@@ -69,29 +108,36 @@ def create_compra(request, compra_in: CompraInSchema):
         fecha_dt = None
 
     # buscar compra existente del mismo producto en la misma fecha
-    compra = Compra.objects.filter(producto=producto, fecha_creacion__date=compra_date).first()
-    if compra:
-        compra.cantidad = compra.cantidad + compra_in.cantidad
-        compra.total_precio = compra.total_precio + total
-        compra.save()
-        delta = compra_in.cantidad
-    else:
-        compra = Compra.objects.create(
-            producto=producto,
-            cantidad=compra_in.cantidad,
-            total_precio=total,
-            **({'fecha_creacion': fecha_dt} if fecha_dt else {})
-        )
-        delta = compra_in.cantidad
-
-    # Actualizar el stock del producto (aumenta en la cantidad comprada) usando F() para ser atómico
-    Producto.objects.filter(pk=producto.pk).update(stock=F('stock') + delta)
+    with transaction.atomic():
+        compra = Compra.objects.filter(producto=producto, fecha_creacion__date=compra_date).first()
+        if compra:
+            _sumar(compra.pk, compra_in.cantidad, total)
+            compra.refresh_from_db()
+            delta = compra_in.cantidad
+            accion = 'actualizada'
+        else:
+            compra = Compra.objects.create(
+                producto=producto,
+                cantidad=compra_in.cantidad,
+                total_precio=total,
+                **({'fecha_creacion': fecha_dt} if fecha_dt else {})
+            )
+            delta = compra_in.cantidad
+            accion = 'creada'
+
+        # coste medio ponderado con el stock previo a la compra
+        registrar_costo_compra(producto.pk, delta, total)
+        # Actualizar el stock del producto (aumenta en la cantidad comprada) y registrarlo en el diario
+        aplicar_movimiento(producto.pk, delta, 'compra', compra.pk)
+        publicar_operacion('compra', compra, producto.tienda_id, accion, total)
     # refrescar instancia para devolver datos actualizados
     return Compra.objects.get(pk=compra.pk)
 
 
 
 @router.post("/bulk/", response=List[CompraSchema])
+@en_shard(lambda kwargs: shard_comun(Producto, [v.producto_id for v in kwargs['compras_in']]))
+@idempotente(CompraSchema)
 def create_compras_bulk(request, compras_in: List[CompraInSchema]):
     """
     Crear múltiples compras en una sola petición y actualizar stock por cada una.
@@ -99,41 +145,45 @@ def create_compras_bulk(request, compras_in: List[CompraInSchema]):
     """
     created_map = {}  # key: (producto_id, fecha.date()) -> Compra
     stock_deltas = {}
+    totales = {}
+    tiendas = {}
+    acciones = {}
+    productos = Producto.objects.in_bulk({v.producto_id for v in compras_in})
+    faltan = {v.producto_id for v in compras_in} - productos.keys()
+    if faltan:
+        raise HttpError(404, f"Producto(s) no encontrado(s): {sorted(faltan)}")
+    # Normalizar fecha por item
+    fechas = []
+    for compra_in in compras_in:
+        fecha_dt = None
+        if getattr(compra_in, 'fecha_creacion', None):
+            fecha_dt = compra_in.fecha_creacion
+            if timezone.is_naive(fecha_dt):
+                fecha_dt = timezone.make_aware(fecha_dt, timezone.get_default_timezone())
+            fechas.append((fecha_dt, fecha_dt.date()))
+        else:
+            fechas.append((None, timezone.localdate()))
     with transaction.atomic():
-        for compra_in in compras_in:
-            producto = get_object_or_404(Producto, id=compra_in.producto_id)
+        # filas diarias ya existentes de todo el lote en una sola consulta
+        # (bloqueo de búsqueda para evitar races por producto+fecha)
+        existentes = {}
+        filas = Compra.objects.select_for_update().filter(
+            producto_id__in=productos.keys(), fecha_creacion__date__in={d for _f, d in fechas},
+        ).order_by('pk')
+        for fila in filas:
+            existentes.setdefault((fila.producto_id, timezone.localdate(fila.fecha_creacion)), fila)
+        for compra_in, (fecha_dt, compra_date) in zip(compras_in, fechas):
+            producto = productos[compra_in.producto_id]
             pid = producto.pk
-            if compra_in.total_precio:
-                try:
-                    total = Decimal(str(compra_in.total_precio))
-                except (InvalidOperation, TypeError):
-                    total = Decimal(producto.precio) * Decimal(compra_in.cantidad)
-            else:
-                total = Decimal(producto.precio) * Decimal(compra_in.cantidad)
-
-            # Normalizar fecha por item
-            fecha_dt = None
-            if getattr(compra_in, 'fecha_creacion', None):
-                fecha_dt = compra_in.fecha_creacion
-                if timezone.is_naive(fecha_dt):
-                    fecha_dt = timezone.make_aware(fecha_dt, timezone.get_default_timezone())
-                compra_date = fecha_dt.date()
-            else:
-                compra_date = timezone.localdate()
+            total = compra_in.total_precio or producto.precio * compra_in.cantidad
 
             key = (pid, compra_date)
             if key in created_map:
-                compra = created_map[key]
-                compra.cantidad = compra.cantidad + compra_in.cantidad
-                compra.total_precio = compra.total_precio + total
-                compra.save()
+                _sumar(created_map[key].pk, compra_in.cantidad, total)
             else:
-                # bloquear búsqueda para evitar race por producto+fecha
-                existing = Compra.objects.select_for_update().filter(producto=producto, fecha_creacion__date=compra_date).first()
+                existing = existentes.get(key)
                 if existing:
-                    existing.cantidad = existing.cantidad + compra_in.cantidad
-                    existing.total_precio = existing.total_precio + total
-                    existing.save()
+                    _sumar(existing.pk, compra_in.cantidad, total)
                     compra = existing
                 else:
                     compra = Compra.objects.create(
@@ -142,42 +192,82 @@ def create_compras_bulk(request, compras_in: List[CompraInSchema]):
                         total_precio=total,
                         **({'fecha_creacion': fecha_dt} if fecha_dt else {})
                     )
+                    acciones[key] = 'creada'
                 created_map[key] = compra
 
-            stock_deltas[pid] = stock_deltas.get(pid, 0) + compra_in.cantidad
+            stock_deltas[key] = stock_deltas.get(key, 0) + compra_in.cantidad
+            totales[key] = totales.get(key, 0) + total
+            tiendas[pid] = producto.tienda_id
 
-        # aplicar actualizaciones de stock por producto de forma atómica
-        for pid, delta in stock_deltas.items():
-            Producto.objects.filter(pk=pid).update(stock=F('stock') + delta)
+        # releer las filas tras los incrementos atómicos
+        frescas = Compra.objects.select_related('producto').in_bulk([c.pk for c in created_map.values()])
+        created_map = {key: frescas[c.pk] for key, c in created_map.items()}
+        registrar_costos_compra([
+            (pid, delta, totales[(pid, compra_date)])
+            for (pid, compra_date), delta in stock_deltas.items()
+        ])
+        # aplicar actualizaciones de stock por producto de forma atómica y registrarlas en el diario
+        aplicar_movimientos([
+            (pid, delta, 'compra', created_map[(pid, compra_date)].pk)
+            for (pid, compra_date), delta in stock_deltas.items()
+        ])
+        for (pid, compra_date), compra in created_map.items():
+            key = (pid, compra_date)
+            publicar_operacion('compra', compra, tiendas[pid], acciones.get(key, 'actualizada'), totales[key])
 
     # devolver las compras afectadas ordenadas por fecha_creacion desc
     created = list(created_map.values())
     return sorted(created, key=lambda c: c.fecha_creacion, reverse=True)
 
 @router.patch("/update/{compra_id}/", response=CompraSchema)
+@por_objeto('compra.Compra', 'compra_id')
 def update_compra(request, compra_id: int, compra_in: CompraInSchema):
     """
     Update an existing compra.
     """
-    compra = get_object_or_404(Compra, id=compra_id)
+    compra = get_object_or_404(Compra.visibles, id=compra_id)
     updates = compra_in.dict(exclude_unset=True)
+    version = updates.pop('version', None)
     # Normalizar fecha_creacion si viene
     if 'fecha_creacion' in updates and updates['fecha_creacion'] is not None:
         fecha_dt = updates['fecha_creacion']
         if timezone.is_naive(fecha_dt):
             fecha_dt = timezone.make_aware(fecha_dt, timezone.get_default_timezone())
         updates['fecha_creacion'] = fecha_dt
-    for attr, value in updates.items():
-        setattr(compra, attr, value)
-    compra.save()
+    anterior = (compra.producto_id, compra.cantidad)
+    total_anterior = compra.total_precio
+    with transaction.atomic():
+        # sólo se escriben los campos modificados y sólo si nadie cambió la fila entretanto
+        guardar_cambios(compra, updates, version)
+        # revertir la compra anterior en el coste medio y aplicar la nueva (antes de mover el stock)
+        registrar_costos_compra([
+            (anterior[0], -anterior[1], -total_anterior),
+            (compra.producto_id, compra.cantidad, compra.total_precio),
+        ])
+        # revertir el efecto de la fila anterior sobre el stock y aplicar el de la nueva
+        if compra.producto_id == anterior[0]:
+            aplicar_movimiento(compra.producto_id, compra.cantidad - anterior[1], 'compra', compra.pk)
+        else:
+            aplicar_movimientos([
+                (anterior[0], -anterior[1], 'compra', compra.pk),
+                (compra.producto_id, compra.cantidad, 'compra', compra.pk),
+            ])
+        publicar_operacion('compra', compra, compra.producto.tienda_id, 'actualizada', compra.total_precio - total_anterior)
     return compra
 
 
 @router.delete("/delete/{compra_id}/", response={204: None})
+@por_objeto('compra.Compra', 'compra_id')
 def delete_compra(request, compra_id: int):
     """
     Delete a compra by its ID.
     """
-    compra = get_object_or_404(Compra, id=compra_id)
-    compra.delete()
+    compra = get_object_or_404(Compra.visibles, id=compra_id)
+    with transaction.atomic():
+        # retirar del coste medio y del stock las unidades compradas
+        registrar_costo_compra(compra.producto_id, -compra.cantidad, -compra.total_precio)
+        aplicar_movimiento(compra.producto_id, -compra.cantidad, 'compra', compra.pk)
+        registrar_eliminaciones('compra', [(compra.pk, compra.producto.tienda_id)])
+        publicar_operacion('compra', compra, compra.producto.tienda_id, 'eliminada', -compra.total_precio)
+        compra.delete()
     return 204
\ No newline at end of file
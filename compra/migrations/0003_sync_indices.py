@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compra', '0002_rename_created_at_compra_fecha_creacion_and_more'),
+        ('producto', '0006_productos_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['ultima_actualicacion', 'id'], name='compra_sync'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:33
+
+import re
+
+import base_app.models
+from django.db import migrations
+
+A_CENTAVOS = "CAST(ROUND({c} * 100) AS INTEGER)"
+A_DECIMAL = "ROUND({c} / 100.0, 2)"
+
+
+def _escalar(schema_editor, tabla, columnas, expresion):
+    # la tabla viva y sus tablas de archivo por año (base_app/archivo.py)
+    conexion = schema_editor.connection
+    q = conexion.ops.quote_name
+    patron = re.compile(rf"^{tabla}(_archivo_\d{{4}})?$")
+    with conexion.cursor() as cursor:
+        for nombre in conexion.introspection.table_names(cursor):
+            if patron.match(nombre):
+                asignaciones = ', '.join(f"{q(c)} = {expresion.format(c=q(c))}" for c in columnas)
+                cursor.execute(f"UPDATE {q(nombre)} SET {asignaciones}")
+
+
+def a_centavos(apps, schema_editor):
+    _escalar(schema_editor, 'compras', ['total_precio'], A_CENTAVOS)
+
+
+def a_decimal(apps, schema_editor):
+    _escalar(schema_editor, 'compras', ['total_precio'], A_DECIMAL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compra', '0004_version'),
+    ]
+
+    operations = [
+        # primero los valores (a céntimos) y después el tipo de la columna
+        migrations.RunPython(a_centavos, a_decimal),
+        migrations.AlterField(
+            model_name='compra',
+            name='total_precio',
+            field=base_app.models.CentavosField(),
+        ),
+    ]
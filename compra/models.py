@@ -1,10 +1,20 @@
-from base_app.models import BaseModel
+from base_app.models import BaseModel, CentavosField, VisiblesManager
 from producto.models import Producto
 from django.db import models
 class Compra(BaseModel):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='compras')
     cantidad = models.PositiveIntegerField()
-    total_precio = models.DecimalField(max_digits=10, decimal_places=2)
+    total_precio = CentavosField()
+    # control de concurrencia optimista en las actualizaciones de la fila diaria
+    version = models.PositiveIntegerField(default=0)
+
+    # manager por defecto sin filtro: las escrituras por pk no cruzan con productos
+    objects = models.Manager()
+    # listados e informes: sin las filas de productos pendientes de borrado
+    visibles = VisiblesManager('producto__eliminado')
 
     class Meta:
-        db_table = 'compras'
\ No newline at end of file
+        db_table = 'compras'
+        indexes = [
+            models.Index(fields=['ultima_actualicacion', 'id'], name='compra_sync'),
+        ]
\ No newline at end of file
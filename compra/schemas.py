@@ -1,6 +1,8 @@
 from ninja import Schema,ModelSchema
+import base_app.schemas  # noqa: F401  (registra CentavosField en ninja)
 from compra.models import Compra
 from typing import Optional
+from decimal import Decimal
 from datetime import datetime
 
 class CompraSchema(ModelSchema):
@@ -20,8 +22,9 @@ class CompraSchema(ModelSchema):
 class CompraInSchema(Schema):
     producto_id: int
     cantidad: int
-    total_precio: Optional[float] = 0.0
+    total_precio: Optional[Decimal] = None  # sin él: precio del producto por la cantidad
     fecha_creacion: Optional[datetime] = None  # Opcional: fecha/hora para asignar en creación
+    version: Optional[int] = None  # la leída por el cliente, para detectar conflictos al actualizar
 
 class SimpleCompraSchema(Schema):
     id: int
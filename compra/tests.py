@@ -1,3 +1,102 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from base_app.archivo import modelo_archivo
+from base_app.testing import ApiTestCase, ApiTransactionTestCase, Presupuesto, PresupuestoConsultasTestCase
+from producto.models import MovimientoStock, Producto
+from tienda.models import Tienda
+
+from .models import Compra
+
+
+def _lote(ids, n):
+    return [{'producto_id': ids['producto'] + i, 'cantidad': 1, 'total_precio': 5} for i in range(n)]
+
+
+class PresupuestosCompraTest(PresupuestoConsultasTestCase):
+    presupuestos = [
+        Presupuesto('GET', '/api/compra/list/{tienda}/', 3),
+        Presupuesto('GET', '/api/compra/list/{tienda}/?mes=1', 3),
+        Presupuesto('GET', '/api/compra/get/{producto}/', 3),
+        Presupuesto('GET', '/api/compra/export/{tienda}/?desde={desde}&hasta={hoy}', 2),
+        Presupuesto('POST', '/api/compra/create/', 14, datos=lambda ids: {'producto_id': ids['producto'], 'cantidad': 1, 'total_precio': 5}),
+        # fijo + fila diaria, coste medio y stock por elemento
+        Presupuesto('POST', '/api/compra/bulk/', 9, datos=_lote, por_elemento=3),
+        Presupuesto('PATCH', '/api/compra/update/{compra}/', 11, datos=lambda ids: {'producto_id': ids['producto'], 'cantidad': 2}),
+        Presupuesto('DELETE', '/api/compra/delete/{compra}/', 12, estado=204),
+    ]
+
+
+class StockCompraTest(ApiTestCase):
+
+    def setUp(self):
+        tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=tienda, nombre="Café", stock=0, precio=Decimal('2.00'))
+        self.compra = self.api('POST', '/api/compra/create/', {'producto_id': self.producto.pk, 'cantidad': 10, 'total_precio': '15'}).json()
+
+    def test_borrar_compra_ya_vendida_es_conflicto(self):
+        self.assertEqual(self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 4}).status_code, 200)
+        respuesta = self.api('DELETE', f"/api/compra/delete/{self.compra['id']}/")
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertIn('Stock insuficiente', respuesta.json()['detail'])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 6)
+        self.assertTrue(Compra.objects.filter(pk=self.compra['id']).exists())
+
+    def test_reducir_compra_por_debajo_de_lo_vendido_es_conflicto(self):
+        self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 8})
+        respuesta = self.api('PATCH', f"/api/compra/update/{self.compra['id']}/", {'producto_id': self.producto.pk, 'cantidad': 5})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(Compra.objects.get(pk=self.compra['id']).cantidad, 10)
+        self.assertEqual(MovimientoStock.objects.filter(producto=self.producto).count(), 2)
+
+    def test_borrar_compra_devuelve_el_stock_al_diario(self):
+        self.assertEqual(self.api('DELETE', f"/api/compra/delete/{self.compra['id']}/").status_code, 204)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 0)
+        self.assertEqual(list(MovimientoStock.objects.filter(producto=self.producto).values_list('delta', flat=True)), [10, -10])
+
+
+class MigracionCentavosTest(ApiTransactionTestCase):
+    """
+    0005_centavos pasa los importes ya guardados (también los de las tablas de
+    archivo) a céntimos y la migración inversa los devuelve a decimales.
+    """
+    ANTES = [('compra', '0004_version')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(self.restaurar)
+        producto = Producto.objects.create(tienda=Tienda.objects.create(nombre="Tienda"), nombre="Café", stock=0)
+        self.migrar(self.ANTES)
+        CompraAntigua = self.executor.loader.project_state(self.ANTES).apps.get_model('compra', 'Compra')
+        self.compra = CompraAntigua.objects.create(producto_id=producto.pk, cantidad=1, total_precio=Decimal('12.50'))
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE compras_archivo_2020 AS SELECT * FROM compras")
+
+    def migrar(self, destino):
+        self.executor.loader.build_graph()
+        self.executor.migrate(destino)
+
+    def restaurar(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS compras_archivo_2020")
+        self.migrar(self.executor.loader.graph.leaf_nodes())
+
+    def guardado(self):
+        with connection.cursor() as cursor:
+            return [
+                cursor.execute(f"SELECT total_precio FROM {tabla}").fetchone()[0]
+                for tabla in ('compras', 'compras_archivo_2020')
+            ]
+
+    def test_ida_y_vuelta(self):
+        self.migrar([('compra', '0005_centavos')])
+        self.assertEqual(self.guardado(), [1250, 1250])
+        self.assertEqual(Compra.objects.get(pk=self.compra.pk).total_precio, Decimal('12.50'))
+        self.assertEqual(modelo_archivo(Compra, 2020).objects.get().total_precio, Decimal('12.50'))
+
+        self.migrar(self.ANTES)
+        self.assertEqual(self.guardado(), [12.5, 12.5])
@@ -5,6 +5,7 @@ from producto.api import router as producto_router
 from compra.api import router as compra_router
 from venta.api import router as venta_router
 from dashboard.api import router as dashboard_router
+from producto.stock import StockInsuficiente
 
 api = NinjaAPI()
 
@@ -13,3 +14,9 @@ api.add_router("/producto/", producto_router)
 api.add_router("/compra/", compra_router)
 api.add_router("/venta/", venta_router)
 api.add_router("/dashboard/", dashboard_router)
+
+
+@api.exception_handler(StockInsuficiente)
+def stock_insuficiente(request, exc):
+    # conflicto con el estado actual del stock, no un error del servidor
+    return api.create_response(request, {'detail': str(exc)}, status=409)
@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'base_app.perfilado.PerfiladoMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -81,13 +82,35 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Copia de solo lectura de la base principal para el dashboard, las
+# exportaciones y la actividad reciente (ver base_app/analitica.py)
+ANALITICA_DB = BASE_DIR / 'db_analitica.sqlite3'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # WAL: la copia de analítica y los lectores no bloquean a los escritores
+        'OPTIONS': {'init_command': 'PRAGMA journal_mode=WAL'},
+    },
+    'analitica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{ANALITICA_DB}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Sharding por tienda (opcional): alias -> fichero. Los productos, ventas y
+# compras de cada tienda viven en su shard (Tienda.shard); vacío = todo en
+# 'default'. Cada shard se migra con `migrate --database <alias>` y las
+# tiendas se mueven con `manage.py mover_tienda`. Ejemplo:
+# SHARDS = {'shard_1': BASE_DIR / 'db_shard_1.sqlite3'}
+SHARDS = {}
+for _alias, _ruta in SHARDS.items():
+    DATABASES[_alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': _ruta}
+
+DATABASE_ROUTERS = ['base_app.shards.ShardRouter', 'base_app.analitica.AnaliticaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,6 +150,78 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Diario de stock: cada cuántos días se guarda un checkpoint por producto.
+# El inventario histórico suma como máximo un periodo de movimientos.
+STOCK_CHECKPOINT_DIAS = 1
+
+# Eventos en tiempo real (SSE /api/dashboard/stream/{tienda_id}/).
+# 'memoria': difusor por proceso; 'sqlite': tabla eventos_tienda sondeada por
+# cada stream, para despliegues con varios workers. Los streams necesitan un
+# servidor ASGI (core.asgi:application): con WSGI cada uno ocupa un hilo.
+EVENTOS_BACKEND = 'memoria'
+EVENTOS_POLL_SEGUNDOS = 1
+EVENTOS_HEARTBEAT_SEGUNDOS = 15
+EVENTOS_RETENCION_MINUTOS = 60
+
+# Cabecera Idempotency-Key en /venta y /compra create/bulk: horas que se
+# conserva la respuesta (limpieza con `manage.py limpiar_idempotencia`).
+IDEMPOTENCIA_TTL_HORAS = 24
+# segundos tras los que una clave reservada sin respuesta (worker caído a mitad
+# de la petición) se da por abandonada y se puede reutilizar
+IDEMPOTENCIA_EN_CURSO_SEGUNDOS = 300
+
+# Pronóstico de demanda: días de historial, factor del suavizado exponencial
+# y días de demanda que debe cubrir la cantidad sugerida a reponer
+PRONOSTICO_DIAS = 56
+PRONOSTICO_ALFA = 0.3
+PRONOSTICO_COBERTURA_DIAS = 14
+
+# Caché de la demanda del pronóstico y del heatmap. invalidar_pronostico borra
+# las claves de la demanda y cambia la versión de ventas que llevan las del
+# heatmap, así que con varios workers tiene que ser compartida
+# (Redis, Memcached o FileBasedCache en un único servidor): con LocMemCache cada
+# proceso sólo invalida su propia copia y los demás siguen sirviendo la antigua
+# hasta el día siguiente. `manage.py check --deploy` avisa de ello (base_app.W001).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Registro append-only de ventas (/venta/evento/): cada venta es un INSERT y un
+# compactador la suma después a la fila diaria y al stock. El hilo compacta
+# cada VENTAS_EVENTOS_COMPACTAR_SEGUNDOS (0 = sólo `manage.py compactar_ventas`).
+VENTAS_EVENTOS = False
+VENTAS_EVENTOS_COMPACTAR_SEGUNDOS = 5
+
+# Borrado de tiendas y productos en segundo plano: el DELETE los oculta y un
+# hilo borra sus filas por lotes cada BORRADO_SEGUNDOS (0 = sólo
+# `manage.py procesar_borrados`)
+BORRADO_SEGUNDOS = 5
+
+# Archivo de ventas/compras: `manage.py archivar` mueve a tablas por año
+# (ventas_archivo_AAAA, compras_archivo_AAAA) las filas con más de estos días
+ARCHIVO_DIAS = 730
+
+# Base de analítica: antigüedad máxima (segundos) con la que se sigue usando
+# la copia (si no, se lee de la principal) y cada cuánto la refresca el hilo
+# en segundo plano (0 = sólo `manage.py refrescar_analitica`)
+ANALITICA_MAX_SEGUNDOS = 300
+ANALITICA_REFRESCO_SEGUNDOS = 60
+
+# Perfilado bajo demanda: con PERFILADO activo, las peticiones de usuarios staff
+# con la cabecera `X-Perfilar: 1` o `?perfilar=1` se ejecutan bajo pyinstrument
+# (si está instalado) o cProfile. El perfil, el SQL y su EXPLAIN QUERY PLAN se
+# guardan en PERFILADO_DIR y en el admin (se conservan los PERFILADO_MAX últimos).
+PERFILADO = False
+PERFILADO_DIR = BASE_DIR / 'perfiles'
+PERFILADO_MAX = 100
+
+# Arranque en frío: segundos máximos para cargar la aplicación WSGI en un
+# proceso nuevo (`manage.py tiempo_arranque`, que falla con --estricto; los
+# tests comprueban el tiempo de importación con el triple de margen)
+ARRANQUE_MAX_SEGUNDOS = 2.0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
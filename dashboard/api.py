@@ -1,15 +1,36 @@
-from ninja import Router
-from .schemas import StoreSummary, TopStore
+from ninja import Query, Router
+from ninja.errors import HttpError
+from .schemas import StoreSummary, TopStore, ProfitSummary, ProfitProducto, Heatmap, TimeSeries
 from tienda.models import Tienda
-from django.db.models import Sum, F, Q, Subquery, OuterRef
+from django.db.models import DateField, ExpressionWrapper, Sum, F, Q, Subquery, OuterRef, Value
+from django.db.models.functions import Coalesce, ExtractHour, ExtractWeekDay, Trunc
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
 from producto.models import Producto
+from producto.pronostico import version_ventas
+from venta.models import EventoVenta, Venta
+from venta.registro import eventos_activos, pendientes
+from compra.models import Compra
 from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
-from typing import Optional
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import List, Literal, Optional
+from ninja.pagination import paginate
+from django.http import StreamingHttpResponse
+from base_app.eventos import stream_eventos
+from base_app.models import CentavosField
+from base_app.archivo import querysets, sumar
+from base_app.analitica import lectura_analitica
+from base_app.shards import en_cada_shard, por_tienda, usar_shard
 
 router = Router(tags=["Dashboard"])
 
+CERO = Decimal('0.00')
+
+# periodos como máximo en una serie temporal
+MAX_PERIODOS = 1000
+
 
 def _period_range(period: Optional[str]):
     now = timezone.now()
@@ -31,25 +52,105 @@ def _period_range(period: Optional[str]):
     return None
 
 
+def _year_ago(dt):
+    try:
+        return dt.replace(year=dt.year - 1)
+    except ValueError:  # 29 de febrero
+        return dt.replace(year=dt.year - 1, day=28)
+
+
+def _comparison_range(period: Optional[str], prange, compare: Optional[str]):
+    """
+    Ventana con la que comparar `prange`:
+    - previous: el periodo anterior (ayer, semana/mes/año pasado) hasta el mismo
+      punto transcurrido, sin pasar del inicio del periodo actual.
+    - year_ago: las mismas fechas un año antes.
+    Sin rango (period total) o sin `compare` no hay comparación.
+    """
+    if not prange or compare not in ("previous", "year_ago"):
+        return None
+    start, end = prange
+    if compare == "year_ago":
+        return _year_ago(start), _year_ago(end)
+    if period == "today":
+        prev_start = start - timedelta(days=1)
+    elif period == "week":
+        prev_start = start - timedelta(days=7)
+    elif period == "month":
+        prev_start = (start - timedelta(days=1)).replace(day=1)
+    else:
+        prev_start = _year_ago(start)
+    prev_end = min(prev_start + (end - start), start - timedelta(microseconds=1))
+    return prev_start, prev_end
+
+
+def _tablas(modelo, rangos: dict) -> list:
+    """
+    Querysets de `modelo` cuyas filas pueden caer en alguno de los `rangos`
+    (las tablas de archivo sólo si algún rango llega a su año).
+    """
+    if all(rangos.values()):
+        return querysets(modelo, min(r[0] for r in rangos.values()), max(r[1] for r in rangos.values()))
+    return querysets(modelo)
+
+
+def _totales_por_rango(qs_list: list, rangos: dict) -> dict:
+    """
+    Suma total_precio de los querysets para cada rango de `rangos` (None = sin
+    filtro) con agregación condicional: una sola consulta por tabla la recorre
+    una vez para todas las ventanas.
+    """
+    if all(rangos.values()):
+        qs_list = [
+            qs.filter(
+                fecha_creacion__gte=min(r[0] for r in rangos.values()),
+                fecha_creacion__lte=max(r[1] for r in rangos.values()),
+            )
+            for qs in qs_list
+        ]
+    totales = sumar(qs_list, **{
+        nombre: Sum('total_precio', filter=Q(fecha_creacion__gte=r[0], fecha_creacion__lte=r[1]) if r else None)
+        for nombre, r in rangos.items()
+    })
+    # los importes se suman como enteros de céntimos: exactos, sin redondeo
+    return {nombre: total or CERO for nombre, total in totales.items()}
+
+
+def _delta(actual: Decimal, anterior: Decimal) -> dict:
+    return {
+        'anterior': anterior,
+        'delta': actual - anterior,
+        'delta_pct': round(float((actual - anterior) / abs(anterior)) * 100, 2) if anterior else None,
+    }
+
+
 @router.get("/store-summary/{tienda_id}/", response=StoreSummary)
-def store_summary(request, tienda_id: int, period: Optional[str] = None):
+@por_tienda
+@lectura_analitica
+def store_summary(request, tienda_id: int, period: Optional[str] = None, compare: Optional[str] = None):
     """
     Devuelve resumen para una tienda concreta: total de stock, total gastado en compras,
     total ganado en ventas y balance = ventas - compras.
     `period` puede ser: today, week, month, year, total
+    `compare` (previous, year_ago) añade los mismos totales de la ventana de
+    comparación con sus diferencias absolutas y porcentuales.
     """
     prange = _period_range(period)
-
-    # filtros sobre fecha_creacion de compras/ventas si hay rango
+    crange = _comparison_range(period, prange, compare)
     if prange:
         start, end = prange
-        compras_filter = Q(productos__compras__fecha_creacion__gte=start) & Q(productos__compras__fecha_creacion__lte=end)
-        ventas_filter = Q(productos__ventas__fecha_creacion__gte=start) & Q(productos__ventas__fecha_creacion__lte=end)
-    else:
-        compras_filter = Q()
-        ventas_filter = Q()
 
-    # Single query over Tienda with annotations
+    # compras y ventas se suman en consultas separadas (unirlas en la misma
+    # consulta multiplicaría cada fila por las de la otra tabla), cada una con
+    # la ventana actual y la de comparación en la misma pasada
+    rangos = {'actual': prange, **({'anterior': crange} if crange else {})}
+    compras = _totales_por_rango([qs.filter(producto__tienda_id=tienda_id) for qs in _tablas(Compra, rangos)], rangos)
+    ventas = _totales_por_rango([qs.filter(producto__tienda_id=tienda_id) for qs in _tablas(Venta, rangos)], rangos)
+    if eventos_activos():
+        # ventas del registro de eventos aún sin compactar en las filas diarias
+        pendiente = _totales_por_rango([pendientes(tienda_id)], rangos)
+        ventas = {nombre: total + pendiente[nombre] for nombre, total in ventas.items()}
+
     # Subqueries for top product names (most vendido y mas comprado)
     if prange:
         venta_filter_sub = Q(ventas__fecha_creacion__gte=start) & Q(ventas__fecha_creacion__lte=end)
@@ -75,9 +176,7 @@ def store_summary(request, tienda_id: int, period: Optional[str] = None):
     qs = Tienda.objects.filter(pk=tienda_id).annotate(
         tienda_nombre=F('nombre'),
         tienda_imagen=F('imagen'),
-        total_stock=Sum('productos__stock'),
-        compras_total=Sum('productos__compras__total_precio', filter=compras_filter),
-        ventas_total=Sum('productos__ventas__total_precio', filter=ventas_filter),
+        total_stock=Sum('productos__stock', filter=Q(productos__eliminado=False)),
         producto_mas_vendido=Subquery(top_vendido_subq),
         producto_mas_comprado=Subquery(top_comprado_subq),
     )
@@ -93,10 +192,21 @@ def store_summary(request, tienda_id: int, period: Optional[str] = None):
             balance=0,
         )
 
-    compras_total = tienda.compras_total or 0
-    ventas_total = tienda.ventas_total or 0
+    compras_total = compras['actual']
+    ventas_total = ventas['actual']
     balance = ventas_total - compras_total
 
+    comparison = None
+    if crange:
+        comparison = {
+            'compare': compare,
+            'desde': crange[0],
+            'hasta': crange[1],
+            'compras_total': _delta(compras_total, compras['anterior']),
+            'ventas_total': _delta(ventas_total, ventas['anterior']),
+            'balance': _delta(balance, ventas['anterior'] - compras['anterior']),
+        }
+
     # Obtener URL de la imagen de forma robusta: ImageFieldFile o path anotado
     imagen_url = None
     imagen_field = getattr(tienda, 'imagen', None)
@@ -135,31 +245,45 @@ def store_summary(request, tienda_id: int, period: Optional[str] = None):
         balance=balance,
         producto_mas_vendido=getattr(tienda, 'producto_mas_vendido', None),
         producto_mas_comprado=getattr(tienda, 'producto_mas_comprado', None),
+        comparison=comparison,
     )
 
 
 @router.get("/top-store/", response=TopStore)
+@lectura_analitica
 def top_store(request, period: Optional[str] = None):
     """
     Devuelve la tienda con mayor balance en el `period` solicitado.
     """
     prange = _period_range(period)
-    if prange:
-        start, end = prange
-        compras_filter = Q(productos__compras__fecha_creacion__gte=start) & Q(productos__compras__fecha_creacion__lte=end)
-        ventas_filter = Q(productos__ventas__fecha_creacion__gte=start) & Q(productos__ventas__fecha_creacion__lte=end)
-    else:
-        compras_filter = Q()
-        ventas_filter = Q()
 
-    qs = Tienda.objects.annotate(
-        compras_total=Sum('productos__compras__total_precio', filter=compras_filter),
-        ventas_total=Sum('productos__ventas__total_precio', filter=ventas_filter),
-    ).annotate(balance=F('ventas_total') - F('compras_total')).order_by('-balance')
+    def total(modelo, extra=()):
+        # una subconsulta agregada por tabla (la viva, los archivos del periodo y
+        # `extra`): unir compras y ventas en la misma consulta multiplicaría cada
+        # fila por las de la otra tabla
+        sumas = []
+        for filas in [*querysets(modelo, *(prange or (None, None))), *extra]:
+            filas = filas.filter(producto__tienda_id=OuterRef('pk'))
+            if prange:
+                filas = filas.filter(fecha_creacion__gte=prange[0], fecha_creacion__lte=prange[1])
+            suma = filas.order_by().values('producto__tienda_id').annotate(total=Sum('total_precio')).values('total')
+            sumas.append(Coalesce(Subquery(suma), Value(0), output_field=CentavosField()))
+        return ExpressionWrapper(sum(sumas[1:], sumas[0]), output_field=CentavosField())
+
+    def mejor_tienda():
+        return Tienda.objects.annotate(
+            compras_total=total(Compra),
+            # con el registro de eventos, también las ventas aún sin compactar
+            ventas_total=total(Venta, [pendientes()] if eventos_activos() else []),
+        ).annotate(
+            balance=ExpressionWrapper(F('ventas_total') - F('compras_total'), output_field=CentavosField()),
+        ).order_by('-balance').first()
 
-    top = qs.first()
+    # la mejor de cada shard (scatter-gather); sin sharding, una sola consulta
+    candidatas = [t for _alias, t in en_cada_shard(mejor_tienda) if t is not None]
+    top = max(candidatas, key=lambda t: (t.balance is not None, t.balance or 0), default=None)
     if not top:
-        return TopStore(tienda_id=0, tienda_nombre="", balance=0)
+        return TopStore(tienda_id=0, tienda_nombre="", tienda_imagen=None, balance=0)
 
     # construir imagen URL para el top
     imagen_url = None
@@ -186,3 +310,312 @@ def top_store(request, period: Optional[str] = None):
                 imagen_url = request.build_absolute_uri(path)
 
     return TopStore(tienda_id=top.pk, tienda_nombre=top.nombre, tienda_imagen=imagen_url, balance=top.balance or 0)
+
+
+def _ventas_periodo(period: Optional[str], qs_list: Optional[list] = None) -> list:
+    """
+    Querysets de ventas del `period`: la tabla viva y los archivos que alcance.
+    """
+    prange = _period_range(period)
+    if qs_list is None:
+        qs_list = querysets(Venta, *(prange or (None, None)))
+    if prange:
+        start, end = prange
+        qs_list = [qs.filter(fecha_creacion__gte=start, fecha_creacion__lte=end) for qs in qs_list]
+    return [qs.order_by() for qs in qs_list]
+
+
+def _acumular(filas, clave: str, campos) -> dict:
+    """
+    Suma por `clave` los `campos` de filas agrupadas de varias tablas.
+    """
+    acumulado = {}
+    for fila in filas:
+        actual = acumulado.get(fila[clave])
+        if actual is None:
+            acumulado[fila[clave]] = dict(fila)
+            continue
+        for campo in campos:
+            actual[campo] = (actual[campo] or 0) + (fila[campo] or 0)
+    return acumulado
+
+
+def _margen(ganancia, ventas) -> Optional[float]:
+    return round(float(ganancia) / float(ventas) * 100, 2) if ventas else None
+
+
+def _ganancia(fila: dict) -> dict:
+    ventas = fila['ventas_total'] or CERO
+    costo = fila['costo_total'] or CERO
+    return {**fila, 'ventas_total': ventas, 'costo_total': costo, 'ganancia': ventas - costo, 'margen': _margen(ventas - costo, ventas)}
+
+
+@router.get("/profit/", response=List[ProfitSummary])
+@lectura_analitica
+def profit_stores(request, period: Optional[str] = None):
+    """
+    Ganancia (ventas - coste de lo vendido) y margen de cada tienda en el `period`.
+    Se suma el coste guardado en cada venta, sin recorrer el historial de compras.
+    """
+    def filas_shard():
+        return [
+            fila
+            for qs in _ventas_periodo(period)
+            for fila in qs.values(tienda_id=F('producto__tienda_id'), tienda_nombre=F('producto__tienda__nombre'))
+            .annotate(ventas_total=Sum('total_precio'), costo_total=Sum('costo_total'))
+        ]
+
+    # scatter-gather: cada tienda está en un solo shard
+    filas = _acumular(
+        (fila for _alias, filas in en_cada_shard(filas_shard) for fila in filas),
+        'tienda_id', ('ventas_total', 'costo_total'),
+    )
+    resultado = [_ganancia(fila) for fila in filas.values()]
+    return sorted(resultado, key=lambda r: r['ganancia'], reverse=True)
+
+
+@router.get("/profit/{tienda_id}/", response=ProfitSummary)
+@por_tienda
+@lectura_analitica
+def profit_store(request, tienda_id: int, period: Optional[str] = None):
+    """
+    Ganancia y margen de una tienda en el `period` (today, week, month, year, total).
+    """
+    tienda = Tienda.objects.filter(pk=tienda_id).values_list('nombre', flat=True).first() or ""
+    qs_list = [qs.filter(producto__tienda_id=tienda_id) for qs in _ventas_periodo(period)]
+    if eventos_activos():
+        # ventas del registro de eventos aún sin compactar
+        qs_list += _ventas_periodo(period, [pendientes(tienda_id)])
+    totales = sumar(qs_list, ventas_total=Sum('total_precio'), costo_total=Sum('costo_total'))
+    return _ganancia({'tienda_id': tienda_id, 'tienda_nombre': tienda, **totales})
+
+
+@router.get("/profit/{tienda_id}/productos/", response=List[ProfitProducto])
+@por_tienda
+@lectura_analitica
+@paginate
+def profit_productos(request, tienda_id: int, period: Optional[str] = None):
+    """
+    Ganancia y margen por producto de una tienda en el `period`, de mayor a menor ganancia.
+    """
+    filas = _acumular((
+        fila
+        for qs in _ventas_periodo(period)
+        for fila in qs.filter(producto__tienda_id=tienda_id)
+        .values('producto_id', nombre=F('producto__nombre'))
+        .annotate(cantidad=Sum('cantidad'), ventas_total=Sum('total_precio'), costo_total=Sum('costo_total'))
+    ), 'producto_id', ('cantidad', 'ventas_total', 'costo_total'))
+    resultado = [_ganancia(fila) for fila in filas.values()]
+    return sorted(resultado, key=lambda r: (-r['ganancia'], r['producto_id']))
+
+
+def _fuente_heatmap(tienda_id: int, desde: date, hasta: date):
+    """
+    Filas de venta que alimentan el heatmap: (nombre de la fuente, querysets con
+    fecha_creacion, `unidades` e `importe`). Las filas de `Venta` agrupan el día
+    entero, así que su hora es la de la primera venta del día; con el registro
+    de eventos activo cada venta registrada como evento aporta su hora exacta y
+    de las filas diarias sólo cuenta lo que no procede de eventos (las ventas
+    de /venta/create/ sumadas a la misma fila).
+    """
+    ventas, *archivos = [
+        qs.filter(producto__tienda_id=tienda_id).annotate(unidades=F('cantidad'), importe=F('total_precio'))
+        for qs in querysets(Venta, desde, hasta)
+    ]
+    if not eventos_activos():
+        return 'ventas', [ventas, *archivos]
+    # los eventos archivados van a su propia tabla: de los años archivados se
+    # usan las filas diarias, que ya los incluyen
+    compactados = EventoVenta.objects.filter(venta_id=OuterRef('pk')).order_by().values('venta_id')
+    directas = (
+        Venta.visibles.filter(producto__tienda_id=tienda_id)
+        .annotate(
+            ev_cantidad=Coalesce(Subquery(compactados.annotate(s=Sum('cantidad')).values('s')), 0),
+            ev_total=Coalesce(Subquery(compactados.annotate(s=Sum('total_precio')).values('s')), 0, output_field=CentavosField()),
+        )
+        .filter(cantidad__gt=F('ev_cantidad'))
+        .annotate(
+            unidades=F('cantidad') - F('ev_cantidad'),
+            importe=ExpressionWrapper(F('total_precio') - F('ev_total'), output_field=CentavosField()),
+        )
+    )
+    eventos = EventoVenta.visibles.filter(producto__tienda_id=tienda_id).annotate(unidades=F('cantidad'), importe=F('total_precio'))
+    return 'eventos', [directas, *archivos, eventos]
+
+
+@router.get("/heatmap/{tienda_id}/", response=Heatmap)
+@por_tienda
+@lectura_analitica
+def sales_heatmap(request, tienda_id: int, desde: date, hasta: date):
+    """
+    Matriz 7×24 (lunes a domingo × hora local de la tienda) con las unidades
+    vendidas y los ingresos entre `desde` y `hasta` (incluidos), calculada con
+    una consulta agrupada por tabla. Los rangos ya cerrados se cachean hasta la
+    medianoche de la tienda o hasta que cambien sus ventas (`version_ventas`:
+    una venta con fecha pasada, un borrado); los que incluyen hoy siguen
+    cambiando y no se cachean.
+    """
+    tienda = get_object_or_404(Tienda, pk=tienda_id)
+    zona = tienda.zona()
+    hoy = timezone.localdate(timezone=zona)
+    cerrado = hasta < hoy
+    datos = None
+    if cerrado:
+        clave = f"heatmap:{tienda_id}:{version_ventas(tienda_id)}:{desde.isoformat()}:{hasta.isoformat()}:{hoy.isoformat()}"
+        datos = cache.get(clave)
+    if datos is not None:
+        return datos
+
+    fuente, tablas = _fuente_heatmap(tienda_id, desde, hasta)
+    ventas = [[0] * 24 for _ in range(7)]
+    ingresos = [[CERO] * 24 for _ in range(7)]
+    for qs in tablas:
+        filas = (
+            qs.filter(
+                fecha_creacion__gte=datetime.combine(desde, time.min, tzinfo=zona),
+                fecha_creacion__lt=datetime.combine(hasta + timedelta(days=1), time.min, tzinfo=zona),
+            )
+            .annotate(dia=ExtractWeekDay('fecha_creacion', tzinfo=zona), hora=ExtractHour('fecha_creacion', tzinfo=zona))
+            .order_by()
+            .values('dia', 'hora')
+            .annotate(ventas=Sum('unidades'), ingresos=Sum('importe'))
+        )
+        for fila in filas:
+            # ExtractWeekDay: 1 = domingo ... 7 = sábado; la matriz empieza en lunes
+            dia = (fila['dia'] + 5) % 7
+            ventas[dia][fila['hora']] += fila['ventas'] or 0
+            ingresos[dia][fila['hora']] += fila['ingresos'] or 0
+
+    datos = {
+        'tienda_id': tienda_id,
+        'zona_horaria': str(zona),
+        'desde': desde,
+        'hasta': hasta,
+        'fuente': fuente,
+        'ventas': ventas,
+        'ingresos': ingresos,
+    }
+    if cerrado:
+        medianoche = datetime.combine(hoy + timedelta(days=1), time.min, tzinfo=zona)
+        cache.set(clave, datos, timeout=max(int((medianoche - timezone.now()).total_seconds()), 1))
+    return datos
+
+
+def _inicio_periodo(dia: date, bucket: str) -> date:
+    if bucket == 'week':
+        return dia - timedelta(days=dia.weekday())
+    if bucket == 'month':
+        return dia.replace(day=1)
+    return dia
+
+
+def _periodos(desde: date, hasta: date, bucket: str) -> List[date]:
+    periodos = []
+    actual = _inicio_periodo(desde, bucket)
+    while actual <= hasta and len(periodos) <= MAX_PERIODOS:
+        periodos.append(actual)
+        if bucket == 'month':
+            actual = (actual + timedelta(days=32)).replace(day=1)
+        else:
+            actual += timedelta(days=7 if bucket == 'week' else 1)
+    return periodos
+
+
+def _sumas_por_periodo(qs_list: list, zona, desde: date, hasta: date, bucket: str, sumas: dict):
+    """
+    Acumula en `sumas` {(tienda_id, inicio del periodo): total_precio} con una
+    única consulta agrupada por tabla; los periodos se cortan en la hora local
+    de `zona`.
+    """
+    for qs in qs_list:
+        filas = (
+            qs.filter(
+                fecha_creacion__gte=datetime.combine(desde, time.min, tzinfo=zona),
+                fecha_creacion__lt=datetime.combine(hasta + timedelta(days=1), time.min, tzinfo=zona),
+            )
+            .annotate(periodo=Trunc('fecha_creacion', bucket, output_field=DateField(), tzinfo=zona))
+            .order_by()
+            .values('producto__tienda_id', 'periodo')
+            .annotate(total=Sum('total_precio'))
+        )
+        for f in filas:
+            clave = (f['producto__tienda_id'], f['periodo'])
+            sumas[clave] = sumas.get(clave, 0) + (f['total'] or 0)
+
+
+@router.get("/timeseries/{tienda_id}/", response=TimeSeries)
+@lectura_analitica
+def timeseries(
+    request,
+    tienda_id: int,
+    desde: date,
+    hasta: date,
+    bucket: Literal['day', 'week', 'month'] = 'day',
+    tiendas: List[int] = Query(None),
+):
+    """
+    Series de ventas, compras y balance por día, semana o mes entre `desde` y
+    `hasta` (incluidos), alineadas y con 0 en los periodos sin movimientos.
+    `tiendas` añade más tiendas a la misma respuesta. Cada tabla (y cada archivo
+    anual que alcance el rango) se agrupa en una sola consulta para todas las
+    tiendas (una por shard y zona horaria distinta).
+    """
+    if hasta < desde:
+        raise HttpError(400, "hasta debe ser posterior o igual a desde")
+    periodos = _periodos(desde, hasta, bucket)
+    if len(periodos) > MAX_PERIODOS:
+        raise HttpError(400, f"El rango no puede superar {MAX_PERIODOS} periodos")
+
+    ids = list(dict.fromkeys([tienda_id, *(tiendas or [])]))
+    encontradas = Tienda.objects.in_bulk(ids)
+    faltan = [pk for pk in ids if pk not in encontradas]
+    if faltan:
+        raise HttpError(404, f"Tienda(s) no encontrada(s): {faltan}")
+
+    por_grupo = {}
+    for tienda in encontradas.values():
+        por_grupo.setdefault((tienda.shard, tienda.zona()), []).append(tienda.pk)
+    ventas, compras = {}, {}
+    for (shard, zona), pks in por_grupo.items():
+        with usar_shard(shard):
+            tablas_ventas = [qs.filter(producto__tienda_id__in=pks) for qs in querysets(Venta, desde, hasta)]
+            if eventos_activos():
+                # ventas del registro de eventos aún sin compactar
+                tablas_ventas.append(pendientes().filter(producto__tienda_id__in=pks))
+            _sumas_por_periodo(tablas_ventas, zona, desde, hasta, bucket, ventas)
+            tablas_compras = [qs.filter(producto__tienda_id__in=pks) for qs in querysets(Compra, desde, hasta)]
+            _sumas_por_periodo(tablas_compras, zona, desde, hasta, bucket, compras)
+
+    series = []
+    for pk in ids:
+        v = [ventas.get((pk, p), CERO) for p in periodos]
+        c = [compras.get((pk, p), CERO) for p in periodos]
+        series.append({
+            'tienda_id': pk,
+            'tienda_nombre': encontradas[pk].nombre,
+            'ventas': v,
+            'compras': c,
+            'balance': [a - b for a, b in zip(v, c)],
+        })
+    return {'desde': desde, 'hasta': hasta, 'bucket': bucket, 'periodos': periodos, 'series': series}
+
+
+@router.get("/stream/{tienda_id}/")
+async def store_stream(request, tienda_id: int):
+    """
+    Stream SSE (text/event-stream) con los cambios de una tienda: eventos `stock`,
+    `venta`, `compra` y `resumen` (deltas para actualizar store_summary sin sondear).
+    Requiere servir la aplicación con ASGI (core.asgi:application, p.ej. con
+    uvicorn o daphne): bajo WSGI (runserver, gunicorn sync) cada stream retiene
+    un hilo del worker mientras el cliente siga conectado.
+    """
+    if not await Tienda.objects.filter(pk=tienda_id).aexists():
+        raise HttpError(404, f"Tienda {tienda_id} no encontrada")
+    ultimo_id = request.headers.get('Last-Event-ID')
+    response = StreamingHttpResponse(
+        stream_eventos(tienda_id, int(ultimo_id) if ultimo_id and ultimo_id.isdigit() else None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,6 +1,22 @@
 from ninja import Schema
-from typing import Optional
+from typing import List, Optional
 from decimal import Decimal
+from datetime import date, datetime
+
+
+class Delta(Schema):
+    anterior: Decimal
+    delta: Decimal
+    delta_pct: Optional[float]  # None si el valor anterior es 0
+
+
+class StoreComparison(Schema):
+    compare: str
+    desde: datetime
+    hasta: datetime
+    compras_total: Delta
+    ventas_total: Delta
+    balance: Delta
 
 
 class StoreSummary(Schema):
@@ -13,6 +29,7 @@ class StoreSummary(Schema):
     balance: Optional[Decimal]
     producto_mas_vendido: Optional[str]
     producto_mas_comprado: Optional[str]
+    comparison: Optional[StoreComparison] = None
 
 
 class TopStore(Schema):
@@ -20,3 +37,50 @@ class TopStore(Schema):
     tienda_nombre: str
     tienda_imagen: Optional[str]
     balance: Optional[Decimal]
+
+
+class ProfitSummary(Schema):
+    tienda_id: int
+    tienda_nombre: str
+    ventas_total: Decimal
+    costo_total: Decimal  # coste de lo vendido al coste medio ponderado
+    ganancia: Decimal
+    margen: Optional[float]  # % de ganancia sobre ventas
+
+
+class ProfitProducto(Schema):
+    producto_id: int
+    nombre: str
+    cantidad: int
+    ventas_total: Decimal
+    costo_total: Decimal
+    ganancia: Decimal
+    margen: Optional[float]
+
+
+class Heatmap(Schema):
+    tienda_id: int
+    zona_horaria: str
+    desde: date
+    hasta: date
+    fuente: str  # origen de las filas contadas
+    # [día de la semana, lunes = 0][hora local 0-23]
+    ventas: List[List[int]]  # unidades vendidas
+    ingresos: List[List[Decimal]]
+
+
+class SerieTienda(Schema):
+    tienda_id: int
+    tienda_nombre: str
+    # un valor por periodo de `TimeSeries.periodos`, 0 si no hubo movimientos
+    ventas: List[Decimal]
+    compras: List[Decimal]
+    balance: List[Decimal]
+
+
+class TimeSeries(Schema):
+    desde: date
+    hasta: date
+    bucket: str
+    periodos: List[date]  # inicio de cada periodo (lunes para week, día 1 para month)
+    series: List[SerieTienda]
@@ -1,3 +1,199 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from base_app.eventos import difusor, publicar
+from base_app.models import EventoTienda
+from base_app.shards import usar_shard
+from base_app.testing import ApiTestCase, Presupuesto, PresupuestoConsultasTestCase
+from compra.models import Compra
+from producto.models import Producto
+from tienda.models import Tienda
+from venta.models import Venta
+from venta.registro import compactar_eventos
+
+
+class PresupuestosDashboardTest(PresupuestoConsultasTestCase):
+    presupuestos = [
+        Presupuesto('GET', '/api/dashboard/store-summary/{tienda}/', 5),
+        Presupuesto('GET', '/api/dashboard/store-summary/{tienda}/?period=month&compare=previous', 5),
+        # + la lista de tablas de archivo de ventas y de compras
+        Presupuesto('GET', '/api/dashboard/top-store/', 3),
+        Presupuesto('GET', '/api/dashboard/top-store/?period=month', 3),
+        # agregado de todas las tiendas: recorre los productos por su índice de tienda
+        Presupuesto('GET', '/api/dashboard/profit/?period=month', 2, scans_permitidos=('productos',)),
+        Presupuesto('GET', '/api/dashboard/profit/{tienda}/?period=month', 3),
+        Presupuesto('GET', '/api/dashboard/profit/{tienda}/productos/?period=month', 2),
+        Presupuesto('GET', '/api/dashboard/heatmap/{tienda}/?desde={desde}&hasta={hoy}', 3),
+        Presupuesto('GET', '/api/dashboard/timeseries/{tienda}/?desde={desde}&hasta={hoy}&bucket=week', 5),
+    ]
+
+
+class HeatmapTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=50, precio=Decimal('2.00'))
+        self.hoy = timezone.localdate().isoformat()
+
+    def totales(self):
+        datos = self.api('GET', f'/api/dashboard/heatmap/{self.tienda.pk}/', {'desde': self.hoy, 'hasta': self.hoy}).json()
+        return datos['fuente'], sum(map(sum, datos['ventas'])), sum(Decimal(v) for fila in datos['ingresos'] for v in fila)
+
+    def test_cuenta_unidades_y_no_cachea_hoy(self):
+        self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 3})
+        self.assertEqual(self.totales(), ('ventas', 3, Decimal('6.00')))
+        self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 1})
+        self.assertEqual(self.totales(), ('ventas', 4, Decimal('8.00')))
+
+    def test_rango_cerrado_se_recalcula_al_cambiar_las_ventas(self):
+        ayer = timezone.localdate() - timedelta(days=1)
+        ruta = f'/api/dashboard/heatmap/{self.tienda.pk}/'
+        rango = {'desde': ayer.isoformat(), 'hasta': ayer.isoformat()}
+
+        def unidades():
+            return sum(map(sum, self.api('GET', ruta, rango).json()['ventas']))
+
+        self.assertEqual(unidades(), 0)
+        # una venta llevada a ayer cambia un rango ya cacheado
+        venta = self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 2}).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.api('PATCH', f'/api/venta/update/{venta["id"]}/', {
+                'producto_id': self.producto.pk, 'cantidad': 2, 'fecha_creacion': f'{ayer.isoformat()}T12:00:00',
+            })
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual(unidades(), 2)
+        # y borrar el producto la saca al instante
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api('DELETE', f'/api/producto/delete/{self.producto.pk}/')
+        self.assertEqual(unidades(), 0)
+
+    @override_settings(VENTAS_EVENTOS=True)
+    def test_eventos_compactados_con_ventas_directas(self):
+        self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 2})
+        self.api('POST', '/api/venta/evento/', {'producto_id': self.producto.pk, 'cantidad': 3})
+        self.assertEqual(self.totales(), ('eventos', 5, Decimal('10.00')))
+        compactar_eventos()
+        # el evento se suma a la fila diaria de la venta directa: no se pierde ninguna
+        self.assertEqual(Venta.objects.get().cantidad, 5)
+        self.assertEqual(self.totales(), ('eventos', 5, Decimal('10.00')))
+
+
+class StreamTest(ApiTestCase):
+
+    def test_tienda_inexistente(self):
+        self.assertEqual(self.api('GET', '/api/dashboard/stream/999/').status_code, 404)
+
+    def test_publica_al_confirmar_el_shard_activo(self):
+        recibidos = []
+        with mock.patch.object(difusor, 'activo', return_value=True), \
+                mock.patch.object(difusor, 'publicar', side_effect=lambda *a: recibidos.append(a)):
+            with self.captureOnCommitCallbacks(execute=True):
+                publicar(1, 'stock', {'productos': []})
+                self.assertEqual(recibidos, [])
+            self.assertEqual(recibidos, [(1, 'stock', {'productos': []})])
+            with usar_shard('shard_1'), mock.patch('django.db.transaction.on_commit') as on_commit:
+                publicar(1, 'stock', {})
+            self.assertEqual(on_commit.call_args.kwargs, {'using': 'shard_1'})
+
+    @override_settings(EVENTOS_BACKEND='sqlite')
+    def test_sqlite_guarda_al_confirmar_el_shard_activo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publicar(1, 'stock', {'productos': []})
+            self.assertFalse(EventoTienda.objects.exists())
+        self.assertEqual(list(EventoTienda.objects.values_list('tienda_id', 'tipo')), [(1, 'stock')])
+        # un cambio que se deshace no se anuncia
+        with self.captureOnCommitCallbacks(execute=True) as pendientes:
+            try:
+                with transaction.atomic():
+                    publicar(1, 'stock', {})
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual((pendientes, EventoTienda.objects.count()), ([], 1))
+        with usar_shard('shard_1'), mock.patch('django.db.transaction.on_commit') as on_commit:
+            publicar(1, 'stock', {})
+        self.assertEqual(on_commit.call_args.kwargs, {'using': 'shard_1'})
+
+
+class TopStoreTest(ApiTestCase):
+
+    def test_balance_sin_multiplicar_filas(self):
+        # A gana (50 frente a 40), pero un JOIN de compras y ventas repetiría su
+        # compra por cada una de sus tres ventas y ganaría B
+        a = Tienda.objects.create(nombre="A")
+        b = Tienda.objects.create(nombre="B")
+        producto_a = Producto.objects.create(tienda=a, nombre="Café", stock=0, precio=Decimal('1.00'))
+        producto_b = Producto.objects.create(tienda=b, nombre="Té", stock=0, precio=Decimal('1.00'))
+        Compra.objects.create(producto=producto_a, cantidad=1, total_precio=Decimal('10'))
+        Venta.objects.bulk_create([Venta(producto=producto_a, cantidad=1, total_precio=Decimal('20')) for _ in range(3)])
+        Compra.objects.create(producto=producto_b, cantidad=1, total_precio=Decimal('10'))
+        Venta.objects.create(producto=producto_b, cantidad=1, total_precio=Decimal('50'))
+        datos = self.api('GET', '/api/dashboard/top-store/').json()
+        self.assertEqual((datos['tienda_id'], Decimal(datos['balance'])), (a.pk, Decimal('50.00')))
+
+
+class GananciaTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=0, precio=Decimal('4.00'))
+
+    def comprar(self, cantidad, total):
+        self.api('POST', '/api/compra/create/', {'producto_id': self.producto.pk, 'cantidad': cantidad, 'total_precio': total})
+
+    def test_coste_medio_ponderado_y_ganancia(self):
+        self.comprar(10, '10')
+        self.comprar(10, '30')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.costo_promedio, Decimal('2.0000'))
+        venta = self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 5}).json()
+        # una compra posterior no cambia el coste ya registrado en la venta
+        self.comprar(5, '50')
+        self.assertEqual(Venta.objects.get(pk=venta['id']).costo_total, Decimal('10.00'))
+
+        ganancia = self.api('GET', f'/api/dashboard/profit/{self.tienda.pk}/', {'period': 'today'}).json()
+        self.assertEqual(
+            (ganancia['ventas_total'], ganancia['costo_total'], ganancia['ganancia'], ganancia['margen']),
+            ('20.00', '10.00', '10.00', 50.0),
+        )
+
+
+class TimeSeriesTest(ApiTestCase):
+
+    def setUp(self):
+        self.utc = Tienda.objects.create(nombre="UTC")
+        self.mexico = Tienda.objects.create(nombre="México", zona_horaria='America/Mexico_City')
+        for tienda, modelo, fecha, total in (
+            (self.utc, Venta, datetime(2026, 3, 5, 12), '10'),
+            (self.utc, Venta, datetime(2026, 3, 6, 12), '5'),
+            (self.utc, Compra, datetime(2026, 3, 10, 12), '4'),
+            # antes del rango
+            (self.utc, Venta, datetime(2026, 3, 1, 12), '99'),
+            # domingo 8 a las 21:00 en México, lunes 9 en UTC
+            (self.mexico, Venta, datetime(2026, 3, 9, 3), '7'),
+        ):
+            producto = Producto.objects.create(tienda=tienda, nombre=f"Producto {fecha}", stock=0)
+            fila = modelo.objects.create(producto=producto, cantidad=1, total_precio=Decimal(total))
+            modelo.objects.filter(pk=fila.pk).update(fecha_creacion=fecha.replace(tzinfo=dt_timezone.utc))
+
+    def test_semanas_alineadas_y_en_hora_local(self):
+        respuesta = self.api('GET', f'/api/dashboard/timeseries/{self.utc.pk}/', {
+            'desde': '2026-03-04', 'hasta': '2026-03-20', 'bucket': 'week', 'tiendas': self.mexico.pk,
+        })
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        datos = respuesta.json()
+        self.assertEqual(datos['periodos'], ['2026-03-02', '2026-03-09', '2026-03-16'])
+        utc, mexico = datos['series']
+        self.assertEqual(utc['ventas'], ['15.00', '0.00', '0.00'])
+        self.assertEqual(utc['balance'], ['15.00', '-4.00', '0.00'])
+        self.assertEqual(mexico['ventas'], ['7.00', '0.00', '0.00'])
+
+    def test_rango_invalido(self):
+        ruta = f'/api/dashboard/timeseries/{self.utc.pk}/'
+        self.assertEqual(self.api('GET', ruta, {'desde': '2026-03-04', 'hasta': '2026-03-01'}).status_code, 400)
+        self.assertEqual(self.api('GET', ruta, {'desde': '2026-03-04', 'hasta': '2026-03-05', 'tiendas': 0}).status_code, 404)
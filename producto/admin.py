@@ -1,16 +1,22 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.http import HttpResponseRedirect
-from .models import Producto
+from django.contrib import messages
+from django.db import transaction
+from .models import Producto, MovimientoStock, CheckpointStock
 from tienda.models import Tienda
+from .busqueda import buscar_ids, fts_disponible
 
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-	list_display = ('imagen_tag', 'nombre', 'precio', 'stock', 'fecha_creacion')
+	list_display = ('imagen_tag', 'nombre', 'precio', 'stock', 'stock_minimo', 'fecha_creacion')
 	search_fields = ('nombre', 'detalles')
 	list_filter = ('tienda', 'fecha_creacion')
 	readonly_fields = ('fecha_creacion', 'ultima_actualicacion')
+	actions = ('reconciliar_stock',)
+	# máximo de coincidencias FTS consideradas en la búsqueda del admin
+	max_resultados_busqueda = 1000
 
 	def imagen_tag(self, obj):
 		if obj.imagen and hasattr(obj.imagen, 'url'):
@@ -18,6 +24,26 @@ class ProductoAdmin(admin.ModelAdmin):
 		return '-'
 	imagen_tag.short_description = 'Imagen'
 
+	def get_search_results(self, request, queryset, search_term):
+		# con el índice FTS5 se evita el LIKE '%...%' sobre toda la tabla
+		if search_term and fts_disponible():
+			ids = buscar_ids(search_term, limite=self.max_resultados_busqueda)
+			return queryset.filter(pk__in=ids), False
+		return super().get_search_results(request, queryset, search_term)
+
+	@admin.action(description='Reconciliar stock con compras - ventas')
+	def reconciliar_stock(self, request, queryset):
+		# import perezoso: reconciliacion arrastra los shards y django-ninja al arrancar
+		from .reconciliacion import calcular_desfases, corregir_desfases
+		with transaction.atomic():
+			desfases = calcular_desfases(producto_ids=list(queryset.values_list('pk', flat=True)))
+			corregir_desfases(desfases)
+		if not desfases:
+			self.message_user(request, 'El stock de los productos seleccionados coincide con el libro.', messages.SUCCESS)
+			return
+		detalle = ', '.join(f"{d.nombre}: {d.stock} → {max(d.esperado, 0)}" for d in desfases[:20])
+		self.message_user(request, f'{len(desfases)} productos corregidos ({detalle}).', messages.WARNING)
+
 	def changelist_view(self, request, extra_context=None):
 		"""
 		Forzar que siempre exista un filtro por `tienda`.
@@ -39,3 +65,25 @@ class ProductoAdmin(admin.ModelAdmin):
 		extra.update({'tiendas': tiendas, 'selected_tienda': sel})
 		return super().changelist_view(request, extra_context=extra)
 
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+	list_display = ('id', 'producto', 'delta', 'origen', 'origen_id', 'fecha')
+	search_fields = ('producto__nombre',)
+	list_filter = ('origen', 'fecha')
+	list_select_related = ('producto',)
+
+	# el diario es append-only
+	def has_add_permission(self, request):
+		return False
+
+	def has_change_permission(self, request, obj=None):
+		return False
+
+
+@admin.register(CheckpointStock)
+class CheckpointStockAdmin(admin.ModelAdmin):
+	list_display = ('id', 'producto', 'stock', 'fecha')
+	search_fields = ('producto__nombre',)
+	list_filter = ('fecha',)
+	list_select_related = ('producto',)
@@ -1,14 +1,35 @@
 from ninja import Router, File, UploadedFile
 from tienda.models import Tienda
 from .models import Producto
-from .schemas import ProductoSchema, ProductoInSchema
-from typing import List, Optional
+from .schemas import (
+    ProductoSchema, ProductoInSchema, InventarioSchema, BajoStockSchema, PronosticoSchema, ImportacionResultadoSchema,
+    AjustePrecioInSchema, AjustePrecioResultadoSchema,
+)
+from .stock import aplicar_movimiento, registrar_checkpoint, inventario_a_fecha
+from .importacion import importar_productos, leer_filas, detectar_formato
+from .busqueda import buscar_productos
+from .pronostico import pronosticar
+from tienda.schemas import TareaBorradoSchema
+from base_app.borrado import borrar_producto
+from base_app.concurrencia import guardar_cambios
+from base_app.models import CentavosField
+from base_app.shards import activo, en_cada_shard, en_shard, por_objeto, por_tienda, shard_de_tienda
+from typing import List, Literal, Optional
 from ninja.pagination import paginate
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime
+from ninja.errors import HttpError
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Greatest, Round
+from decimal import Decimal
+import zipfile
 
 router = Router(tags=["Producto"])
 
 @router.get("/list/{tienda_id}/", response=List[ProductoSchema])
+@por_tienda
 @paginate
 def list_productos(request, tienda_id: int):
     """
@@ -16,7 +37,22 @@ def list_productos(request, tienda_id: int):
     """
     return Producto.objects.filter(tienda_id=tienda_id)
 
+@router.get("/buscar/", response=List[ProductoSchema])
+@en_shard(lambda kwargs: shard_de_tienda(kwargs['tienda_id']) if kwargs.get('tienda_id') is not None else None)
+def search_productos(request, q: str, tienda_id: Optional[int] = None, limite: int = 20):
+    """
+    Búsqueda de productos por nombre/detalles ordenada por relevancia.
+    Coincide por prefijo (apto para autocompletado) y puede limitarse a una tienda.
+    """
+    limite = max(1, min(limite, 100))
+    if tienda_id is None and activo():
+        # todas las tiendas: se busca en cada shard y se concatenan los resultados
+        resultados = en_cada_shard(lambda: buscar_productos(q, limite=limite))
+        return [p for _alias, productos in resultados for p in productos][:limite]
+    return buscar_productos(q, tienda_id=tienda_id, limite=limite)
+
 @router.get("/detalle/{producto_id}/", response=ProductoSchema)
+@por_objeto('producto.Producto', 'producto_id')
 def get_producto(request, producto_id: int):
     """
     Retrieve a single producto by its ID.
@@ -24,34 +60,186 @@ def get_producto(request, producto_id: int):
     producto = get_object_or_404(Producto, id=producto_id)
     return producto
 
+def _exigir_nombre_libre(tienda_id: int, nombre: str, excluir: Optional[int] = None):
+    """
+    409 si la tienda ya tiene un producto con ese nombre, también si está
+    pendiente de borrado: el nombre sigue ocupado hasta que el borrador lo elimina.
+    """
+    qs = Producto._base_manager.filter(tienda_id=tienda_id, nombre=nombre).exclude(pk=excluir)
+    eliminado = qs.values_list('eliminado', flat=True).first()
+    if eliminado is not None:
+        detalle = "pendiente de borrado" if eliminado else "ya existe"
+        raise HttpError(409, f"Producto '{nombre}' {detalle} en la tienda {tienda_id}")
+
+
 @router.post("/create/", response=ProductoSchema)
+@en_shard(lambda kwargs: shard_de_tienda(kwargs['producto_in'].tienda_id))
 def create_producto(request, producto_in: ProductoInSchema, imagen: UploadedFile = File(None)):
     """
     Create a new producto.
     """
-    producto = Producto.objects.create(**producto_in.dict())
+    _exigir_nombre_libre(producto_in.tienda_id, producto_in.nombre)
+    with transaction.atomic():
+        producto = Producto.objects.create(**producto_in.dict(exclude={'version'}))
+        registrar_checkpoint(producto)
     if imagen:
         producto.imagen.save(imagen.name, imagen, save=True)
     return producto
 
+@router.post("/import/{tienda_id}/", response=ImportacionResultadoSchema)
+@por_tienda
+def import_productos(request, tienda_id: int, archivo: UploadedFile = File(...), imagenes: UploadedFile = File(None), formato: Optional[Literal['csv', 'json']] = None):
+    """
+    Importa (crea o actualiza por nombre) el catálogo de una tienda desde un CSV o JSON
+    con columnas nombre, detalles, precio, stock e imagen. `imagenes` es un zip opcional
+    con los archivos referenciados en la columna imagen.
+    """
+    get_object_or_404(Tienda, id=tienda_id)
+    try:
+        filas = leer_filas(archivo.read(), formato or detectar_formato(archivo.name))
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HttpError(400, f"Archivo no válido: {exc}")
+    zip_imagenes = None
+    if imagenes:
+        try:
+            zip_imagenes = zipfile.ZipFile(imagenes)
+        except zipfile.BadZipFile:
+            raise HttpError(400, "`imagenes` debe ser un archivo zip")
+    return importar_productos(tienda_id, filas, zip_imagenes)
+
+# filas devueltas como vista previa en un ajuste de precios
+MAX_VISTA_PREVIA = 200
+
+@router.post("/precios/{tienda_id}/", response=AjustePrecioResultadoSchema)
+@por_tienda
+def ajustar_precios(request, tienda_id: int, ajuste_in: AjustePrecioInSchema):
+    """
+    Ajusta en un único UPDATE el precio de los productos de una tienda.
+    `modo` porcentaje aplica `valor` % (p.ej. 10 o -5); absoluto suma `valor` al precio.
+    Se puede limitar a `producto_ids` y/o a los nombres que contengan `patron`.
+    Con `dry_run` sólo se devuelve la vista previa sin modificar nada.
+    Los productos sin precio no se tocan: no hay nada que ajustar.
+    """
+    qs = Producto.objects.filter(tienda_id=tienda_id, precio__isnull=False)
+    if ajuste_in.producto_ids is not None:
+        qs = qs.filter(pk__in=ajuste_in.producto_ids)
+    if ajuste_in.patron:
+        qs = qs.filter(nombre__icontains=ajuste_in.patron)
+
+    # el precio se guarda en céntimos (CentavosField): se calcula sobre el entero
+    precio = ExpressionWrapper(F('precio'), output_field=CentavosField())
+    if ajuste_in.modo == 'porcentaje':
+        nuevo = precio * Value(Decimal('1') + ajuste_in.valor / Decimal('100'))
+    else:
+        nuevo = precio + Value(ajuste_in.valor, output_field=CentavosField())
+    # redondeo al céntimo y sin precios negativos
+    nuevo = Greatest(Round(ExpressionWrapper(nuevo, output_field=FloatField())), Value(0), output_field=CentavosField())
+
+    if ajuste_in.dry_run:
+        preview = qs.annotate(precio_nuevo=nuevo).order_by('nombre').values('pk', 'nombre', 'precio', 'precio_nuevo')
+        return {
+            'afectados': qs.count(),
+            'dry_run': True,
+            'vista_previa': [
+                {'id': p['pk'], 'nombre': p['nombre'], 'precio_actual': p['precio'], 'precio_nuevo': p['precio_nuevo']}
+                for p in preview[:MAX_VISTA_PREVIA]
+            ],
+        }
+
+    # nueva versión: una edición que leyó el precio anterior recibe 409
+    afectados = qs.update(precio=nuevo, version=F('version') + 1, ultima_actualicacion=timezone.now())
+    return {'afectados': afectados, 'dry_run': False}
+
 @router.patch("/update/{producto_id}/", response=ProductoSchema)
+@por_objeto('producto.Producto', 'producto_id')
 def update_producto(request, producto_id: int, producto_in: ProductoInSchema, imagen: UploadedFile = File(None)):
     """
     Update an existing producto.
     """
     producto = get_object_or_404(Producto, id=producto_id)
-    for attr, value in producto_in.dict(exclude_unset=True).items():
-        setattr(producto, attr, value)
+    updates = producto_in.dict(exclude_unset=True)
+    # el stock no se sobrescribe: se aplica la diferencia como ajuste en el diario
+    nuevo_stock = updates.pop('stock', None)
+    version = updates.pop('version', None)
+    if updates.get('nombre', producto.nombre) != producto.nombre:
+        _exigir_nombre_libre(updates.get('tienda_id', producto.tienda_id), updates['nombre'], excluir=producto.pk)
+    campo = producto.imagen.field
     if imagen:
-        producto.imagen.save(imagen.name, imagen, save=False)
-    producto.save()
+        updates['imagen'] = campo.storage.save(campo.generate_filename(producto, imagen.name), imagen)
+    try:
+        with transaction.atomic():
+            # UPDATE condicional sobre los campos modificados: no pisa el stock
+            # (que cambia con F()) ni la edición de otra petición concurrente
+            guardar_cambios(producto, updates, version)
+            if nuevo_stock is not None and nuevo_stock != producto.stock:
+                aplicar_movimiento(producto.pk, nuevo_stock - producto.stock, 'ajuste')
+                producto.refresh_from_db()
+    except Exception:
+        # conflicto de versión o stock: la imagen nueva no llegó a la fila
+        if imagen:
+            campo.storage.delete(updates['imagen'])
+        raise
     return producto
 
-@router.delete("/delete/{producto_id}/", response={204: None})
+@router.delete("/delete/{producto_id}/", response={202: TareaBorradoSchema})
+@por_objeto('producto.Producto', 'producto_id')
 def delete_producto(request, producto_id: int):
     """
-    Delete a producto by its ID.
+    Delete a producto by its ID. Queda oculto al instante; sus ventas, compras
+    e historial de stock se borran en segundo plano (GET /tienda/borrado/{tarea_id}/).
     """
     producto = get_object_or_404(Producto, id=producto_id)
-    producto.delete()
-    return 204
+    return 202, borrar_producto(producto)
+
+
+@router.get("/bajo-stock/", response=List[BajoStockSchema])
+@en_shard(lambda kwargs: shard_de_tienda(kwargs['tienda_id']) if kwargs.get('tienda_id') is not None else None)
+@paginate
+def list_bajo_stock(request, tienda_id: Optional[int] = None):
+    """
+    Productos a reponer (stock < stock_minimo) de una tienda, o de todas si no
+    se indica tienda_id; primero los que más unidades necesitan.
+    Se sirve desde el índice parcial producto_bajo_stock.
+    """
+    def consulta():
+        qs = Producto.objects.filter(stock__lt=F('stock_minimo'))
+        if tienda_id is not None:
+            qs = qs.filter(tienda_id=tienda_id)
+        return (
+            qs.annotate(faltante=F('stock_minimo') - F('stock'))
+            .order_by('-faltante', 'pk')
+            .values('id', 'tienda_id', 'nombre', 'stock', 'stock_minimo', 'faltante')
+        )
+
+    if tienda_id is None and activo():
+        # todas las tiendas: se reúnen los de cada shard en el mismo orden
+        filas = [f for _alias, qs in en_cada_shard(lambda: list(consulta())) for f in qs]
+        return sorted(filas, key=lambda f: (-f['faltante'], f['id']))
+    return consulta()
+
+
+@router.get("/pronostico/{tienda_id}/", response=List[PronosticoSchema])
+@por_tienda
+@paginate
+def pronostico_productos(request, tienda_id: int, solo_reponer: bool = False):
+    """
+    Demanda estimada, días de cobertura y cantidad sugerida a reponer por
+    producto, primero los más urgentes.
+    """
+    return pronosticar(tienda_id, solo_reponer)
+
+
+@router.get("/inventario/{tienda_id}/", response=List[InventarioSchema])
+@por_tienda
+def inventario_historico(request, tienda_id: int, fecha: datetime):
+    """
+    Devuelve el inventario de la tienda tal como estaba en `fecha`,
+    reconstruido desde el diario de movimientos de stock.
+    """
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha, timezone.get_default_timezone())
+    productos = inventario_a_fecha(tienda_id, fecha)
+    return [
+        InventarioSchema(id=p.pk, nombre=p.nombre, stock=p.stock_a_fecha or 0)
+        for p in productos
+    ]
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ProductoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'producto'
+
+    def ready(self):
+        from .busqueda import asegurar_triggers_fts
+        post_migrate.connect(asegurar_triggers_fts, sender=self)
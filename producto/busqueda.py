@@ -0,0 +1,120 @@
+import re
+from typing import List, Optional
+
+from django.db import connections, router, DEFAULT_DB_ALIAS
+from django.db.models import Q
+
+from .models import Producto
+
+TABLA_FTS = 'productos_fts'
+# peso de cada columna del índice en el ranking bm25 (nombre, detalles, tienda_id)
+PESOS_BM25 = (10.0, 1.0, 0.0)
+
+# triggers que mantienen el índice sincronizado con la tabla productos
+TRIGGERS_FTS = {
+    'productos_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN
+            INSERT INTO productos_fts(rowid, nombre, detalles, tienda_id)
+            VALUES (new.id, new.nombre, new.detalles, new.tienda_id);
+        END
+    """,
+    'productos_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN
+            INSERT INTO productos_fts(productos_fts, rowid, nombre, detalles, tienda_id)
+            VALUES ('delete', old.id, old.nombre, old.detalles, old.tienda_id);
+        END
+    """,
+    'productos_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS productos_fts_au AFTER UPDATE OF nombre, detalles, tienda_id ON productos BEGIN
+            INSERT INTO productos_fts(productos_fts, rowid, nombre, detalles, tienda_id)
+            VALUES ('delete', old.id, old.nombre, old.detalles, old.tienda_id);
+            INSERT INTO productos_fts(rowid, nombre, detalles, tienda_id)
+            VALUES (new.id, new.nombre, new.detalles, new.tienda_id);
+        END
+    """,
+}
+
+_fts_disponible = {}
+
+
+def fts_disponible(alias: str = DEFAULT_DB_ALIAS) -> bool:
+    """
+    Indica si existe el índice FTS5 (lo crea la migración 0006 sólo cuando
+    SQLite tiene FTS5). El resultado se cachea por alias de base de datos.
+    """
+    if alias not in _fts_disponible:
+        connection = connections[alias]
+        _fts_disponible[alias] = (
+            connection.vendor == 'sqlite'
+            and TABLA_FTS in connection.introspection.table_names(include_views=True)
+        )
+    return _fts_disponible[alias]
+
+
+def asegurar_triggers_fts(using: str = DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Receptor de post_migrate. En SQLite, las migraciones que añaden columnas a
+    `productos` reconstruyen la tabla y se pierden sus triggers. Si falta alguno
+    se vuelve a crear y se reconstruye el índice.
+    """
+    _fts_disponible.pop(using, None)
+    if not fts_disponible(using):
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'productos'")
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        if existentes.issuperset(TRIGGERS_FTS):
+            return
+        for sql in TRIGGERS_FTS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+
+
+def consulta_fts(texto: str) -> str:
+    """
+    Convierte el texto del usuario en una consulta FTS5 segura: cada término
+    va entre comillas (sin operadores) y con `*` para coincidir por prefijo.
+    """
+    terminos = re.findall(r'\w+', texto, flags=re.UNICODE)
+    return ' '.join(f'"{t}"*' for t in terminos)
+
+
+def buscar_ids(texto: str, tienda_id: Optional[int] = None, limite: int = 20) -> List[int]:
+    """
+    Devuelve los ids de productos visibles que coinciden con `texto`, ordenados
+    por relevancia. Usa FTS5 si está disponible y, si no, icontains sobre nombre/detalles.
+    """
+    if fts_disponible(router.db_for_read(Producto)):
+        consulta = consulta_fts(texto)
+        if not consulta:
+            return []
+        # los eliminados (pendientes del borrador) se descartan antes del LIMIT
+        sql = (
+            f"SELECT {TABLA_FTS}.rowid FROM {TABLA_FTS} JOIN productos ON productos.id = {TABLA_FTS}.rowid"
+            f" WHERE {TABLA_FTS} MATCH %s AND NOT productos.eliminado"
+            + (f" AND {TABLA_FTS}.tienda_id = %s" if tienda_id is not None else "")
+            + f" ORDER BY bm25({TABLA_FTS}, {', '.join(str(p) for p in PESOS_BM25)}) LIMIT %s"
+        )
+        params = [consulta] + ([tienda_id] if tienda_id is not None else []) + [limite]
+        with connections[router.db_for_read(Producto)].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [fila[0] for fila in cursor.fetchall()]
+
+    return list(buscar_icontains(texto, tienda_id).values_list('pk', flat=True)[:limite])
+
+
+def buscar_icontains(texto: str, tienda_id: Optional[int] = None):
+    """
+    Búsqueda sin índice (LIKE '%texto%'): alternativa cuando no hay FTS5.
+    """
+    qs = Producto.objects.filter(Q(nombre__icontains=texto) | Q(detalles__icontains=texto))
+    if tienda_id is not None:
+        qs = qs.filter(tienda_id=tienda_id)
+    return qs.order_by('nombre')
+
+
+def buscar_productos(texto: str, tienda_id: Optional[int] = None, limite: int = 20) -> List[Producto]:
+    ids = buscar_ids(texto, tienda_id, limite)
+    por_id = Producto.objects.in_bulk(ids)
+    return [por_id[pk] for pk in ids if pk in por_id]
@@ -0,0 +1,59 @@
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest
+
+from .models import Producto
+
+# (producto_id, cantidad, total): compra (o su reversión, con valores negativos)
+EntradaCosto = Tuple[int, int, Decimal]
+
+
+def registrar_costos_compra(entradas: Iterable[EntradaCosto]):
+    """
+    Actualiza el coste medio ponderado de los productos con las unidades
+    compradas:
+
+        costo_promedio = (stock · costo_promedio + total) / (stock + cantidad)
+
+    Con cantidades/totales negativos revierte una compra editada o borrada.
+    Se calcula en un único UPDATE por producto, así que es atómico frente a
+    otras compras concurrentes. Debe llamarse ANTES de aplicar el movimiento de
+    stock de la compra (usa el stock previo). Si el stock resultante no es
+    positivo el coste no cambia.
+    """
+    por_producto: Dict[int, list] = {}
+    for producto_id, cantidad, total in entradas:
+        acumulado = por_producto.setdefault(producto_id, [0, Decimal('0')])
+        acumulado[0] += cantidad
+        acumulado[1] += Decimal(total)
+
+    for producto_id, (cantidad, total) in por_producto.items():
+        if not cantidad and not total:
+            continue
+        valor = ExpressionWrapper(
+            Cast(F('stock'), FloatField()) * F('costo_promedio') + Value(float(total)),
+            output_field=FloatField(),
+        ) / (F('stock') + cantidad)
+        Producto.objects.filter(pk=producto_id).update(
+            costo_promedio=Case(
+                When(stock__gt=-cantidad, then=Greatest(valor, Value(0.0))),
+                default=F('costo_promedio'),
+                output_field=DecimalField(),
+            )
+        )
+
+
+def registrar_costo_compra(producto_id: int, cantidad: int, total: Decimal):
+    """
+    Atajo de `registrar_costos_compra` para un único producto.
+    """
+    registrar_costos_compra([(producto_id, cantidad, total)])
+
+
+def costo_de_venta(costo_promedio, cantidad: int) -> Decimal:
+    """
+    Coste de `cantidad` unidades vendidas al coste medio del producto.
+    """
+    return (Decimal(costo_promedio or 0) * cantidad).quantize(Decimal('0.01'))
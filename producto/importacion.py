@@ -0,0 +1,196 @@
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+from django.core.files.base import ContentFile
+from django.db.models import F
+
+from base_app.shards import atomico
+from .models import Producto, CheckpointStock
+from .stock import registrar_movimientos
+
+# filas por sentencia INSERT ... ON CONFLICT DO UPDATE
+LOTE_IMPORTACION = 1000
+CAMPOS_ACTUALIZABLES = ('detalles', 'precio', 'stock', 'stock_minimo')
+
+
+def leer_filas(contenido: bytes, formato: str) -> List[dict]:
+    """
+    Convierte el archivo subido (csv o json) en una lista de dicts.
+    El JSON puede ser una lista de objetos o {"productos": [...]}.
+    """
+    texto = contenido.decode('utf-8-sig')
+    if formato == 'json':
+        datos = json.loads(texto)
+        if isinstance(datos, dict):
+            datos = datos.get('productos', [])
+        if not isinstance(datos, list):
+            raise ValueError("El JSON debe ser una lista de productos")
+        return [d if isinstance(d, dict) else {} for d in datos]
+    return list(csv.DictReader(io.StringIO(texto)))
+
+
+def detectar_formato(nombre_archivo: str) -> str:
+    return 'json' if nombre_archivo.lower().endswith('.json') else 'csv'
+
+
+def _validar(fila: dict) -> dict:
+    nombre = (fila.get('nombre') or '').strip()
+    if not nombre:
+        raise ValueError("nombre es obligatorio")
+    if len(nombre) > 100:
+        raise ValueError("nombre supera 100 caracteres")
+    datos = {'nombre': nombre}
+    if 'detalles' in fila:
+        datos['detalles'] = fila['detalles'] or None
+    if fila.get('precio') not in (None, ''):
+        try:
+            precio = Decimal(str(fila['precio'])).quantize(Decimal('0.01'))
+        except (InvalidOperation, TypeError):
+            raise ValueError(f"precio inválido: {fila['precio']!r}")
+        if precio < 0:
+            raise ValueError("precio no puede ser negativo")
+        datos['precio'] = precio
+    for campo in ('stock', 'stock_minimo'):
+        if fila.get(campo) in (None, ''):
+            continue
+        try:
+            valor = int(fila[campo])
+        except (TypeError, ValueError):
+            raise ValueError(f"{campo} inválido: {fila[campo]!r}")
+        if valor < 0:
+            raise ValueError(f"{campo} no puede ser negativo")
+        datos[campo] = valor
+    if fila.get('imagen'):
+        datos['imagen'] = os.path.basename(str(fila['imagen']))
+    return datos
+
+
+def _guardar_imagenes(tienda_id: int, pendientes: Dict[str, str], imagenes: zipfile.ZipFile, errores: list):
+    campo = Producto._meta.get_field('imagen')
+    por_nombre = {os.path.basename(n): n for n in imagenes.namelist() if not n.endswith('/')}
+    ids = dict(Producto.objects.filter(tienda_id=tienda_id, nombre__in=pendientes.keys()).values_list('nombre', 'pk'))
+    actualizados = []
+    for nombre, archivo in pendientes.items():
+        if archivo not in por_nombre:
+            errores.append({'fila': None, 'nombre': nombre, 'error': f"imagen {archivo!r} no está en el zip"})
+            continue
+        ruta = campo.storage.save(campo.generate_filename(None, archivo), ContentFile(imagenes.read(por_nombre[archivo])))
+        actualizados.append(Producto(pk=ids[nombre], imagen=ruta))
+    Producto.objects.bulk_update(actualizados, ['imagen'], batch_size=LOTE_IMPORTACION)
+    for i in range(0, len(actualizados), LOTE_IMPORTACION):
+        pks = [p.pk for p in actualizados[i:i + LOTE_IMPORTACION]]
+        Producto.objects.filter(pk__in=pks).update(version=F('version') + 1)
+
+
+def importar_productos(tienda_id: int, filas: List[dict], imagenes: Optional[zipfile.ZipFile] = None,
+                       lote: int = LOTE_IMPORTACION) -> dict:
+    """
+    Inserta o actualiza (upsert sobre `unique_producto_nombre_por_tienda`) los
+    productos de una tienda en lotes con bulk_create(update_conflicts=True).
+
+    Sólo se sobrescriben las columnas presentes en el archivo. Los cambios de
+    stock de productos existentes quedan en el diario como ajustes y los
+    productos nuevos reciben su checkpoint inicial.
+    """
+    inicio = time.perf_counter()
+    errores = []
+    fallidos = 0
+    validas: Dict[str, tuple] = {}  # nombre -> (numero de fila, datos); la última fila gana
+    for numero, fila in enumerate(filas, start=1):
+        try:
+            datos = _validar(fila)
+        except ValueError as exc:
+            errores.append({'fila': numero, 'nombre': fila.get('nombre'), 'error': str(exc)})
+            fallidos += 1
+            continue
+        if datos['nombre'] in validas:
+            anterior = validas[datos['nombre']][0]
+            errores.append({'fila': anterior, 'nombre': datos['nombre'], 'error': f"duplicado, sustituido por la fila {numero}"})
+        validas[datos['nombre']] = (numero, datos)
+
+    columnas = {c for _n, datos in validas.values() for c in datos}
+    update_fields = [c for c in CAMPOS_ACTUALIZABLES if c in columnas] + ['ultima_actualicacion']
+
+    creados = actualizados = 0
+    imagenes_pendientes = {}
+    lista = list(validas.values())
+    for i in range(0, len(lista), lote):
+        bloque = lista[i:i + lote]
+        # el nombre sigue ocupado hasta que el borrador elimina el producto
+        borrandose = set(
+            Producto._base_manager.filter(tienda_id=tienda_id, nombre__in=[d['nombre'] for _n, d in bloque], eliminado=True)
+            .values_list('nombre', flat=True)
+        )
+        if borrandose:
+            errores.extend(
+                {'fila': n, 'nombre': d['nombre'], 'error': "producto pendiente de borrado"}
+                for n, d in bloque if d['nombre'] in borrandose
+            )
+            fallidos += sum(1 for _n, d in bloque if d['nombre'] in borrandose)
+            bloque = [(n, d) for n, d in bloque if d['nombre'] not in borrandose]
+        nombres = [datos['nombre'] for _n, datos in bloque]
+        with atomico():
+            existentes = {
+                fila['nombre']: fila
+                for fila in Producto.objects.filter(tienda_id=tienda_id, nombre__in=nombres)
+                .values('pk', 'nombre', *CAMPOS_ACTUALIZABLES)
+            }
+            objetos = []
+            ajustes = []
+            for _numero, datos in bloque:
+                campos = {k: v for k, v in datos.items() if k != 'imagen'}
+                actual = existentes.get(datos['nombre'])
+                if actual:
+                    # columnas ausentes en esta fila conservan el valor actual
+                    for campo in CAMPOS_ACTUALIZABLES:
+                        campos.setdefault(campo, actual[campo])
+                    if campos['stock'] != actual['stock']:
+                        ajustes.append((actual['pk'], campos['stock'] - actual['stock'], 'ajuste', None))
+                else:
+                    campos.setdefault('stock', 0)
+                objetos.append(Producto(tienda_id=tienda_id, **campos))
+                if 'imagen' in datos:
+                    imagenes_pendientes[datos['nombre']] = datos['imagen']
+            Producto.objects.bulk_create(
+                objetos,
+                update_conflicts=True,
+                unique_fields=['tienda', 'nombre'],
+                update_fields=update_fields,
+            )
+            if existentes:
+                # el upsert no admite F(): nueva versión en un UPDATE aparte, para
+                # que una edición basada en los valores anteriores reciba 409
+                Producto.objects.filter(pk__in=[f['pk'] for f in existentes.values()]).update(version=F('version') + 1)
+
+            nuevos = [n for n in nombres if n not in existentes]
+            if nuevos:
+                CheckpointStock.objects.bulk_create([
+                    CheckpointStock(producto_id=pk, stock=stock)
+                    for pk, stock in Producto.objects.filter(tienda_id=tienda_id, nombre__in=nuevos).values_list('pk', 'stock')
+                ])
+            if ajustes:
+                registrar_movimientos(ajustes)
+        creados += len(nuevos)
+        actualizados += len(bloque) - len(nuevos)
+
+    if imagenes_pendientes:
+        if imagenes is None:
+            errores.extend({'fila': None, 'nombre': n, 'error': "se indicó imagen pero no se envió el zip"} for n in imagenes_pendientes)
+        else:
+            _guardar_imagenes(tienda_id, imagenes_pendientes, imagenes, errores)
+
+    duracion = time.perf_counter() - inicio
+    return {
+        'creados': creados,
+        'actualizados': actualizados,
+        'fallidos': fallidos,
+        'errores': errores,
+        'duracion_s': round(duracion, 3),
+        'filas_por_segundo': round(len(filas) / duracion) if duracion else len(filas),
+    }
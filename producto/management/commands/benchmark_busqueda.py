@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tienda.models import Tienda
+from producto.models import Producto
+from producto.busqueda import buscar_icontains, buscar_ids, fts_disponible
+
+SILABAS = ('ma', 'ra', 'to', 'li', 'ne', 'sa', 'co', 'pe', 'du', 'ri', 'ba', 'lo', 'te', 'fi', 'gu', 'zo')
+
+
+def _vocabulario(rnd: random.Random, tamano: int):
+    palabras = set()
+    while len(palabras) < tamano:
+        palabras.add(''.join(rnd.choice(SILABAS) for _ in range(rnd.randint(2, 4))))
+    return sorted(palabras)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la búsqueda FTS5 con icontains sobre un catálogo sintético. "
+        "Los datos se crean dentro de una transacción que se deshace al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--consultas', type=int, default=200)
+        parser.add_argument('--vocabulario', type=int, default=5000, help="Palabras distintas en nombres/detalles.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not fts_disponible():
+            raise CommandError("El índice FTS5 no está disponible en esta base de datos")
+        rnd = random.Random(options['seed'])
+        n = options['productos']
+        palabras = _vocabulario(rnd, options['vocabulario'])
+
+        with transaction.atomic():
+            tienda = Tienda.objects.create(nombre='benchmark')
+            inicio = time.perf_counter()
+            Producto.objects.bulk_create(
+                (
+                    Producto(
+                        tienda=tienda,
+                        nombre=f"{' '.join(rnd.sample(palabras, 3))} {i}",
+                        detalles=' '.join(rnd.sample(palabras, 6)),
+                        stock=0,
+                    )
+                    for i in range(n)
+                ),
+                batch_size=2000,
+            )
+            self.stdout.write(f"{n} productos creados en {time.perf_counter() - inicio:.1f}s")
+
+            # términos completos y prefijos (autocompletado) de palabras del catálogo
+            consultas = [rnd.choice(palabras)[:rnd.randint(3, 8)] for _ in range(options['consultas'])]
+            for etiqueta, buscar in (
+                ('fts5', lambda q: buscar_ids(q, tienda_id=tienda.pk, limite=20)),
+                ('icontains', lambda q: list(buscar_icontains(q, tienda_id=tienda.pk).values_list('pk', flat=True)[:20])),
+            ):
+                tiempos = []
+                for q in consultas:
+                    t0 = time.perf_counter()
+                    buscar(q)
+                    tiempos.append((time.perf_counter() - t0) * 1000)
+                tiempos.sort()
+                self.stdout.write(
+                    f"{etiqueta:<10} media={statistics.mean(tiempos):.2f}ms "
+                    f"p50={tiempos[len(tiempos) // 2]:.2f}ms p95={tiempos[int(len(tiempos) * 0.95)]:.2f}ms"
+                )
+            transaction.set_rollback(True)
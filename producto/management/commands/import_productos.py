@@ -0,0 +1,41 @@
+import zipfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from base_app.shards import shard_de_tienda, usar_shard
+from tienda.models import Tienda
+from producto.importacion import LOTE_IMPORTACION, detectar_formato, importar_productos, leer_filas
+
+
+class Command(BaseCommand):
+    help = "Importa (crea o actualiza por nombre) productos de una tienda desde un CSV o JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tienda', type=int)
+        parser.add_argument('archivo', type=Path)
+        parser.add_argument('--imagenes', type=Path, default=None, help="Zip con las imágenes referenciadas.")
+        parser.add_argument('--formato', choices=['csv', 'json'], default=None)
+        parser.add_argument('--lote', type=int, default=LOTE_IMPORTACION)
+
+    def handle(self, *args, **options):
+        if not Tienda.objects.filter(pk=options['tienda']).exists():
+            raise CommandError(f"La tienda {options['tienda']} no existe")
+        archivo = options['archivo']
+        try:
+            filas = leer_filas(archivo.read_bytes(), options['formato'] or detectar_formato(archivo.name))
+        except (OSError, ValueError, UnicodeDecodeError) as exc:
+            raise CommandError(f"No se pudo leer {archivo}: {exc}")
+
+        imagenes = zipfile.ZipFile(options['imagenes']) if options['imagenes'] else None
+        with usar_shard(shard_de_tienda(options['tienda'])):
+            resultado = importar_productos(options['tienda'], filas, imagenes, lote=options['lote'])
+
+        for error in resultado['errores']:
+            fila = f"fila {error['fila']}" if error['fila'] else "-"
+            self.stderr.write(f"{fila}: {error['nombre']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['creados']} creados, {resultado['actualizados']} actualizados, "
+            f"{resultado['fallidos']} fallidos en {resultado['duracion_s']}s "
+            f"({resultado['filas_por_segundo']} filas/s)"
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base_app.shards import usar_shard
+from producto.pronostico import cargar_numpy, pronosticar
+from tienda.models import Tienda
+
+
+class Command(BaseCommand):
+    help = "Recalcula el pronóstico de demanda (y lo deja en caché) para una o todas las tiendas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tienda', type=int, default=None, help="Limitar a una tienda.")
+        parser.add_argument('--limit', type=int, default=20, help="Productos a reponer a listar por tienda (0 = ninguno).")
+
+    def handle(self, *args, **options):
+        tiendas = Tienda.objects.order_by('pk')
+        if options['tienda'] is not None:
+            tiendas = tiendas.filter(pk=options['tienda'])
+        motor = "numpy" if cargar_numpy() is not None else "python"
+
+        for tienda in tiendas:
+            inicio = time.perf_counter()
+            with usar_shard(tienda.shard):
+                resultado = pronosticar(tienda.pk, recalcular=True)
+            duracion = time.perf_counter() - inicio
+            reponer = [r for r in resultado if r['reponer']]
+            for r in reponer[:options['limit']]:
+                cobertura = f"{r['dias_cobertura']:.1f}d" if r['dias_cobertura'] is not None else "-"
+                self.stdout.write(
+                    f"{r['id']:>8}  {r['nombre'][:40]:<40}  stock={r['stock']:<6} demanda={r['demanda_diaria']:<8} cobertura={cobertura:<8} reponer={r['reponer']}"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"{tienda.nombre}: {len(resultado)} productos, {len(reponer)} a reponer ({motor}, {duracion:.3f}s)"
+            ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from base_app.shards import atomico, shard_de_tienda, todos, usar_shard
+from producto.reconciliacion import calcular_desfases, corregir_desfases
+
+
+class Command(BaseCommand):
+    help = "Compara el stock de cada producto con el inicial + compras - ventas + ajustes y opcionalmente lo corrige."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tienda', type=int, default=None, help="Limitar a los productos de una tienda.")
+        parser.add_argument('--fix', action='store_true', help="Corregir el stock desfasado.")
+        parser.add_argument('--limit', type=int, default=50, help="Máximo de desfases a listar (0 = todos).")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        aliases = todos() if options['tienda'] is None else [shard_de_tienda(options['tienda'])]
+        desfases = []
+        for alias in aliases:
+            with usar_shard(alias), atomico():
+                encontrados = calcular_desfases(tienda_id=options['tienda'])
+                if options['fix']:
+                    corregir_desfases(encontrados)
+            desfases.extend(encontrados)
+        duracion = time.perf_counter() - inicio
+
+        limit = options['limit']
+        for d in (desfases if not limit else desfases[:limit]):
+            self.stdout.write(f"{d.producto_id:>8}  {d.nombre[:40]:<40}  stock={d.stock:<8} esperado={d.esperado:<8} diferencia={d.diferencia:+d}")
+        if limit and len(desfases) > limit:
+            self.stdout.write(f"... y {len(desfases) - limit} más")
+
+        accion = "corregidos" if options['fix'] else "detectados"
+        self.stdout.write(self.style.SUCCESS(f"{len(desfases)} productos desfasados {accion} en {duracion:.2f}s"))
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0003_rename_created_at_producto_fecha_creacion_and_more'),
+        ('tienda', '0004_alter_tienda_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'checkpoints_stock',
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('origen', models.CharField(choices=[('compra', 'Compra'), ('venta', 'Venta'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('origen_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'movimientos_stock',
+            },
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='imagen',
+            field=models.ImageField(blank=True, null=True, upload_to='producto/imagenes/'),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(fields=('tienda', 'nombre'), name='unique_producto_nombre_por_tienda'),
+        ),
+        migrations.AddField(
+            model_name='checkpointstock',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints_stock', to='producto.producto'),
+        ),
+        migrations.AddField(
+            model_name='movimientostock',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_stock', to='producto.producto'),
+        ),
+        migrations.AddIndex(
+            model_name='checkpointstock',
+            index=models.Index(fields=['producto', 'fecha'], name='cp_stock_producto_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', 'fecha'], name='mov_stock_producto_fecha'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0004_movimientostock_checkpointstock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='origen',
+            field=models.CharField(choices=[('compra', 'Compra'), ('venta', 'Venta'), ('ajuste', 'Ajuste'), ('reconciliacion', 'Reconciliación')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Índice de texto completo (SQLite FTS5) sobre productos.nombre/detalles.
+# En bases de datos sin FTS5 la migración no hace nada y la búsqueda usa icontains.
+
+from django.db import migrations, OperationalError
+
+CREAR = [
+    """
+    CREATE VIRTUAL TABLE productos_fts USING fts5(
+        nombre, detalles, tienda_id UNINDEXED,
+        content='productos', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER productos_fts_ai AFTER INSERT ON productos BEGIN
+        INSERT INTO productos_fts(rowid, nombre, detalles, tienda_id)
+        VALUES (new.id, new.nombre, new.detalles, new.tienda_id);
+    END
+    """,
+    """
+    CREATE TRIGGER productos_fts_ad AFTER DELETE ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, detalles, tienda_id)
+        VALUES ('delete', old.id, old.nombre, old.detalles, old.tienda_id);
+    END
+    """,
+    """
+    CREATE TRIGGER productos_fts_au AFTER UPDATE OF nombre, detalles, tienda_id ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, detalles, tienda_id)
+        VALUES ('delete', old.id, old.nombre, old.detalles, old.tienda_id);
+        INSERT INTO productos_fts(rowid, nombre, detalles, tienda_id)
+        VALUES (new.id, new.nombre, new.detalles, new.tienda_id);
+    END
+    """,
+    "INSERT INTO productos_fts(productos_fts) VALUES ('rebuild')",
+]
+
+BORRAR = [
+    "DROP TRIGGER IF EXISTS productos_fts_au",
+    "DROP TRIGGER IF EXISTS productos_fts_ad",
+    "DROP TRIGGER IF EXISTS productos_fts_ai",
+    "DROP TABLE IF EXISTS productos_fts",
+]
+
+
+def crear_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_check USING fts5(x)")
+            cursor.execute("DROP TABLE temp.fts5_check")
+        except OperationalError:
+            # SQLite compilado sin FTS5
+            return
+        for sql in CREAR:
+            cursor.execute(sql)
+
+
+def borrar_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in BORRAR:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0005_alter_movimientostock_origen'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_fts, borrar_fts),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0006_productos_fts'),
+        ('tienda', '0004_alter_tienda_imagen'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['tienda', 'ultima_actualicacion', 'id'], name='producto_sync'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0007_sync_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0008_version'),
+        ('tienda', '0004_alter_tienda_imagen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_minimo',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__lt', models.F('stock_minimo'))), fields=['tienda', 'stock'], name='producto_bajo_stock'),
+        ),
+    ]
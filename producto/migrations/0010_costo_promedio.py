@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0009_bajo_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='costo_promedio',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0010_costo_promedio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='eliminado',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
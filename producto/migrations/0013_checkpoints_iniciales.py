@@ -0,0 +1,69 @@
+import re
+
+from django.db import migrations
+from django.db.migrations.recorder import MigrationRecorder
+
+# la migración que creó el diario de stock: lo anterior no tiene checkpoint inicial
+DIARIO = ('producto', '0004_movimientostock_checkpointstock')
+
+
+def _previos(cursor, conexion, tabla, inicio_diario):
+    """Unidades por producto de las filas anteriores al diario (tabla viva y archivos)."""
+    q = conexion.ops.quote_name
+    patron = re.compile(rf"^{tabla}(_archivo_\d{{4}})?$")
+    totales = {}
+    for nombre in conexion.introspection.table_names(cursor):
+        if patron.match(nombre):
+            cursor.execute(
+                f"SELECT producto_id, SUM(cantidad) FROM {q(nombre)} WHERE fecha_creacion < %s GROUP BY producto_id",
+                [inicio_diario],
+            )
+            for pid, total in cursor.fetchall():
+                totales[pid] = totales.get(pid, 0) + total
+    return totales
+
+
+def crear_checkpoints(apps, schema_editor):
+    """
+    Los productos dados de alta antes del diario no tienen checkpoint de alta:
+    su primer checkpoint es el del primer movimiento y ya incluye las compras
+    y ventas anteriores, que la reconciliación volvería a sumar. Se les crea
+    uno a la fecha de alta con el stock de entonces menos esas compras y más
+    esas ventas.
+    """
+    conexion = schema_editor.connection
+    registro = MigrationRecorder(conexion).migration_qs.filter(app=DIARIO[0], name=DIARIO[1]).first()
+    if registro is None:
+        return
+    inicio_diario = conexion.ops.adapt_datetimefield_value(registro.applied)
+    with conexion.cursor() as cursor:
+        # stock al empezar el diario: el previo al primer movimiento, o el actual si no hubo ninguno
+        cursor.execute(
+            "SELECT p.id, p.fecha_creacion, COALESCE(("
+            "  SELECT c.stock FROM checkpoints_stock c WHERE c.producto_id = p.id ORDER BY c.fecha, c.id LIMIT 1"
+            "), p.stock) FROM productos p WHERE p.fecha_creacion < %s",
+            [inicio_diario],
+        )
+        productos = cursor.fetchall()
+        if not productos:
+            return
+        compras = _previos(cursor, conexion, 'compras', inicio_diario)
+        ventas = _previos(cursor, conexion, 'ventas', inicio_diario)
+        cursor.executemany(
+            "INSERT INTO checkpoints_stock (producto_id, stock, fecha) VALUES (%s, %s, %s)",
+            [(pid, stock - compras.get(pid, 0) + ventas.get(pid, 0), alta) for pid, alta, stock in productos],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0012_precio_centavos'),
+        ('compra', '0005_centavos'),
+        ('venta', '0009_eventoventa_rechazado'),
+    ]
+
+    operations = [
+        # al deshacerla, los checkpoints de alta se quedan: siguen siendo correctos
+        migrations.RunPython(crear_checkpoints, migrations.RunPython.noop),
+    ]
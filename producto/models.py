@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
 from tienda.models import Tienda
-from base_app.models import BaseModel
+from base_app.models import BaseModel, CentavosField, VisiblesManager
 
 # Create your models here.
 class Producto(BaseModel):
@@ -8,8 +10,18 @@ class Producto(BaseModel):
     nombre = models.CharField(max_length=100)
     detalles = models.TextField(null=True, blank=True)
     stock = models.PositiveIntegerField()
+    # umbral de reposición: el producto está bajo stock cuando stock < stock_minimo (0 = sin alerta)
+    stock_minimo = models.PositiveIntegerField(default=0)
     imagen = models.ImageField(upload_to='producto/imagenes/', null=True, blank=True)
-    precio = models.DecimalField(max_digits=10, decimal_places=2,null=True, blank=True,default=0.00)
+    precio = CentavosField(null=True, blank=True, default=0)
+    # coste medio ponderado por unidad, actualizado con cada compra (producto/costos.py)
+    costo_promedio = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    # control de concurrencia optimista en update_producto
+    version = models.PositiveIntegerField(default=0)
+    # marcado para borrado en segundo plano (base_app/borrado.py): oculto en todas partes
+    eliminado = models.BooleanField(default=False, editable=False)
+
+    objects = VisiblesManager()
 
     def __str__(self):
         return self.nombre
@@ -19,3 +31,56 @@ class Producto(BaseModel):
         constraints = [
             models.UniqueConstraint(fields=['tienda', 'nombre'], name='unique_producto_nombre_por_tienda')
         ]
+        indexes = [
+            models.Index(fields=['tienda', 'ultima_actualicacion', 'id'], name='producto_sync'),
+            # índice parcial: sólo contiene los productos bajo stock, así que lo
+            # mantiene la base de datos en cualquier escritura de stock
+            models.Index(fields=['tienda', 'stock'], condition=Q(stock__lt=F('stock_minimo')), name='producto_bajo_stock'),
+        ]
+
+
+class MovimientoStock(models.Model):
+    """
+    Diario append-only de cambios de stock. Cada camino que modifica
+    `Producto.stock` registra aquí su delta junto con el origen del cambio.
+    """
+    ORIGENES = [
+        ('compra', 'Compra'),
+        ('venta', 'Venta'),
+        ('ajuste', 'Ajuste'),
+        ('reconciliacion', 'Reconciliación'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos_stock')
+    delta = models.IntegerField()
+    origen = models.CharField(max_length=20, choices=ORIGENES)
+    origen_id = models.PositiveBigIntegerField(null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'movimientos_stock'
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='mov_stock_producto_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} {self.delta:+d} ({self.origen})"
+
+
+class CheckpointStock(models.Model):
+    """
+    Foto periódica del stock de un producto. El inventario a una fecha pasada
+    se obtiene del checkpoint más cercano más los movimientos posteriores.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='checkpoints_stock')
+    stock = models.IntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'checkpoints_stock'
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='cp_stock_producto_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} = {self.stock} @ {self.fecha:%Y-%m-%d %H:%M}"
@@ -0,0 +1,200 @@
+import math
+import uuid
+from bisect import bisect_right
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from typing import Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from base_app.shards import actual
+from venta.models import Venta
+from .models import Producto
+
+# medias móviles calculadas (días)
+VENTANAS = (7, 28)
+
+
+def cargar_numpy():
+    """
+    NumPy si está instalado (None si no). Se importa al calcular el primer
+    pronóstico y no al arrancar, que es cuando más pesa.
+    """
+    try:
+        import numpy
+    except ImportError:  # dependencia opcional: sin NumPy se usa Python puro
+        return None
+    return numpy
+
+
+def _dias() -> int:
+    return max(getattr(settings, 'PRONOSTICO_DIAS', 56), max(VENTANAS))
+
+
+def _alfa() -> float:
+    return getattr(settings, 'PRONOSTICO_ALFA', 0.3)
+
+
+def _clave(tienda_id: int, hoy) -> str:
+    return f"pronostico:{tienda_id}:{hoy.isoformat()}"
+
+
+def _clave_version(tienda_id: int) -> str:
+    return f"ventas:version:{tienda_id}"
+
+
+def version_ventas(tienda_id: int) -> str:
+    """
+    Versión de las ventas de la tienda: cambia con cada `invalidar_pronostico`,
+    así que los cachés de días ya cerrados (el heatmap) la llevan en su clave.
+    """
+    clave = _clave_version(tienda_id)
+    version = cache.get(clave)
+    if version is None:
+        # un valor nuevo y no uno fijo: si la caché la desalojó, las entradas
+        # hechas con la anterior no vuelven a valer
+        cache.add(clave, uuid.uuid4().hex, timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def _pesos_suavizado(dias: int, alfa: float) -> List[float]:
+    """
+    Pesos del suavizado exponencial simple expresado como suma ponderada:
+    nivel = Σ pesos[t] · ventas[t], con el primer día como nivel inicial.
+    """
+    pesos = [alfa * (1 - alfa) ** (dias - 1 - t) for t in range(dias)]
+    pesos[0] = (1 - alfa) ** (dias - 1)
+    return pesos
+
+
+def _ventas_por_dia(tienda_id: int, primero, dias: int):
+    """
+    (producto_id, día, cantidad) de las ventas de la tienda en la ventana, con
+    el día como índice 0..dias-1. Es una única consulta (servida por el índice
+    venta_serie_producto).
+
+    SQLite guarda las fechas como texto UTC ordenable ('YYYY-MM-DD HH:MM:SS...'),
+    así que la fecha se lee sin convertir y el día local se asigna con bisect
+    sobre las medianoches locales de la ventana en ese mismo formato: mucho más
+    barato que TruncDate o que crear un datetime por fila.
+    """
+    medianoches = [
+        timezone.make_aware(datetime.combine(primero + timedelta(days=d), time.min))
+        for d in range(dias + 1)
+    ]
+    limites = [m.astimezone(dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S') for m in medianoches]
+    filas = (
+        Venta.visibles.filter(producto__tienda_id=tienda_id, fecha_creacion__gte=medianoches[0], fecha_creacion__lt=medianoches[-1])
+        .order_by()
+        .values_list('producto_id', Cast('fecha_creacion', CharField()), 'cantidad')
+    )
+    for pid, fecha, cantidad in filas.iterator(chunk_size=10000):
+        yield pid, bisect_right(limites, fecha) - 1, cantidad
+
+
+def calcular_demanda(tienda_id: int, recalcular: bool = False) -> dict:
+    """
+    Carga la serie diaria de ventas de todos los productos de la tienda en una
+    matriz productos × días y calcula a la vez, para cada producto, las medias
+    móviles de VENTANAS y el suavizado exponencial (demanda diaria estimada).
+
+    El resultado se cachea hasta la siguiente venta de la tienda (ver
+    `invalidar_pronostico`) o hasta que cambie el día; `recalcular` la ignora.
+    La caché debe ser compartida entre workers (CACHES en settings).
+    """
+    hoy = timezone.localdate()
+    clave = _clave(tienda_id, hoy)
+    demanda = None if recalcular else cache.get(clave)
+    if demanda is not None:
+        return demanda
+
+    dias = _dias()
+    primero = hoy - timedelta(days=dias - 1)
+    ids = list(Producto.objects.filter(tienda_id=tienda_id).order_by('pk').values_list('pk', flat=True))
+    posicion = {pid: i for i, pid in enumerate(ids)}
+    celdas = [
+        (posicion[pid], dia, cantidad)
+        for pid, dia, cantidad in _ventas_por_dia(tienda_id, primero, dias)
+        if pid in posicion
+    ]
+    pesos = _pesos_suavizado(dias, _alfa())
+
+    np = cargar_numpy()
+    if np is not None:
+        datos = np.array(celdas, dtype=np.int64).reshape(-1, 3)
+        matriz = np.bincount(
+            datos[:, 0] * dias + datos[:, 1], weights=datos[:, 2], minlength=len(ids) * dias,
+        ).reshape(len(ids), dias)
+        medias = {n: matriz[:, -n:].mean(axis=1).tolist() for n in VENTANAS}
+        suavizado = (matriz @ np.asarray(pesos)).tolist()
+    else:
+        matriz = [[0.0] * dias for _ in ids]
+        for fila, columna, valor in celdas:
+            matriz[fila][columna] += valor
+        medias = {n: [sum(serie[-n:]) / n for serie in matriz] for n in VENTANAS}
+        suavizado = [sum(p * v for p, v in zip(pesos, serie)) for serie in matriz]
+
+    demanda = {
+        'ids': ids,
+        'medias': medias,
+        'suavizado': suavizado,
+    }
+    cache.set(clave, demanda, timeout=24 * 3600)
+    return demanda
+
+
+def pronosticar(tienda_id: int, solo_reponer: bool = False, recalcular: bool = False) -> List[dict]:
+    """
+    Días de stock restantes y cantidad sugerida a reponer por producto.
+
+    La demanda (cacheada) se combina con el stock actual, de modo que compras y
+    ajustes se reflejan sin invalidar la caché. La cantidad sugerida cubre
+    PRONOSTICO_COBERTURA_DIAS de demanda más el stock_minimo.
+    Ordenado por días de cobertura, primero los más urgentes.
+    """
+    demanda = calcular_demanda(tienda_id, recalcular)
+    cobertura = getattr(settings, 'PRONOSTICO_COBERTURA_DIAS', 14)
+    indice = {pid: i for i, pid in enumerate(demanda['ids'])}
+    resultado = []
+    productos = Producto.objects.filter(tienda_id=tienda_id).order_by('pk').values_list('pk', 'nombre', 'stock', 'stock_minimo')
+    for pid, nombre, stock, stock_minimo in productos:
+        i = indice.get(pid)
+        diaria = demanda['suavizado'][i] if i is not None else 0.0
+        reponer = max(0, math.ceil(round(diaria * cobertura + stock_minimo - stock, 6)))
+        if solo_reponer and not reponer:
+            continue
+        resultado.append({
+            'id': pid,
+            'nombre': nombre,
+            'stock': stock,
+            'stock_minimo': stock_minimo,
+            **{f'media_{n}': round(demanda['medias'][n][i], 3) if i is not None else 0.0 for n in VENTANAS},
+            'demanda_diaria': round(diaria, 3),
+            'dias_cobertura': round(stock / diaria, 1) if diaria > 0 else None,
+            'reponer': reponer,
+        })
+    resultado.sort(key=lambda r: (r['dias_cobertura'] is None, r['dias_cobertura'] or 0, -r['reponer']))
+    return resultado
+
+
+def invalidar_pronostico(tienda_ids: Iterable[int]):
+    """
+    Descarta la demanda cacheada de las tiendas y cambia su `version_ventas`
+    cuando confirme la transacción (del shard activo) que registró ventas.
+    Sólo llega a todos los workers si CACHES es una caché compartida; con
+    LocMemCache se limpia únicamente la del proceso actual.
+    """
+    tiendas = set(tienda_ids)
+    if not tiendas:
+        return
+
+    def invalidar():
+        cache.delete_many([_clave(tienda_id, timezone.localdate()) for tienda_id in tiendas])
+        cache.set_many({_clave_version(tienda_id): uuid.uuid4().hex for tienda_id in tiendas}, timeout=None)
+
+    transaction.on_commit(invalidar, using=actual())
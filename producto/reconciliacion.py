@@ -0,0 +1,107 @@
+from typing import List, NamedTuple, Optional
+
+from django.db.models import Case, OuterRef, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from base_app.archivo import querysets
+from base_app.shards import atomico
+from compra.models import Compra
+from venta.models import Venta
+from .models import CheckpointStock, MovimientoStock, Producto
+from .stock import registrar_movimientos
+
+# tamaño de cada CASE en el UPDATE masivo (límite de variables de SQLite)
+LOTE_UPDATE = 500
+
+# movimientos del diario que cambian el stock sin fila en compras ni ventas; las
+# reconciliaciones no cuentan: llevan el stock al esperado, no lo mueven
+ORIGENES_SIN_LIBRO = ('ajuste',)
+
+
+class Desfase(NamedTuple):
+    producto_id: int
+    nombre: str
+    stock: int
+    esperado: int
+
+    @property
+    def diferencia(self) -> int:
+        return self.esperado - self.stock
+
+
+def _totales_por_producto(modelo, tienda_id: Optional[int], producto_ids: Optional[List[int]]):
+    totales = {}
+    # una única consulta agrupada por tabla, incluidas las de archivo: el libro es todo el historial
+    for qs in querysets(modelo):
+        if tienda_id is not None:
+            qs = qs.filter(producto__tienda_id=tienda_id)
+        if producto_ids is not None:
+            qs = qs.filter(producto_id__in=producto_ids)
+        for pid, total in qs.order_by().values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total'):
+            totales[pid] = totales.get(pid, 0) + total
+    return totales
+
+
+def _ajustes_por_producto(tienda_id: Optional[int], producto_ids: Optional[List[int]]):
+    qs = MovimientoStock.objects.filter(origen__in=ORIGENES_SIN_LIBRO)
+    if tienda_id is not None:
+        qs = qs.filter(producto__tienda_id=tienda_id)
+    if producto_ids is not None:
+        qs = qs.filter(producto_id__in=producto_ids)
+    return dict(qs.order_by().values('producto_id').annotate(total=Sum('delta')).values_list('producto_id', 'total'))
+
+
+def calcular_desfases(tienda_id: Optional[int] = None, producto_ids: Optional[List[int]] = None) -> List[Desfase]:
+    """
+    Compara `Producto.stock` con el stock esperado según el libro y devuelve los
+    productos desfasados.
+
+    El esperado parte del stock inicial (el del primer checkpoint: el de alta en
+    create_producto y el importador, o el previo al primer movimiento) y suma
+    compras, resta ventas y suma los ajustes manuales del diario, que no tienen
+    fila en ninguna de las dos tablas. Los productos anteriores al diario
+    reciben ese checkpoint de alta en la migración 0013_checkpoints_iniciales.
+    """
+    compras = _totales_por_producto(Compra, tienda_id, producto_ids)
+    ventas = _totales_por_producto(Venta, tienda_id, producto_ids)
+    ajustes = _ajustes_por_producto(tienda_id, producto_ids)
+
+    primer_checkpoint = CheckpointStock.objects.filter(producto_id=OuterRef('pk')).order_by('fecha', 'pk')
+    productos = Producto.objects.annotate(inicial=Subquery(primer_checkpoint.values('stock')[:1]))
+    if tienda_id is not None:
+        productos = productos.filter(tienda_id=tienda_id)
+    if producto_ids is not None:
+        productos = productos.filter(pk__in=producto_ids)
+
+    desfases = []
+    filas = productos.order_by('pk').values_list('pk', 'nombre', 'stock', 'inicial').iterator(chunk_size=5000)
+    for pid, nombre, stock, inicial in filas:
+        esperado = (inicial or 0) + (compras.get(pid) or 0) - (ventas.get(pid) or 0) + (ajustes.get(pid) or 0)
+        if esperado != stock:
+            desfases.append(Desfase(pid, nombre, stock, esperado))
+    return desfases
+
+
+def corregir_desfases(desfases: List[Desfase]) -> int:
+    """
+    Ajusta el stock de los productos desfasados con un UPDATE ... CASE por lote
+    y deja constancia de cada ajuste en el diario de stock.
+    El stock no puede ser negativo, así que un esperado < 0 se deja en 0.
+    """
+    if not desfases:
+        return 0
+    movimientos = []
+    with atomico():
+        for i in range(0, len(desfases), LOTE_UPDATE):
+            lote = desfases[i:i + LOTE_UPDATE]
+            Producto.objects.filter(pk__in=[d.producto_id for d in lote]).update(
+                stock=Case(*[When(pk=d.producto_id, then=Value(max(d.esperado, 0))) for d in lote]),
+                ultima_actualicacion=timezone.now(),
+            )
+            movimientos.extend(
+                (d.producto_id, max(d.esperado, 0) - d.stock, 'reconciliacion', None)
+                for d in lote if max(d.esperado, 0) != d.stock
+            )
+        if movimientos:
+            registrar_movimientos(movimientos)
+    return len(desfases)
@@ -1,7 +1,9 @@
 from ninja import Schema,ModelSchema
 from tienda.models import Tienda
+import base_app.schemas  # noqa: F401  (registra CentavosField en ninja)
 from .models import Producto
-from typing import Optional, List
+from typing import Literal, Optional, List
+from decimal import Decimal
 
 class ProductoSchema(ModelSchema):
     class Meta:
@@ -11,12 +13,69 @@ class ProductoSchema(ModelSchema):
 class ProductoInSchema(Schema):
     nombre: str
     detalles: Optional[str]
-    precio: float
+    precio: Decimal
     tienda_id: int
     stock: Optional[int] = 0
+    stock_minimo: Optional[int] = 0
+    version: Optional[int] = None  # la leída por el cliente, para detectar conflictos al actualizar
     # imagen se envía como archivo multipart/form-data en el endpoint, no como URL
 
 class SimpleProductoSchema(Schema):
     id: int
     nombre: str
-    
\ No newline at end of file
+    
+class InventarioSchema(Schema):
+    id: int
+    nombre: str
+    stock: int
+
+class BajoStockSchema(Schema):
+    id: int
+    tienda_id: int
+    nombre: str
+    stock: int
+    stock_minimo: int
+    faltante: int
+
+class PronosticoSchema(Schema):
+    id: int
+    nombre: str
+    stock: int
+    stock_minimo: int
+    media_7: float
+    media_28: float
+    demanda_diaria: float  # suavizado exponencial de las ventas diarias
+    dias_cobertura: Optional[float] = None  # None si no hay demanda
+    reponer: int
+
+class ImportacionErrorSchema(Schema):
+    fila: Optional[int] = None
+    nombre: Optional[str] = None
+    error: str
+
+class ImportacionResultadoSchema(Schema):
+    creados: int
+    actualizados: int
+    fallidos: int
+    errores: List[ImportacionErrorSchema]
+    duracion_s: float
+    filas_por_segundo: int
+
+class AjustePrecioInSchema(Schema):
+    modo: Literal['porcentaje', 'absoluto']
+    valor: Decimal
+    # filtros: sin ninguno se ajusta todo el catálogo de la tienda
+    producto_ids: Optional[List[int]] = None
+    patron: Optional[str] = None  # coincidencia parcial en nombre
+    dry_run: bool = False
+
+class AjustePrecioPreviewSchema(Schema):
+    id: int
+    nombre: str
+    precio_actual: Optional[Decimal]
+    precio_nuevo: Decimal
+
+class AjustePrecioResultadoSchema(Schema):
+    afectados: int
+    dry_run: bool
+    vista_previa: List[AjustePrecioPreviewSchema] = []
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from base_app.eventos import hay_oyentes, publicar
+from base_app.shards import atomico
+from .models import Producto, MovimientoStock, CheckpointStock
+
+# (producto_id, delta, origen, origen_id)
+Movimiento = Tuple[int, int, str, Optional[int]]
+
+
+class StockInsuficiente(Exception):
+    """
+    Un movimiento dejaría el stock de un producto por debajo de 0 (p.ej. borrar
+    una compra cuyas unidades ya se vendieron). La API responde 409.
+    """
+
+    def __init__(self, producto_id: int, disponible: int, retirar: int):
+        self.producto_id = producto_id
+        self.disponible = disponible
+        self.retirar = retirar
+        super().__init__(
+            f"Stock insuficiente en el producto {producto_id}: hay {disponible} y se retirarían {retirar}"
+        )
+
+
+def _periodo_checkpoint() -> timedelta:
+    return timedelta(days=getattr(settings, 'STOCK_CHECKPOINT_DIAS', 1))
+
+
+def aplicar_movimientos(movimientos: Iterable[Movimiento]):
+    """
+    Aplica los deltas de stock de forma atómica (F()) y los registra en el diario.
+
+    Los deltas negativos sólo se aplican si queda stock suficiente; si no, se
+    lanza StockInsuficiente.
+
+    Antes del primer movimiento de cada periodo se guarda un checkpoint con el
+    stock previo del producto, de modo que reconstruir el inventario a cualquier
+    fecha nunca tiene que sumar más de un periodo de movimientos.
+    """
+    movimientos = [m for m in movimientos if m[1]]
+    if not movimientos:
+        return
+
+    deltas = {}
+    for producto_id, delta, _origen, _origen_id in movimientos:
+        deltas[producto_id] = deltas.get(producto_id, 0) + delta
+
+    with atomico():
+        ahora = timezone.now()
+        for producto_id, delta in deltas.items():
+            qs = Producto.objects.filter(pk=producto_id)
+            if delta < 0:
+                # comprobar y descontar en la misma sentencia, bajo el bloqueo de
+                # escritura: no hay ventana entre leer el stock y escribirlo
+                qs = qs.filter(stock__gte=-delta)
+            if not qs.update(stock=F('stock') + delta, ultima_actualicacion=ahora) and delta < 0:
+                disponible = Producto.objects.filter(pk=producto_id).values_list('stock', flat=True).first()
+                if disponible is not None:
+                    # la transacción se deshace entera: ningún delta del lote queda aplicado
+                    raise StockInsuficiente(producto_id, disponible, -delta)
+        registrar_movimientos(movimientos)
+
+
+def registrar_movimientos(movimientos: List[Movimiento]):
+    """
+    Escribe en el diario movimientos cuyo delta ya se aplicó a `Producto.stock`,
+    creando el checkpoint del periodo para los productos que aún no lo tienen.
+    Debe llamarse dentro de la misma transacción que actualizó el stock.
+    """
+    ahora = timezone.now()
+    deltas = {}
+    for producto_id, delta, _origen, _origen_id in movimientos:
+        deltas[producto_id] = deltas.get(producto_id, 0) + delta
+
+    # productos sin checkpoint dentro del periodo actual
+    con_checkpoint = set(
+        CheckpointStock.objects.filter(producto_id__in=deltas.keys(), fecha__gte=ahora - _periodo_checkpoint())
+        .values_list('producto_id', flat=True)
+    )
+    pendientes = [pid for pid in deltas if pid not in con_checkpoint]
+    if pendientes:
+        stocks = dict(Producto.objects.filter(pk__in=pendientes).values_list('pk', 'stock'))
+        CheckpointStock.objects.bulk_create([
+            # stock previo al movimiento: el actual menos el delta recién aplicado
+            CheckpointStock(producto_id=pid, stock=stocks[pid] - deltas[pid], fecha=ahora)
+            for pid in pendientes if pid in stocks
+        ])
+
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=producto_id, delta=delta, origen=origen, origen_id=origen_id, fecha=ahora)
+        for producto_id, delta, origen, origen_id in movimientos
+    ])
+
+    if hay_oyentes():
+        _publicar_stock(deltas)
+
+
+def _publicar_stock(deltas: dict):
+    por_tienda = {}
+    for pid, tienda_id, stock in Producto.objects.filter(pk__in=deltas.keys()).values_list('pk', 'tienda_id', 'stock'):
+        por_tienda.setdefault(tienda_id, []).append({'id': pid, 'stock': stock})
+    for tienda_id, productos in por_tienda.items():
+        publicar(tienda_id, 'stock', {'productos': productos})
+        publicar(tienda_id, 'resumen', {'total_stock': sum(deltas[p['id']] for p in productos)})
+
+
+def aplicar_movimiento(producto_id: int, delta: int, origen: str, origen_id: Optional[int] = None):
+    """
+    Atajo de `aplicar_movimientos` para un único producto.
+    """
+    aplicar_movimientos([(producto_id, delta, origen, origen_id)])
+
+
+def registrar_checkpoint(producto: Producto):
+    """
+    Guarda el stock actual del producto como checkpoint (p.ej. al crearlo).
+    """
+    CheckpointStock.objects.create(producto=producto, stock=producto.stock)
+
+
+def inventario_a_fecha(tienda_id: int, fecha: datetime):
+    """
+    Devuelve los productos de la tienda anotados con `stock_a_fecha`.
+
+    Para cada producto se toma el último checkpoint <= fecha y se suman sólo los
+    movimientos entre ese checkpoint y la fecha pedida, por lo que el coste no
+    depende de la longitud total del historial.
+    """
+    checkpoints = CheckpointStock.objects.filter(producto_id=OuterRef('pk'))
+    anterior = checkpoints.filter(fecha__lte=fecha).order_by('-fecha', '-pk')
+    # si no hay checkpoint anterior, no hubo movimientos registrados hasta `fecha`:
+    # el stock era el previo al primer checkpoint posterior (o el actual si no hay)
+    posterior = checkpoints.filter(fecha__gt=fecha).order_by('fecha', 'pk')
+
+    deltas = (
+        MovimientoStock.objects.filter(
+            producto_id=OuterRef('pk'),
+            fecha__gte=OuterRef('cp_fecha'),
+            fecha__lte=fecha,
+        )
+        .values('producto_id')
+        .annotate(total=Sum('delta'))
+        .values('total')
+    )
+
+    return (
+        Producto.objects.filter(tienda_id=tienda_id, fecha_creacion__lte=fecha)
+        .annotate(
+            cp_fecha=Subquery(anterior.values('fecha')[:1]),
+            cp_stock=Subquery(anterior.values('stock')[:1]),
+            cp_posterior=Subquery(posterior.values('stock')[:1]),
+        )
+        .annotate(
+            stock_a_fecha=Coalesce(
+                F('cp_stock') + Coalesce(Subquery(deltas, output_field=IntegerField()), Value(0)),
+                F('cp_posterior'),
+                F('stock'),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by('nombre')
+    )
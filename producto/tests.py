@@ -1,3 +1,357 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.utils import timezone
+
+from base_app.checks import cache_compartida
+from base_app.testing import ApiTestCase, ApiTransactionTestCase, Presupuesto, PresupuestoConsultasTestCase
+from compra.models import Compra
+from tienda.models import Tienda
+from venta.models import Venta
+
+from .models import CheckpointStock, MovimientoStock, Producto
+from .reconciliacion import calcular_desfases, corregir_desfases
+from .stock import StockInsuficiente, aplicar_movimiento, aplicar_movimientos, inventario_a_fecha, registrar_checkpoint
+
+
+class PresupuestosProductoTest(PresupuestoConsultasTestCase):
+    presupuestos = [
+        Presupuesto('GET', '/api/producto/list/{tienda}/', 2),
+        Presupuesto('GET', '/api/producto/buscar/?q=Producto&tienda_id={tienda}', 2),
+        Presupuesto('GET', '/api/producto/detalle/{producto}/', 1),
+        Presupuesto('GET', '/api/producto/bajo-stock/?tienda_id={tienda}', 2),
+        Presupuesto('GET', '/api/producto/pronostico/{tienda}/', 3),
+        Presupuesto('GET', '/api/producto/inventario/{tienda}/?fecha={desde}', 1),
+        Presupuesto('POST', '/api/producto/precios/{tienda}/', 1, datos={'modo': 'porcentaje', 'valor': '10'}),
+        Presupuesto('DELETE', '/api/producto/delete/{producto}/', 8, estado=202),
+    ]
+
+
+class DiarioStockTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=10, precio=Decimal('2.00'))
+        registrar_checkpoint(self.producto)
+
+    def test_movimientos_se_registran_en_el_diario(self):
+        aplicar_movimientos([(self.producto.pk, 5, 'compra', 1), (self.producto.pk, -3, 'venta', 2)])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 12)
+        self.assertEqual(
+            list(MovimientoStock.objects.filter(producto=self.producto).order_by('pk').values_list('delta', 'origen', 'origen_id')),
+            [(5, 'compra', 1), (-3, 'venta', 2)],
+        )
+        # el checkpoint del periodo ya existía: no se crea otro
+        self.assertEqual(CheckpointStock.objects.filter(producto=self.producto).count(), 1)
+
+    def test_stock_insuficiente_no_aplica_nada(self):
+        with self.assertRaises(StockInsuficiente):
+            aplicar_movimiento(self.producto.pk, -11, 'ajuste')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 10)
+        self.assertFalse(MovimientoStock.objects.filter(producto=self.producto).exists())
+
+    def test_inventario_a_fecha(self):
+        ahora = timezone.now()
+        aplicar_movimiento(self.producto.pk, 5, 'compra')
+        aplicar_movimiento(self.producto.pk, -2, 'venta')
+        # repartir el historial: alta hace 3 días, compra hace 2, venta hace 1
+        Producto.objects.filter(pk=self.producto.pk).update(fecha_creacion=ahora - timedelta(days=3))
+        CheckpointStock.objects.filter(producto=self.producto).update(fecha=ahora - timedelta(days=3))
+        MovimientoStock.objects.filter(producto=self.producto, origen='compra').update(fecha=ahora - timedelta(days=2))
+        MovimientoStock.objects.filter(producto=self.producto, origen='venta').update(fecha=ahora - timedelta(days=1))
+
+        def stock_a(dias):
+            return {p.pk: p.stock_a_fecha for p in inventario_a_fecha(self.tienda.pk, ahora - timedelta(days=dias))}
+
+        self.assertEqual(stock_a(4), {})
+        self.assertEqual(stock_a(2.5), {self.producto.pk: 10})
+        self.assertEqual(stock_a(1.5), {self.producto.pk: 15})
+        self.assertEqual(stock_a(0), {self.producto.pk: 13})
+
+        respuesta = self.api('GET', f'/api/producto/inventario/{self.tienda.pk}/', {'fecha': (ahora - timedelta(days=1.5)).isoformat()})
+        self.assertEqual(respuesta.json(), [{'id': self.producto.pk, 'nombre': "Café", 'stock': 15}])
+
+
+class ReconciliacionTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        respuesta = self.client.post('/api/producto/create/', {
+            'producto_in': json.dumps({'nombre': "Café", 'detalles': None, 'precio': '2', 'tienda_id': self.tienda.pk, 'stock': 10}),
+        })
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.producto_id = respuesta.json()['id']
+
+    def test_stock_inicial_sin_desfase(self):
+        self.assertEqual(calcular_desfases(tienda_id=self.tienda.pk), [])
+
+    def test_compras_ventas_y_ajustes_sin_desfase(self):
+        self.api('POST', '/api/compra/create/', {'producto_id': self.producto_id, 'cantidad': 5, 'total_precio': '5'})
+        self.api('POST', '/api/venta/create/', {'producto_id': self.producto_id, 'cantidad': 3})
+        aplicar_movimiento(self.producto_id, -2, 'ajuste')
+        self.assertEqual(Producto.objects.get(pk=self.producto_id).stock, 10)
+        self.assertEqual(calcular_desfases(tienda_id=self.tienda.pk), [])
+
+    def test_corregir_desfase(self):
+        Producto.objects.filter(pk=self.producto_id).update(stock=4)
+        desfases = calcular_desfases(tienda_id=self.tienda.pk)
+        self.assertEqual([(d.producto_id, d.stock, d.esperado) for d in desfases], [(self.producto_id, 4, 10)])
+        corregir_desfases(desfases)
+        self.assertEqual(Producto.objects.get(pk=self.producto_id).stock, 10)
+        self.assertEqual(calcular_desfases(tienda_id=self.tienda.pk), [])
+
+
+class CheckpointsInicialesTest(ApiTransactionTestCase):
+    """
+    Un producto anterior al diario de stock, con compras y ventas de entonces,
+    no debe aparecer desfasado: 0013_checkpoints_iniciales le da el checkpoint
+    de alta que le faltaba.
+    """
+    ANTES = [('producto', '0012_precio_centavos')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrar, self.executor.loader.graph.leaf_nodes())
+        self.migrar(self.ANTES)
+        diario = MigrationRecorder.Migration.objects.filter(app='producto', name='0004_movimientostock_checkpointstock')
+        self.addCleanup(diario.update, applied=diario.get().applied)
+        diario.update(applied=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+
+        # antes del diario: alta en 2023, 5 compradas y 2 vendidas
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=3)
+        compra = Compra.objects.create(producto=self.producto, cantidad=5, total_precio=Decimal('5'))
+        venta = Venta.objects.create(producto=self.producto, cantidad=2, total_precio=Decimal('4'))
+        for modelo, pk, dia in ((Producto, self.producto.pk, 1), (Compra, compra.pk, 2), (Venta, venta.pk, 3)):
+            modelo.objects.filter(pk=pk).update(fecha_creacion=datetime(2023, 6, dia, tzinfo=dt_timezone.utc))
+        # ya con el diario: el primer movimiento guarda el stock previo (3)
+        self.api('POST', '/api/compra/create/', {'producto_id': self.producto.pk, 'cantidad': 4, 'total_precio': '4'})
+
+    def migrar(self, destino):
+        self.executor.loader.build_graph()
+        self.executor.migrate(destino)
+
+    def test_sin_desfase_tras_la_migracion(self):
+        # sin checkpoint de alta, las compras y ventas de 2023 se contaban dos veces
+        self.assertEqual([d.esperado for d in calcular_desfases(tienda_id=self.tienda.pk)], [10])
+        self.migrar([('producto', '0013_checkpoints_iniciales')])
+        self.assertEqual(CheckpointStock.objects.filter(producto=self.producto).earliest('fecha').stock, 0)
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).stock, 7)
+        self.assertEqual(calcular_desfases(tienda_id=self.tienda.pk), [])
+
+
+class NombreProductoTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=0, precio=Decimal('2.00'))
+
+    def crear(self, nombre):
+        return self.client.post('/api/producto/create/', {
+            'producto_in': json.dumps({'nombre': nombre, 'detalles': None, 'precio': '2', 'tienda_id': self.tienda.pk}),
+        })
+
+    def test_nombre_pendiente_de_borrado_es_conflicto(self):
+        self.assertEqual(self.api('DELETE', f'/api/producto/delete/{self.producto.pk}/').status_code, 202)
+        respuesta = self.crear("Café")
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertIn('pendiente de borrado', respuesta.json()['detail'])
+
+    def test_nombre_repetido_es_conflicto(self):
+        self.assertEqual(self.crear("Café").status_code, 409)
+        self.assertEqual(self.crear("Té").status_code, 200)
+
+
+class AjustePreciosTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.con_precio = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=0, precio=Decimal('2.00'))
+        self.sin_precio = Producto.objects.create(tienda=self.tienda, nombre="Té", stock=0, precio=None)
+
+    def ajustar(self, **datos):
+        respuesta = self.api('POST', f'/api/producto/precios/{self.tienda.pk}/', datos)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.json()
+
+    def test_porcentaje_redondea_al_centimo(self):
+        self.assertEqual(self.ajustar(modo='porcentaje', valor='-12.5')['afectados'], 1)
+        self.con_precio.refresh_from_db()
+        self.assertEqual(self.con_precio.precio, Decimal('1.75'))
+
+    def test_productos_sin_precio_no_se_tocan(self):
+        vista = self.ajustar(modo='absoluto', valor='1', dry_run=True)
+        self.assertEqual([p['id'] for p in vista['vista_previa']], [self.con_precio.pk])
+        self.ajustar(modo='absoluto', valor='1')
+        self.sin_precio.refresh_from_db()
+        self.assertIsNone(self.sin_precio.precio)
+
+    def test_ajuste_incrementa_la_version(self):
+        self.ajustar(modo='absoluto', valor='1')
+        self.con_precio.refresh_from_db()
+        self.assertEqual((self.con_precio.precio, self.con_precio.version), (Decimal('3.00'), 1))
+
+
+class VersionProductoTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=0, precio=Decimal('2.00'))
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+
+    def editar(self, datos, imagen=None):
+        partes = {'producto_in': json.dumps({'tienda_id': self.tienda.pk, 'nombre': "Café", 'detalles': None, **datos})}
+        if imagen:
+            partes['imagen'] = imagen
+        return self.client.patch(
+            f'/api/producto/update/{self.producto.pk}/', encode_multipart(BOUNDARY, partes), content_type=MULTIPART_CONTENT,
+        )
+
+    def test_precio_al_centimo_en_la_respuesta(self):
+        respuesta = self.editar({'precio': '3'})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual((respuesta.json()['precio'], respuesta.json()['version']), ('3.00', 1))
+
+    def test_conflicto_no_deja_imagen_huerfana(self):
+        self.editar({'precio': '3'})
+        respuesta = self.editar({'precio': '4', 'version': 0}, imagen=SimpleUploadedFile('cafe.png', b'png'))
+        self.assertEqual(respuesta.status_code, 409)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.precio, self.producto.imagen.name), (Decimal('3.00'), ''))
+        self.assertEqual([f for _d, _s, ficheros in os.walk(self.media.name) for f in ficheros], [])
+
+    def test_importacion_incrementa_la_version(self):
+        archivo = SimpleUploadedFile('productos.csv', "nombre,precio\nCafé,5\nTé,1\n".encode())
+        respuesta = self.client.post(f'/api/producto/import/{self.tienda.pk}/', {'archivo': archivo})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.assertEqual(
+            dict(Producto.objects.filter(tienda=self.tienda).values_list('nombre', 'version')),
+            {"Café": 1, "Té": 0},
+        )
+        self.assertEqual(self.editar({'precio': '6', 'version': 0}).status_code, 409)
+
+
+class PronosticoCacheTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=50, precio=Decimal('2.00'))
+        cache.clear()
+
+    def demanda(self):
+        return self.api('GET', f'/api/producto/pronostico/{self.tienda.pk}/').json()['items'][0]['demanda_diaria']
+
+    def test_venta_invalida_la_demanda_cacheada(self):
+        self.assertEqual(self.demanda(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 10})
+        self.assertGreater(self.demanda(), 0)
+
+    def test_aviso_sin_cache_compartida(self):
+        self.assertEqual([a.id for a in cache_compartida(None)], ['base_app.W001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEqual(cache_compartida(None), [])
+
+
+class ImportacionTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.cafe = Producto.objects.create(tienda=self.tienda, nombre="Café", detalles="Tostado", stock=10, precio=Decimal('2.00'))
+
+    def importar(self, contenido, nombre='productos.csv'):
+        archivo = SimpleUploadedFile(nombre, contenido.encode())
+        respuesta = self.client.post(f'/api/producto/import/{self.tienda.pk}/', {'archivo': archivo})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.json()
+
+    def test_upsert_por_nombre(self):
+        resultado = self.importar("nombre,stock\nCafé,7\nTé,3\n")
+        self.assertEqual((resultado['creados'], resultado['actualizados'], resultado['fallidos']), (1, 1, 0))
+        self.cafe.refresh_from_db()
+        # las columnas ausentes del archivo conservan su valor
+        self.assertEqual((self.cafe.stock, self.cafe.precio, self.cafe.detalles), (7, Decimal('2.00'), "Tostado"))
+        self.assertEqual(list(MovimientoStock.objects.filter(producto=self.cafe).values_list('delta', 'origen')), [(-3, 'ajuste')])
+        te = Producto.objects.get(tienda=self.tienda, nombre="Té")
+        self.assertEqual(list(CheckpointStock.objects.filter(producto=te).values_list('stock', flat=True)), [3])
+
+    def test_filas_invalidas_y_duplicadas(self):
+        resultado = self.importar(json.dumps([
+            {'nombre': "Té", 'precio': "1"},
+            {'nombre': "", 'precio': "1"},
+            {'nombre': "Mate", 'stock': -1},
+            {'nombre': "Té", 'precio': "1.5"},
+        ]), nombre='productos.json')
+        self.assertEqual((resultado['creados'], resultado['fallidos']), (1, 2))
+        self.assertEqual([e['fila'] for e in resultado['errores']], [2, 3, 1])
+        self.assertEqual(Producto.objects.get(tienda=self.tienda, nombre="Té").precio, Decimal('1.50'))
+
+
+class BusquedaTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        otra = Tienda.objects.create(nombre="Otra")
+        self.molido = Producto.objects.create(tienda=self.tienda, nombre="Bolsa", detalles="Café molido", stock=0)
+        self.cafe = Producto.objects.create(tienda=self.tienda, nombre="Café en grano", stock=0)
+        Producto.objects.create(tienda=otra, nombre="Café soluble", stock=0)
+
+    def buscar(self, q, **datos):
+        respuesta = self.api('GET', '/api/producto/buscar/', {'q': q, **datos})
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return [p['id'] for p in respuesta.json()]
+
+    def test_prefijo_por_tienda_y_relevancia(self):
+        # el nombre pesa más que los detalles
+        self.assertEqual(self.buscar("caf", tienda_id=self.tienda.pk), [self.cafe.pk, self.molido.pk])
+        self.assertEqual(len(self.buscar("caf")), 3)
+
+    def test_indice_sigue_a_las_ediciones(self):
+        Producto.objects.filter(pk=self.cafe.pk).update(nombre="Té verde")
+        self.assertEqual(self.buscar("verde"), [self.cafe.pk])
+        self.assertEqual(self.buscar("grano"), [])
+
+    def test_eliminados_no_ocupan_el_limite(self):
+        Producto.objects.filter(pk=self.cafe.pk).update(eliminado=True)
+        # el eliminado es el más relevante: con limite=1 debe quedar el siguiente
+        self.assertEqual(self.buscar("caf", tienda_id=self.tienda.pk, limite=1), [self.molido.pk])
+
+    def test_operadores_del_usuario_son_texto(self):
+        # OR y NOT se buscan como términos (que no aparecen), no como operadores
+        self.assertEqual(self.buscar('"café" OR NOT -', tienda_id=self.tienda.pk), [])
+        self.assertEqual(self.buscar('***'), [])
+
+
+class BajoStockTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.cafe = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=6, stock_minimo=5, precio=Decimal('2.00'))
+        self.te = Producto.objects.create(tienda=self.tienda, nombre="Té", stock=1, stock_minimo=4, precio=Decimal('1.00'))
+        # sin umbral nunca se avisa
+        Producto.objects.create(tienda=self.tienda, nombre="Mate", stock=0, precio=Decimal('1.00'))
+
+    def bajo_stock(self):
+        respuesta = self.api('GET', '/api/producto/bajo-stock/', {'tienda_id': self.tienda.pk})
+        return [(p['nombre'], p['faltante']) for p in respuesta.json()['items']]
+
+    def test_se_mantiene_con_ventas_y_compras(self):
+        self.assertEqual(self.bajo_stock(), [("Té", 3)])
+        self.api('POST', '/api/venta/create/', {'producto_id': self.cafe.pk, 'cantidad': 5})
+        self.assertEqual(self.bajo_stock(), [("Café", 4), ("Té", 3)])
+        self.api('POST', '/api/compra/create/', {'producto_id': self.te.pk, 'cantidad': 3, 'total_precio': '3'})
+        self.assertEqual(self.bajo_stock(), [("Café", 4)])
@@ -1,20 +1,22 @@
 from ninja import Router, File, UploadedFile
 from tienda.models import Tienda
-from tienda.schemas import TiendaSchema, TiendaInSchema
+from tienda.schemas import TiendaSchema, TiendaInSchema, SyncSchema, TareaBorradoSchema
 from typing import List, Optional
 from ninja.pagination import paginate
 from django.shortcuts import get_object_or_404
-from django.db.models.functions import TruncDate
 from compra.models import Compra
-from compra.schemas import CompraSchema, SimpleCompraSchema
 from venta.models import Venta
-from venta.schemas import VentaSchema, SimpleVentaSchema
 from typing import Dict, Any
 from datetime import datetime, date
 from django.utils import timezone
 from producto.models import Producto
-from producto.schemas import ProductoSchema, SimpleProductoSchema
+from producto.schemas import SimpleProductoSchema
 from django.db.models import Sum
+from base_app.models import Eliminacion, TareaBorrado
+from base_app.borrado import borrar_tienda
+from base_app.analitica import lectura_analitica
+from base_app.shards import activo, elegir_shard, por_tienda, replicar_tienda
+from base_app.sincronizacion import cambios_desde, nueva_marca
 
 router = Router(tags=["Tienda"])
 
@@ -39,10 +41,12 @@ def create_tienda(request, tienda_in: TiendaInSchema, imagen: UploadedFile = Fil
     """
     Create a new tienda.
     """
-    tienda = Tienda.objects.create(**tienda_in.dict())
+    # con sharding, la tienda se asigna al shard con menos tiendas
+    tienda = Tienda.objects.create(**tienda_in.dict(), shard=elegir_shard() if activo() else '')
     if imagen:
         # guardar archivo en el ImageField (usar .name y pasar el UploadedFile)
         tienda.imagen.save(imagen.name, imagen, save=True)
+    replicar_tienda(tienda)
     return tienda
 
 @router.patch("/{tienda_id}/", response=TiendaSchema)
@@ -56,19 +60,30 @@ def update_tienda(request, tienda_id: int, tienda_in: TiendaInSchema, imagen: Up
     if imagen:
         tienda.imagen.save(imagen.name, imagen, save=False)
     tienda.save()
+    replicar_tienda(tienda)
     return tienda
 
-@router.delete("/{tienda_id}/", response={204: None})
+@router.delete("/{tienda_id}/", response={202: TareaBorradoSchema})
 def delete_tienda(request, tienda_id: int):
     """
-    Delete a tienda by its ID.
+    Delete a tienda by its ID. Queda oculta al instante; sus productos, ventas
+    y compras se borran en segundo plano (progreso en /borrado/{tarea_id}/).
     """
     tienda = get_object_or_404(Tienda, id=tienda_id)
-    tienda.delete()
-    return 204
+    return 202, borrar_tienda(tienda)
+
+
+@router.get("/borrado/{tarea_id}/", response=TareaBorradoSchema)
+def estado_borrado(request, tarea_id: int):
+    """
+    Estado y progreso de un borrado en segundo plano (de tienda o de producto).
+    """
+    return get_object_or_404(TareaBorrado, id=tarea_id)
 
 
 @router.get("/{tienda_id}/recent-activity/", tags=["Tienda"])
+@por_tienda
+@lectura_analitica
 def tienda_recent_activity(request, tienda_id: int, limit_ops: int = 10, ref_date: Optional[str] = None) -> Dict[str, Any]:
     """
     Devuelve las últimas `days` fechas (por defecto 4) con actividad de compras y ventas
@@ -103,7 +118,7 @@ def tienda_recent_activity(request, tienda_id: int, limit_ops: int = 10, ref_dat
 
     # obtener las últimas `limit_ops` operaciones de compras hasta ref_dt
     compras_ops = list(
-        Compra.objects.filter(producto__tienda_id=tienda_id, fecha_creacion__date__lte=ref_dt)
+        Compra.visibles.filter(producto__tienda_id=tienda_id, fecha_creacion__date__lte=ref_dt)
         .select_related('producto')
         .order_by('-fecha_creacion')[:limit_ops]
     )
@@ -124,7 +139,7 @@ def tienda_recent_activity(request, tienda_id: int, limit_ops: int = 10, ref_dat
     compras_result = []
     for d in compra_dates:
         # agregamos cantidad total por producto en esa fecha
-        aggs = Compra.objects.filter(producto__tienda_id=tienda_id, fecha_creacion__date=d).values('producto_id').annotate(cantidad_sum=Sum('cantidad'))
+        aggs = Compra.visibles.filter(producto__tienda_id=tienda_id, fecha_creacion__date=d).values('producto_id').annotate(cantidad_sum=Sum('cantidad'))
         agg_map = {a['producto_id']: a['cantidad_sum'] for a in aggs}
 
         items = []
@@ -136,7 +151,7 @@ def tienda_recent_activity(request, tienda_id: int, limit_ops: int = 10, ref_dat
 
     # ventas: mismas reglas (últimas limit_ops operaciones hasta ref_dt)
     ventas_ops = list(
-        Venta.objects.filter(producto__tienda_id=tienda_id, fecha_creacion__date__lte=ref_dt)
+        Venta.visibles.filter(producto__tienda_id=tienda_id, fecha_creacion__date__lte=ref_dt)
         .select_related('producto')
         .order_by('-fecha_creacion')[:limit_ops]
     )
@@ -150,7 +165,7 @@ def tienda_recent_activity(request, tienda_id: int, limit_ops: int = 10, ref_dat
 
     ventas_result = []
     for d in venta_dates:
-        aggs = Venta.objects.filter(producto__tienda_id=tienda_id, fecha_creacion__date=d).values('producto_id').annotate(cantidad_sum=Sum('cantidad'))
+        aggs = Venta.visibles.filter(producto__tienda_id=tienda_id, fecha_creacion__date=d).values('producto_id').annotate(cantidad_sum=Sum('cantidad'))
         agg_map = {a['producto_id']: a['cantidad_sum'] for a in aggs}
 
         items = []
@@ -181,3 +196,47 @@ def tienda_recent_activity(request, tienda_id: int, limit_ops: int = 10, ref_dat
         inventory.append({'id': p.pk, 'nombre': p.nombre, 'stock': p.stock})
 
     return {'activity': activity, 'inventory': inventory}
+
+
+@router.get("/{tienda_id}/sync/", response=SyncSchema)
+@por_tienda
+def tienda_sync(request, tienda_id: int, desde: Optional[datetime] = None, desde_id: int = 0, limite: int = 500):
+    """
+    Feed incremental para clientes offline: productos, ventas y compras creados o
+    modificados después de la marca (`desde`, `desde_id`) y los borrados registrados.
+    Sin `desde` devuelve todo desde el principio. Repetir con la `watermark` devuelta
+    hasta que `completo` sea true.
+    """
+    get_object_or_404(Tienda, id=tienda_id)
+    limite = max(1, min(limite, 5000))
+    marca = None
+    if desde is not None:
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde, timezone.get_default_timezone())
+        marca = (desde, desde_id)
+    corte = timezone.now()
+
+    productos = cambios_desde(Producto.objects.filter(tienda_id=tienda_id), 'ultima_actualicacion', marca, corte, limite)
+    ventas = cambios_desde(
+        Venta.visibles.filter(producto__tienda_id=tienda_id).select_related('producto'),
+        'ultima_actualicacion', marca, corte, limite,
+    )
+    compras = cambios_desde(
+        Compra.visibles.filter(producto__tienda_id=tienda_id).select_related('producto'),
+        'ultima_actualicacion', marca, corte, limite,
+    )
+    eliminados = cambios_desde(Eliminacion.objects.filter(tienda_id=tienda_id), 'fecha', marca, corte, limite)
+
+    watermark, completo = nueva_marca(
+        [productos + ('ultima_actualicacion',), ventas + ('ultima_actualicacion',),
+         compras + ('ultima_actualicacion',), eliminados + ('fecha',)],
+        marca,
+    )
+    return {
+        'productos': productos[0],
+        'ventas': ventas[0],
+        'compras': compras[0],
+        'eliminados': [{'modelo': e.modelo, 'id': e.objeto_id, 'fecha': e.fecha} for e in eliminados[0]],
+        'watermark': {'fecha': watermark[0], 'id': watermark[1]} if watermark else None,
+        'completo': completo,
+    }
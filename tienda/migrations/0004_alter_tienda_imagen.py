@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0003_rename_created_at_tienda_fecha_creacion_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tienda',
+            name='imagen',
+            field=models.ImageField(blank=True, null=True, upload_to='tienda/imagenes/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0004_alter_tienda_imagen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tienda',
+            name='zona_horaria',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0005_zona_horaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tienda',
+            name='shard',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+    ]
@@ -1,5 +1,8 @@
+from zoneinfo import ZoneInfo
+
 from django.db import models
-from base_app.models import BaseModel
+from django.utils import timezone
+from base_app.models import BaseModel, VisiblesManager
 
 # Create your models here.
 class Tienda(BaseModel):
@@ -8,9 +11,20 @@ class Tienda(BaseModel):
     direccion = models.CharField(max_length=255,null=True, blank=True)
     telefono = models.CharField(max_length=20,null=True, blank=True)
     descripcion = models.TextField(null=True, blank=True)
+    # zona IANA (p.ej. 'America/Havana'); vacía = TIME_ZONE del proyecto
+    zona_horaria = models.CharField(max_length=64, blank=True, default='')
+    # alias del shard con sus productos, ventas y compras (SHARDS); vacío = 'default'
+    shard = models.CharField(max_length=50, blank=True, default='', editable=False)
+    # marcada para borrado en segundo plano (base_app/borrado.py): oculta en todas partes
+    eliminado = models.BooleanField(default=False, editable=False)
+
+    objects = VisiblesManager()
 
     class Meta:
         db_table = 'tiendas'
     
     def __str__(self):
         return self.nombre
+
+    def zona(self):
+        return ZoneInfo(self.zona_horaria) if self.zona_horaria else timezone.get_default_timezone()
@@ -1,6 +1,13 @@
 from ninja import Schema,ModelSchema
+from pydantic import field_serializer, field_validator
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from tienda.models import Tienda
-from typing import Optional
+from base_app.models import TareaBorrado
+from typing import List, Optional
+from datetime import datetime
+from producto.schemas import ProductoSchema
+from venta.schemas import VentaSchema
+from compra.schemas import CompraSchema
 
 class TiendaSchema(ModelSchema):
     class Meta:
@@ -12,5 +19,53 @@ class TiendaInSchema(Schema):
     direccion: Optional[str] = None
     telefono: Optional[str] = None
     descripcion: Optional[str] = None
+    zona_horaria: Optional[str] = ''
     # imagen se envía como archivo multipart/form-data en el endpoint, no como URL
-    
\ No newline at end of file
+
+    @field_validator('zona_horaria')
+    @classmethod
+    def validar_zona_horaria(cls, valor):
+        if valor:
+            try:
+                ZoneInfo(valor)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"zona horaria desconocida: {valor}")
+        return valor or ''
+
+class EliminacionSchema(Schema):
+    modelo: str
+    id: int
+    fecha: datetime
+
+class MarcaSyncSchema(Schema):
+    fecha: datetime
+    id: int
+
+    @field_serializer('fecha')
+    def serializar_fecha(self, fecha):
+        # con microsegundos: el JSON de Django los corta a milisegundos y la
+        # marca quedaría antes de la última fila, que se reenviaría siempre
+        return fecha.isoformat()
+
+class TareaBorradoSchema(ModelSchema):
+    # porcentaje de filas borradas (None hasta que el borrador la empiece)
+    progreso: Optional[float] = None
+
+    class Meta:
+        model = TareaBorrado
+        fields = '__all__'
+
+    @staticmethod
+    def resolve_progreso(obj):
+        if not obj.filas_totales:
+            return 100.0 if obj.estado == 'completada' else None
+        return round(min(obj.filas_borradas / obj.filas_totales, 1) * 100, 1)
+
+class SyncSchema(Schema):
+    productos: List[ProductoSchema]
+    ventas: List[VentaSchema]
+    compras: List[CompraSchema]
+    eliminados: List[EliminacionSchema]
+    # enviar como desde/desde_id en la próxima llamada
+    watermark: Optional[MarcaSyncSchema]
+    completo: bool
@@ -1,3 +1,102 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.utils import timezone
+
+from base_app.borrado import RECLAMO_CADUCA, procesar_pendientes, reclamar
+from base_app.models import TareaBorrado
+from base_app.testing import ApiTestCase, Presupuesto, PresupuestoConsultasTestCase
+from compra.models import Compra
+from producto.models import MovimientoStock, Producto
+from venta.models import Venta
+
+from .models import Tienda
+
+
+class PresupuestosTiendaTest(PresupuestoConsultasTestCase):
+    presupuestos = [
+        Presupuesto('GET', '/api/tienda/', 2),
+        Presupuesto('GET', '/api/tienda/{tienda}/', 1),
+        Presupuesto('GET', '/api/tienda/{tienda}/recent-activity/', 6),
+        Presupuesto('GET', '/api/tienda/{tienda}/sync/', 5),
+        Presupuesto('DELETE', '/api/tienda/{tienda}/', 9, estado=202),
+    ]
+
+
+class SyncTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.productos = [
+            Producto.objects.create(tienda=self.tienda, nombre=f"Producto {i}", stock=5, precio=Decimal('2.00'))
+            for i in range(3)
+        ]
+        Producto.objects.create(tienda=Tienda.objects.create(nombre="Otra"), nombre="Ajeno", stock=5)
+
+    def sync(self, marca=None, **datos):
+        if marca:
+            datos.update(desde=marca['fecha'], desde_id=marca['id'])
+        respuesta = self.api('GET', f'/api/tienda/{self.tienda.pk}/sync/', datos)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.json()
+
+    def test_paginacion_por_marca(self):
+        primera = self.sync(limite=2)
+        self.assertFalse(primera['completo'])
+        segunda = self.sync(primera['watermark'], limite=2)
+        self.assertTrue(segunda['completo'])
+        recibidos = [p['id'] for p in primera['productos'] + segunda['productos']]
+        self.assertEqual(recibidos, [p.pk for p in self.productos])
+
+    def test_cambios_y_borrados_despues_de_la_marca(self):
+        marca = self.sync()['watermark']
+        self.assertEqual(self.sync(marca)['productos'], [])
+        venta = self.api('POST', '/api/venta/create/', {'producto_id': self.productos[1].pk, 'cantidad': 2}).json()
+        cambios = self.sync(marca)
+        # el cambio de stock también llega como producto modificado
+        self.assertEqual([(p['id'], p['stock']) for p in cambios['productos']], [(self.productos[1].pk, 3)])
+        self.assertEqual([v['id'] for v in cambios['ventas']], [venta['id']])
+
+        marca = cambios['watermark']
+        self.api('DELETE', f"/api/venta/delete/{venta['id']}/")
+        cambios = self.sync(marca)
+        self.assertEqual([(e['modelo'], e['id']) for e in cambios['eliminados']], [('venta', venta['id'])])
+        self.assertEqual(cambios['ventas'], [])
+
+
+class BorradoTiendaTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        for i in range(3):
+            producto = Producto.objects.create(tienda=self.tienda, nombre=f"Producto {i}", stock=0, precio=Decimal('2.00'))
+            self.api('POST', '/api/compra/create/', {'producto_id': producto.pk, 'cantidad': 5, 'total_precio': '5'})
+            self.api('POST', '/api/venta/create/', {'producto_id': producto.pk, 'cantidad': 1})
+        self.otra = Producto.objects.create(tienda=Tienda.objects.create(nombre="Otra"), nombre="Ajeno", stock=0)
+
+    def test_oculta_al_instante_y_borra_por_lotes(self):
+        respuesta = self.api('DELETE', f'/api/tienda/{self.tienda.pk}/')
+        self.assertEqual(respuesta.status_code, 202)
+        tarea = respuesta.json()['id']
+        self.assertEqual(self.api('GET', f'/api/tienda/{self.tienda.pk}/').status_code, 404)
+        self.assertEqual(Venta.objects.filter(producto__tienda=self.tienda).count(), 3)
+
+        self.assertEqual(procesar_pendientes(lote=2), 1)
+        for modelo in (Venta, Compra, MovimientoStock):
+            self.assertFalse(modelo.objects.filter(producto__tienda_id=self.tienda.pk).exists())
+        self.assertFalse(Producto._base_manager.filter(tienda_id=self.tienda.pk).exists())
+        self.assertFalse(Tienda._base_manager.filter(pk=self.tienda.pk).exists())
+        self.assertTrue(Producto.objects.filter(pk=self.otra.pk).exists())
+        estado = self.api('GET', f'/api/tienda/borrado/{tarea}/').json()
+        self.assertEqual((estado['estado'], estado['progreso']), ('completada', 100.0))
+
+    def test_cada_tarea_la_procesa_un_solo_borrador(self):
+        tarea = self.api('DELETE', f'/api/tienda/{self.tienda.pk}/').json()['id']
+        # otro borrador la reclama primero: esta pasada no la toca
+        self.assertTrue(reclamar(TareaBorrado.objects.get(pk=tarea)))
+        self.assertEqual(procesar_pendientes(), 0)
+        self.assertTrue(Producto._base_manager.filter(tienda_id=self.tienda.pk).exists())
+        # si ese borrador deja de avanzar, el reclamo caduca y se retoma
+        TareaBorrado.objects.filter(pk=tarea).update(reclamada=timezone.now() - RECLAMO_CADUCA)
+        self.assertEqual(procesar_pendientes(lote=2), 1)
+        tarea = TareaBorrado.objects.get(pk=tarea)
+        self.assertEqual((tarea.estado, tarea.filas_borradas), ('completada', tarea.filas_totales))
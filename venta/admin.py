@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Venta
+from .models import EventoVenta, Venta
 
 
 @admin.register(Venta)
@@ -9,3 +9,12 @@ class VentaAdmin(admin.ModelAdmin):
 	list_filter = ('fecha_creacion',)
 	readonly_fields = ('fecha_creacion', 'ultima_actualicacion')
 
+
+
+
+@admin.register(EventoVenta)
+class EventoVentaAdmin(admin.ModelAdmin):
+	list_display = ('id', 'producto', 'cantidad', 'total_precio', 'fecha_creacion', 'venta')
+	search_fields = ('producto__nombre',)
+	list_filter = ('fecha_creacion',)
+	raw_id_fields = ('producto', 'venta')
@@ -1,63 +1,89 @@
 from ninja import Router
 from tienda.models import Tienda
 from producto.models import Producto
-from venta.models import Venta
-from .schemas import VentaSchema, VentaInSchema
-from typing import List, Optional
+from venta.models import EventoVenta, Venta
+from venta.registro import eventos_activos, registrar_eventos, sumar_a_fila
+from .schemas import EventoVentaSchema, VentaSchema, VentaInSchema
+from typing import List, Literal, Optional
+from datetime import date
+from base_app.sincronizacion import registrar_eliminaciones
+from base_app.eventos import publicar_operacion
+from base_app.idempotencia import idempotente
+from base_app.concurrencia import guardar_cambios
+from base_app.shards import en_shard, por_objeto, por_tienda, shard_comun, shard_de_objeto
+from base_app.analitica import lectura_analitica
+from base_app.archivo import filtrar_por_fecha, querysets, unir
+from base_app.exportacion import FILAS_POR_BLOQUE, rango_fechas, respuesta_csv, respuesta_xlsx
+from ninja.errors import HttpError
 from ninja.pagination import paginate
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import F
-from decimal import Decimal, InvalidOperation
+from producto.stock import aplicar_movimiento, aplicar_movimientos
+from producto.costos import costo_de_venta
+from producto.pronostico import invalidar_pronostico
+from decimal import Decimal
 
 router = Router(tags=["Venta"])
 
 @router.get("/list/{tienda_id}/", response=List[VentaSchema])
+@por_tienda
 @paginate
 def list_ventas(request, tienda_id: int, dia: Optional[int] = None, mes: Optional[int] = None, ano: Optional[int] = None):
     """
     List all ventas for productos in a specific tienda with pagination.
     """
-    qs = Venta.objects.filter(producto__tienda_id=tienda_id)
-    if dia is not None:
-        qs = qs.filter(fecha_creacion__day=dia)
-    if mes is not None:
-        qs = qs.filter(fecha_creacion__month=mes)
-    if ano is not None:
-        qs = qs.filter(fecha_creacion__year=ano)
+    # incluye las tablas de archivo que alcance el filtro de año
+    qs = filtrar_por_fecha(Venta, dia, mes, ano, select_related=('producto',), producto__tienda_id=tienda_id)
     return qs.order_by('-fecha_creacion')
 
 
 @router.get("/get/{producto_id}/", response=List[VentaSchema])
+@por_objeto('producto.Producto', 'producto_id')
 @paginate
 def list_ventas_by_producto(request, producto_id: int, dia: Optional[int] = None, mes: Optional[int] = None, ano: Optional[int] = None):
     """
     List all ventas for a specific producto with pagination.
     """
-    qs = Venta.objects.filter(producto_id=producto_id)
-    if dia is not None:
-        qs = qs.filter(fecha_creacion__day=dia)
-    if mes is not None:
-        qs = qs.filter(fecha_creacion__month=mes)
-    if ano is not None:
-        qs = qs.filter(fecha_creacion__year=ano)
+    # incluye las tablas de archivo que alcance el filtro de año
+    qs = filtrar_por_fecha(Venta, dia, mes, ano, select_related=('producto',), producto_id=producto_id)
     return qs.order_by('-fecha_creacion')
 
 
+@router.get("/export/{tienda_id}/")
+@por_tienda
+@lectura_analitica
+def export_ventas(request, tienda_id: int, desde: date, hasta: date, formato: Literal['csv', 'xlsx'] = 'csv'):
+    """
+    Exporta en streaming las ventas de una tienda entre `desde` y `hasta` (incluidos).
+    `formato` puede ser csv (por defecto) o xlsx (requiere openpyxl).
+    """
+    inicio, fin = rango_fechas(desde, hasta)
+    filas = (
+        unir([
+            qs.filter(producto__tienda_id=tienda_id, fecha_creacion__gte=inicio, fecha_creacion__lt=fin)
+            .values_list('id', 'fecha_creacion', 'producto_id', 'producto__nombre', 'cantidad', 'total_precio')
+            for qs in querysets(Venta, inicio, fin)
+        ])
+        .order_by('fecha_creacion', 'id')
+        .iterator(chunk_size=FILAS_POR_BLOQUE)
+    )
+    cabecera = ['id', 'fecha', 'producto_id', 'producto', 'cantidad', 'total_precio']
+    nombre = f"ventas_{tienda_id}_{desde.isoformat()}_{hasta.isoformat()}"
+    if formato == 'xlsx':
+        return respuesta_xlsx(nombre, cabecera, filas)
+    return respuesta_csv(nombre, cabecera, filas)
+
+
 @router.post("/create/", response=VentaSchema)
+@en_shard(lambda kwargs: shard_de_objeto(Producto, kwargs['venta_in'].producto_id))
+@idempotente(VentaSchema)
 def create_venta(request, venta_in: VentaInSchema):
     """
     Create a new venta and update product stock (decrease).
     """
     producto = get_object_or_404(Producto, id=venta_in.producto_id)
-    if venta_in.total_precio:
-        try:
-            total = Decimal(str(venta_in.total_precio))
-        except (InvalidOperation, TypeError):
-            total = Decimal(producto.precio) * Decimal(venta_in.cantidad)
-    else:
-        total = Decimal(producto.precio) * Decimal(venta_in.cantidad)
+    total = venta_in.total_precio or producto.precio * venta_in.cantidad
     # normalizar fecha_creacion si viene en el payload, usar hoy si no
     fecha_dt = None
     if getattr(venta_in, 'fecha_creacion', None):
@@ -69,27 +95,37 @@ def create_venta(request, venta_in: VentaInSchema):
         venta_date = timezone.localdate()
         fecha_dt = None
 
-    venta = Venta.objects.filter(producto=producto, fecha_creacion__date=venta_date).first()
-    if venta:
-        venta.cantidad = venta.cantidad + venta_in.cantidad
-        venta.total_precio = venta.total_precio + total
-        venta.save()
-        delta = venta_in.cantidad
-    else:
-        venta = Venta.objects.create(
-            producto=producto,
-            cantidad=venta_in.cantidad,
-            total_precio=total,
-            **({'fecha_creacion': fecha_dt} if fecha_dt else {})
-        )
-        delta = venta_in.cantidad
-
-    # Disminuir stock usando F() para ser atómico
-    Producto.objects.filter(pk=producto.pk).update(stock=F('stock') - delta)
+    # coste de lo vendido al coste medio vigente
+    costo = costo_de_venta(producto.costo_promedio, venta_in.cantidad)
+
+    with transaction.atomic():
+        venta = Venta.objects.filter(producto=producto, fecha_creacion__date=venta_date).first()
+        if venta:
+            sumar_a_fila(venta.pk, venta_in.cantidad, total, costo)
+            venta.refresh_from_db()
+            delta = venta_in.cantidad
+            accion = 'actualizada'
+        else:
+            venta = Venta.objects.create(
+                producto=producto,
+                cantidad=venta_in.cantidad,
+                total_precio=total,
+                costo_total=costo,
+                **({'fecha_creacion': fecha_dt} if fecha_dt else {})
+            )
+            delta = venta_in.cantidad
+            accion = 'creada'
+
+        # registrar el cambio de stock en el diario (F() atómico)
+        aplicar_movimiento(producto.pk, -delta, 'venta', venta.pk)
+        publicar_operacion('venta', venta, producto.tienda_id, accion, total)
+        invalidar_pronostico([producto.tienda_id])
     return Venta.objects.get(pk=venta.pk)
 
 
 @router.post("/bulk/", response=List[VentaSchema])
+@en_shard(lambda kwargs: shard_comun(Producto, [v.producto_id for v in kwargs['ventas_in']]))
+@idempotente(VentaSchema)
 def create_ventas_bulk(request, ventas_in: List[VentaInSchema]):
     """
     Crear múltiples ventas en una sola petición y actualizar stock por cada una.
@@ -97,82 +133,202 @@ def create_ventas_bulk(request, ventas_in: List[VentaInSchema]):
     """
     created_map = {}  # key: (producto_id, fecha.date()) -> Venta
     stock_deltas = {}
+    totales = {}
+    tiendas = {}
+    acciones = {}
+    productos = Producto.objects.in_bulk({v.producto_id for v in ventas_in})
+    faltan = {v.producto_id for v in ventas_in} - productos.keys()
+    if faltan:
+        raise HttpError(404, f"Producto(s) no encontrado(s): {sorted(faltan)}")
+    # Normalizar fecha por item
+    fechas = []
+    for venta_in in ventas_in:
+        fecha_dt = None
+        if getattr(venta_in, 'fecha_creacion', None):
+            fecha_dt = venta_in.fecha_creacion
+            if timezone.is_naive(fecha_dt):
+                fecha_dt = timezone.make_aware(fecha_dt, timezone.get_default_timezone())
+            fechas.append((fecha_dt, fecha_dt.date()))
+        else:
+            fechas.append((None, timezone.localdate()))
     with transaction.atomic():
-        for venta_in in ventas_in:
-            producto = get_object_or_404(Producto, id=venta_in.producto_id)
+        # filas diarias ya existentes de todo el lote en una sola consulta
+        # (bloqueo de búsqueda para evitar races por producto+fecha)
+        existentes = {}
+        filas = Venta.objects.select_for_update().filter(
+            producto_id__in=productos.keys(), fecha_creacion__date__in={d for _f, d in fechas},
+        ).order_by('pk')
+        for fila in filas:
+            existentes.setdefault((fila.producto_id, timezone.localdate(fila.fecha_creacion)), fila)
+        for venta_in, (fecha_dt, venta_date) in zip(ventas_in, fechas):
+            producto = productos[venta_in.producto_id]
             pid = producto.pk
-            if venta_in.total_precio:
-                try:
-                    total = Decimal(str(venta_in.total_precio))
-                except (InvalidOperation, TypeError):
-                    total = Decimal(producto.precio) * Decimal(venta_in.cantidad)
-            else:
-                total = Decimal(producto.precio) * Decimal(venta_in.cantidad)
-
-            # Normalizar fecha por item
-            fecha_dt = None
-            if getattr(venta_in, 'fecha_creacion', None):
-                fecha_dt = venta_in.fecha_creacion
-                if timezone.is_naive(fecha_dt):
-                    fecha_dt = timezone.make_aware(fecha_dt, timezone.get_default_timezone())
-                venta_date = fecha_dt.date()
-            else:
-                venta_date = timezone.localdate()
+            total = venta_in.total_precio or producto.precio * venta_in.cantidad
 
+            costo = costo_de_venta(producto.costo_promedio, venta_in.cantidad)
             key = (pid, venta_date)
             if key in created_map:
-                venta = created_map[key]
-                venta.cantidad = venta.cantidad + venta_in.cantidad
-                venta.total_precio = venta.total_precio + total
-                venta.save()
+                sumar_a_fila(created_map[key].pk, venta_in.cantidad, total, costo)
             else:
-                existing = Venta.objects.select_for_update().filter(producto=producto, fecha_creacion__date=venta_date).first()
+                existing = existentes.get(key)
                 if existing:
-                    existing.cantidad = existing.cantidad + venta_in.cantidad
-                    existing.total_precio = existing.total_precio + total
-                    existing.save()
+                    sumar_a_fila(existing.pk, venta_in.cantidad, total, costo)
                     venta = existing
                 else:
                     venta = Venta.objects.create(
                         producto=producto,
                         cantidad=venta_in.cantidad,
                         total_precio=total,
+                        costo_total=costo,
                         **({'fecha_creacion': fecha_dt} if fecha_dt else {})
                     )
+                    acciones[key] = 'creada'
                 created_map[key] = venta
 
-            stock_deltas[pid] = stock_deltas.get(pid, 0) + venta_in.cantidad
+            stock_deltas[key] = stock_deltas.get(key, 0) + venta_in.cantidad
+            totales[key] = totales.get(key, 0) + total
+            tiendas[pid] = producto.tienda_id
 
-        for pid, delta in stock_deltas.items():
-            Producto.objects.filter(pk=pid).update(stock=F('stock') - delta)
+        # releer las filas tras los incrementos atómicos
+        frescas = Venta.objects.select_related('producto').in_bulk([v.pk for v in created_map.values()])
+        created_map = {key: frescas[v.pk] for key, v in created_map.items()}
+        aplicar_movimientos([
+            (pid, -delta, 'venta', created_map[(pid, venta_date)].pk)
+            for (pid, venta_date), delta in stock_deltas.items()
+        ])
+        for (pid, venta_date), venta in created_map.items():
+            key = (pid, venta_date)
+            publicar_operacion('venta', venta, tiendas[pid], acciones.get(key, 'actualizada'), totales[key])
+        invalidar_pronostico(tiendas.values())
 
     created = list(created_map.values())
     return sorted(created, key=lambda v: v.fecha_creacion, reverse=True)
 
+def _evento(venta_in: VentaInSchema, producto: Producto) -> EventoVenta:
+    total = venta_in.total_precio or producto.precio * venta_in.cantidad
+    fecha_dt = venta_in.fecha_creacion or timezone.now()
+    if timezone.is_naive(fecha_dt):
+        fecha_dt = timezone.make_aware(fecha_dt, timezone.get_default_timezone())
+    return EventoVenta(
+        producto=producto,
+        cantidad=venta_in.cantidad,
+        total_precio=total,
+        costo_total=costo_de_venta(producto.costo_promedio, venta_in.cantidad),
+        fecha_creacion=fecha_dt,
+    )
+
+
+def _exigir_eventos():
+    if not eventos_activos():
+        raise HttpError(400, "El registro de eventos de venta está desactivado (VENTAS_EVENTOS)")
+
+
+@router.post("/evento/", response=EventoVentaSchema)
+@en_shard(lambda kwargs: shard_de_objeto(Producto, kwargs['venta_in'].producto_id))
+@idempotente(EventoVentaSchema)
+def create_evento_venta(request, venta_in: VentaInSchema):
+    """
+    Registra una venta como evento append-only (un único INSERT). El stock y la
+    fila diaria de venta se actualizan al compactar (`manage.py compactar_ventas`
+    o el hilo compactador).
+    """
+    _exigir_eventos()
+    producto = get_object_or_404(Producto, id=venta_in.producto_id)
+    with transaction.atomic():
+        evento, = registrar_eventos([_evento(venta_in, producto)])
+    return evento
+
+
+@router.post("/evento/bulk/", response=List[EventoVentaSchema])
+@en_shard(lambda kwargs: shard_comun(Producto, [v.producto_id for v in kwargs['ventas_in']]))
+@idempotente(EventoVentaSchema)
+def create_eventos_venta_bulk(request, ventas_in: List[VentaInSchema]):
+    """
+    Registra varias ventas como eventos con un único INSERT por lote.
+    """
+    _exigir_eventos()
+    productos = Producto.objects.in_bulk({v.producto_id for v in ventas_in})
+    faltan = {v.producto_id for v in ventas_in} - productos.keys()
+    if faltan:
+        raise HttpError(404, f"Producto(s) no encontrado(s): {sorted(faltan)}")
+    with transaction.atomic():
+        return registrar_eventos([_evento(v, productos[v.producto_id]) for v in ventas_in])
+
+
+@router.get("/evento/list/{tienda_id}/", response=List[EventoVentaSchema])
+@por_tienda
+@paginate
+def list_eventos_venta(request, tienda_id: int, pendientes: bool = False):
+    """
+    Ventas individuales del registro de eventos de una tienda, más recientes primero.
+    Con `pendientes` sólo las que aún no se han compactado; las rechazadas por
+    falta de stock llevan `rechazado`. Incluye las archivadas con sus ventas.
+    """
+    if pendientes:
+        # los pendientes nunca se archivan: sólo la tabla viva
+        qs_list = [EventoVenta.visibles.filter(venta__isnull=True, rechazado=False)]
+    else:
+        qs_list = querysets(EventoVenta)
+    return unir([qs.filter(producto__tienda_id=tienda_id) for qs in qs_list]).order_by('-fecha_creacion', '-pk')
+
+
 @router.patch("/update/{venta_id}/", response=VentaSchema)
+@por_objeto('venta.Venta', 'venta_id')
 def update_venta(request, venta_id: int, venta_in: VentaInSchema):
     """
     Update an existing venta.
     """
-    venta = get_object_or_404(Venta, id=venta_id)
+    venta = get_object_or_404(Venta.visibles, id=venta_id)
     updates = venta_in.dict(exclude_unset=True)
+    version = updates.pop('version', None)
     if 'fecha_creacion' in updates and updates['fecha_creacion'] is not None:
         fecha_dt = updates['fecha_creacion']
         if timezone.is_naive(fecha_dt):
             fecha_dt = timezone.make_aware(fecha_dt, timezone.get_default_timezone())
         updates['fecha_creacion'] = fecha_dt
-    for attr, value in updates.items():
-        setattr(venta, attr, value)
-    venta.save()
+    anterior = (venta.producto_id, venta.cantidad)
+    total_anterior = venta.total_precio
+    # el coste de lo vendido sigue a la cantidad: si baja se reduce en proporción;
+    # las unidades añadidas (o todas, si cambia el producto) se valoran al coste medio actual
+    producto_id = updates.get('producto_id', venta.producto_id)
+    cantidad = updates.get('cantidad', venta.cantidad)
+    if producto_id == venta.producto_id and cantidad < venta.cantidad:
+        updates['costo_total'] = (venta.costo_total * cantidad / venta.cantidad).quantize(Decimal('0.01'))
+    elif producto_id != venta.producto_id or cantidad != venta.cantidad:
+        costo_medio = get_object_or_404(Producto, id=producto_id).costo_promedio
+        if producto_id != venta.producto_id:
+            updates['costo_total'] = costo_de_venta(costo_medio, cantidad)
+        else:
+            updates['costo_total'] = venta.costo_total + costo_de_venta(costo_medio, cantidad - venta.cantidad)
+    with transaction.atomic():
+        # sólo se escriben los campos modificados y sólo si nadie cambió la fila entretanto
+        guardar_cambios(venta, updates, version)
+        # revertir el efecto de la fila anterior sobre el stock y aplicar el de la nueva
+        if venta.producto_id == anterior[0]:
+            aplicar_movimiento(venta.producto_id, anterior[1] - venta.cantidad, 'venta', venta.pk)
+        else:
+            aplicar_movimientos([
+                (anterior[0], anterior[1], 'venta', venta.pk),
+                (venta.producto_id, -venta.cantidad, 'venta', venta.pk),
+            ])
+        publicar_operacion('venta', venta, venta.producto.tienda_id, 'actualizada', venta.total_precio - total_anterior)
+        invalidar_pronostico([venta.producto.tienda_id])
     return venta
 
 @router.delete("/delete/{venta_id}/", response={204: None})
+@por_objeto('venta.Venta', 'venta_id')
 def delete_venta(request, venta_id: int):
     """
     Delete a venta by its ID.
     """
-    venta = get_object_or_404(Venta, id=venta_id)
-    venta.delete()
+    venta = get_object_or_404(Venta.visibles, id=venta_id)
+    with transaction.atomic():
+        # devolver al stock las unidades vendidas
+        aplicar_movimiento(venta.producto_id, venta.cantidad, 'venta', venta.pk)
+        registrar_eliminaciones('venta', [(venta.pk, venta.producto.tienda_id)])
+        publicar_operacion('venta', venta, venta.producto.tienda_id, 'eliminada', -venta.total_precio)
+        invalidar_pronostico([venta.producto.tienda_id])
+        venta.delete()
     return 204
 
 
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from venta.registro import LOTE_COMPACTACION, CompactacionConcurrente, compactar_todo
+
+
+class Command(BaseCommand):
+    help = "Compacta los eventos de venta pendientes en las filas diarias de venta y en el stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=LOTE_COMPACTACION, help="Eventos por transacción.")
+        parser.add_argument('--loop', type=float, default=0, help="Repetir cada N segundos (0 = una sola pasada).")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                compactados = compactar_todo(options['limite'])
+            except CompactacionConcurrente:
+                compactados = 0
+                self.stderr.write("Otro compactador tomó el lote; se reintenta.")
+            if compactados or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"{compactados} eventos de venta compactados"))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0007_sync_indices'),
+        ('venta', '0002_rename_created_at_venta_fecha_creacion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['ultima_actualicacion', 'id'], name='venta_sync'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0009_bajo_stock'),
+        ('venta', '0004_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['producto', 'fecha_creacion', 'cantidad'], name='venta_serie_producto'),
+        ),
+    ]
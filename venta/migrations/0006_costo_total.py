@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:59
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def calcular_costos(apps, schema_editor):
+    # datos existentes: coste medio = total comprado / unidades compradas,
+    # y el coste de cada venta a ese coste medio
+    Producto = apps.get_model('producto', 'Producto')
+    Compra = apps.get_model('compra', 'Compra')
+    Venta = apps.get_model('venta', 'Venta')
+
+    costos = {}
+    totales = Compra.objects.order_by().values('producto_id').annotate(unidades=Sum('cantidad'), total=Sum('total_precio'))
+    for fila in totales:
+        if fila['unidades']:
+            costos[fila['producto_id']] = (Decimal(fila['total']) / fila['unidades']).quantize(Decimal('0.0001'))
+    productos = list(Producto.objects.filter(pk__in=costos.keys()))
+    for producto in productos:
+        producto.costo_promedio = costos[producto.pk]
+    Producto.objects.bulk_update(productos, ['costo_promedio'], batch_size=500)
+
+    ventas = list(Venta.objects.filter(producto_id__in=costos.keys()))
+    for venta in ventas:
+        venta.costo_total = (costos[venta.producto_id] * venta.cantidad).quantize(Decimal('0.01'))
+    Venta.objects.bulk_update(ventas, ['costo_total'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venta', '0005_serie_producto'),
+        ('producto', '0010_costo_promedio'),
+        ('compra', '0004_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='costo_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(calcular_costos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producto', '0010_costo_promedio'),
+        ('venta', '0006_costo_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoVenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('total_precio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('costo_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fecha_creacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos_venta', to='producto.producto')),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='venta.venta')),
+            ],
+            options={
+                'db_table': 'eventos_venta',
+                'indexes': [models.Index(condition=models.Q(('venta__isnull', True)), fields=['id'], name='evento_venta_pendiente'), models.Index(fields=['producto', 'fecha_creacion'], name='evento_venta_producto')],
+            },
+        ),
+    ]
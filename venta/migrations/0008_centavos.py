@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:33
+
+import re
+
+import base_app.models
+from django.db import migrations
+
+A_CENTAVOS = "CAST(ROUND({c} * 100) AS INTEGER)"
+A_DECIMAL = "ROUND({c} / 100.0, 2)"
+
+
+def _escalar(schema_editor, tabla, columnas, expresion):
+    # la tabla viva y sus tablas de archivo por año (base_app/archivo.py)
+    conexion = schema_editor.connection
+    q = conexion.ops.quote_name
+    patron = re.compile(rf"^{tabla}(_archivo_\d{{4}})?$")
+    with conexion.cursor() as cursor:
+        for nombre in conexion.introspection.table_names(cursor):
+            if patron.match(nombre):
+                asignaciones = ', '.join(f"{q(c)} = {expresion.format(c=q(c))}" for c in columnas)
+                cursor.execute(f"UPDATE {q(nombre)} SET {asignaciones}")
+
+
+def a_centavos(apps, schema_editor):
+    for tabla in ('ventas', 'eventos_venta'):
+        _escalar(schema_editor, tabla, ['total_precio', 'costo_total'], A_CENTAVOS)
+
+
+def a_decimal(apps, schema_editor):
+    for tabla in ('ventas', 'eventos_venta'):
+        _escalar(schema_editor, tabla, ['total_precio', 'costo_total'], A_DECIMAL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venta', '0007_eventoventa'),
+    ]
+
+    operations = [
+        # primero los valores (a céntimos) y después el tipo de las columnas
+        migrations.RunPython(a_centavos, a_decimal),
+        migrations.AlterField(
+            model_name='eventoventa',
+            name='costo_total',
+            field=base_app.models.CentavosField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='eventoventa',
+            name='total_precio',
+            field=base_app.models.CentavosField(),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='costo_total',
+            field=base_app.models.CentavosField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='total_precio',
+            field=base_app.models.CentavosField(),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venta', '0008_centavos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventoventa',
+            name='rechazado',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,11 +1,54 @@
 from django.db import models
-from base_app.models import BaseModel
+from django.db.models import Q
+from django.utils import timezone
+from base_app.models import BaseModel, CentavosField, VisiblesManager
 from producto.models import Producto
 # Create your models here.
 class Venta(BaseModel):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas')
     cantidad = models.PositiveIntegerField()
-    total_precio = models.DecimalField(max_digits=10, decimal_places=2)
+    total_precio = CentavosField()
+    # coste de lo vendido (al coste medio del producto en el momento de cada venta)
+    costo_total = CentavosField(default=0)
+    # control de concurrencia optimista en las actualizaciones de la fila diaria
+    version = models.PositiveIntegerField(default=0)
+
+    # manager por defecto sin filtro: las escrituras por pk no cruzan con productos
+    objects = models.Manager()
+    # listados e informes: sin las filas de productos pendientes de borrado
+    visibles = VisiblesManager('producto__eliminado')
 
     class Meta:
         db_table = 'ventas'
+        indexes = [
+            models.Index(fields=['ultima_actualicacion', 'id'], name='venta_sync'),
+            # serie diaria por producto del pronóstico de demanda (índice cubriente)
+            models.Index(fields=['producto', 'fecha_creacion', 'cantidad'], name='venta_serie_producto'),
+        ]
+
+
+class EventoVenta(models.Model):
+    """
+    Venta individual del registro append-only (VENTAS_EVENTOS). Registrarla es
+    un único INSERT; el compactador (venta/registro.py) la suma después a la
+    fila diaria de `Venta` y al stock, y enlaza aquí esa fila.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='eventos_venta')
+    cantidad = models.PositiveIntegerField()
+    total_precio = CentavosField()
+    costo_total = CentavosField(default=0)
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    # fila diaria en la que se compactó; None = pendiente
+    venta = models.ForeignKey(Venta, on_delete=models.CASCADE, null=True, blank=True, related_name='eventos')
+    # no había stock al compactarlo: sale de los pendientes sin sumarse a nada
+    rechazado = models.BooleanField(default=False)
+
+    objects = models.Manager()
+    visibles = VisiblesManager('producto__eliminado')
+
+    class Meta:
+        db_table = 'eventos_venta'
+        indexes = [
+            models.Index(fields=['id'], condition=Q(venta__isnull=True), name='evento_venta_pendiente'),
+            models.Index(fields=['producto', 'fecha_creacion'], name='evento_venta_producto'),
+        ]
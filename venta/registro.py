@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Value
+from django.utils import timezone
+
+from base_app.eventos import publicar_operacion
+from base_app.models import CentavosField
+from base_app.shards import atomico, todos, usar_shard
+from producto.pronostico import invalidar_pronostico
+from producto.stock import StockInsuficiente, aplicar_movimientos
+from .models import EventoVenta, Venta
+
+logger = logging.getLogger(__name__)
+
+# eventos compactados por transacción
+LOTE_COMPACTACION = 5000
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+class CompactacionConcurrente(Exception):
+    """Otro compactador reclamó parte del lote; se deshace y se reintenta."""
+
+
+def eventos_activos() -> bool:
+    return getattr(settings, 'VENTAS_EVENTOS', False)
+
+
+def sumar_a_fila(venta_id: int, cantidad: int, total: Decimal, costo: Decimal):
+    """
+    Suma a la fila diaria con un UPDATE atómico (F()) para no perder
+    incrementos de peticiones concurrentes.
+    """
+    Venta.objects.filter(pk=venta_id).update(
+        cantidad=F('cantidad') + cantidad,
+        # los importes se guardan en céntimos: el Value los convierte
+        total_precio=F('total_precio') + Value(total, output_field=CentavosField()),
+        costo_total=F('costo_total') + Value(costo, output_field=CentavosField()),
+        version=F('version') + 1,
+        ultima_actualicacion=timezone.now(),
+    )
+
+
+def registrar_eventos(eventos: Iterable[EventoVenta]) -> list:
+    """
+    Guarda las ventas en el registro append-only (un INSERT, sin tocar la fila
+    diaria ni el stock) y arranca el compactador en segundo plano si procede.
+    """
+    creados = EventoVenta.objects.bulk_create(list(eventos), batch_size=1000)
+    transaction.on_commit(iniciar_compactador)
+    return creados
+
+
+def pendientes(tienda_id: int = None):
+    """
+    Eventos aún no compactados (ni rechazados); súmense a `Venta` para leer
+    totales al día.
+    """
+    qs = EventoVenta.visibles.filter(venta__isnull=True, rechazado=False)
+    if tienda_id is not None:
+        qs = qs.filter(producto__tienda_id=tienda_id)
+    return qs
+
+
+def _agrupar(eventos: list) -> dict:
+    """
+    Totales de eventos de un mismo producto y día; la fila nueva toma la fecha
+    del primero.
+    """
+    grupo = {'ids': [], 'cantidad': 0, 'total': Decimal('0'), 'costo': Decimal('0'), 'fecha': eventos[0][6]}
+    for pk, _pid, _tienda_id, cantidad, total, costo, _fecha in eventos:
+        grupo['ids'].append(pk)
+        grupo['cantidad'] += cantidad
+        grupo['total'] += total
+        grupo['costo'] += costo
+    return grupo
+
+
+def _plegar(pid: int, dia, grupo: dict) -> Tuple[int, str]:
+    """
+    Suma el grupo a la fila diaria del producto (creándola si no existe), enlaza
+    sus eventos y descuenta el stock. Devuelve (id de la fila, acción).
+    Lanza StockInsuficiente si no quedan unidades para todo el grupo.
+    """
+    venta = Venta.objects.filter(producto_id=pid, fecha_creacion__date=dia).first()
+    if venta:
+        sumar_a_fila(venta.pk, grupo['cantidad'], grupo['total'], grupo['costo'])
+        accion = 'actualizada'
+    else:
+        venta = Venta.objects.create(
+            producto_id=pid,
+            cantidad=grupo['cantidad'],
+            total_precio=grupo['total'],
+            costo_total=grupo['costo'],
+        )
+        # auto_now_add ignora el valor en create(): fecha del primer evento
+        Venta.objects.filter(pk=venta.pk).update(fecha_creacion=grupo['fecha'])
+        accion = 'creada'
+    reclamados = EventoVenta.objects.filter(pk__in=grupo['ids'], venta__isnull=True, rechazado=False).update(venta=venta)
+    if reclamados != len(grupo['ids']):
+        raise CompactacionConcurrente("eventos de venta compactados por otro proceso")
+    aplicar_movimientos([(pid, -grupo['cantidad'], 'venta', venta.pk)])
+    return venta.pk, accion
+
+
+def compactar_eventos(limite: int = LOTE_COMPACTACION) -> int:
+    """
+    Pliega hasta `limite` eventos pendientes (los más antiguos) en las filas
+    diarias de `Venta` por (producto, día local) y descuenta el stock, todo en
+    una transacción. Devuelve cuántos eventos salieron de los pendientes.
+
+    Cada grupo se aplica en su propio savepoint: si no hay stock para el grupo
+    entero se reintenta evento a evento y los que no caben se marcan como
+    rechazados, de modo que una venta imposible no bloquea la compactación del
+    resto del registro.
+
+    Los eventos se reclaman con un UPDATE condicionado a `venta IS NULL`: si
+    otro compactador se adelantó, la transacción se deshace y no se cuenta dos
+    veces ninguna venta.
+    """
+    with atomico():
+        eventos = list(
+            pendientes().order_by('pk')
+            .values_list('pk', 'producto_id', 'producto__tienda_id', 'cantidad', 'total_precio', 'costo_total', 'fecha_creacion')[:limite]
+        )
+        if not eventos:
+            return 0
+
+        por_dia: Dict[Tuple[int, object], list] = {}
+        for evento in eventos:
+            por_dia.setdefault((evento[1], timezone.localdate(evento[6])), []).append(evento)
+
+        filas = {}
+        acciones = {}
+        totales = {}
+        tiendas = {}
+        rechazados = []
+        for (pid, dia), del_dia in por_dia.items():
+            key = (pid, dia)
+            grupo = _agrupar(del_dia)
+            try:
+                with atomico():
+                    filas[key], acciones[key] = _plegar(pid, dia, grupo)
+                totales[key] = grupo['total']
+            except StockInsuficiente:
+                # el grupo no cabe entero: evento a evento, en orden de llegada
+                for evento in del_dia:
+                    grupo = _agrupar([evento])
+                    try:
+                        with atomico():
+                            filas[key], accion = _plegar(pid, dia, grupo)
+                    except StockInsuficiente:
+                        rechazados.append(evento[0])
+                        continue
+                    acciones.setdefault(key, accion)
+                    totales[key] = totales.get(key, Decimal('0')) + grupo['total']
+            if key in filas:
+                tiendas[key] = del_dia[0][2]
+
+        if rechazados:
+            EventoVenta.objects.filter(pk__in=rechazados).update(rechazado=True)
+            logger.warning("Eventos de venta rechazados por falta de stock: %s", rechazados)
+
+        frescas = Venta.objects.in_bulk(filas.values())
+        for key, venta_id in filas.items():
+            publicar_operacion('venta', frescas[venta_id], tiendas[key], acciones[key], totales[key])
+        invalidar_pronostico(tiendas.values())
+    return len(eventos)
+
+
+def compactar_todo(limite: int = LOTE_COMPACTACION) -> int:
+    """
+    Compacta por lotes hasta vaciar el registro (de cada shard).
+    """
+    total = 0
+    for alias in todos():
+        with usar_shard(alias):
+            while True:
+                n = compactar_eventos(limite)
+                total += n
+                if n < limite:
+                    break
+    return total
+
+
+def _bucle(intervalo: float):
+    while True:
+        time.sleep(intervalo)
+        try:
+            compactar_todo()
+        except CompactacionConcurrente:
+            pass  # se reintenta en la próxima vuelta
+        except Exception:
+            logger.exception("Error compactando eventos de venta")
+        finally:
+            connections.close_all()
+
+
+def iniciar_compactador():
+    """
+    Arranca (una vez por proceso) el hilo que compacta el registro cada
+    VENTAS_EVENTOS_COMPACTAR_SEGUNDOS. Con 0 el hilo no se usa y la
+    compactación queda a cargo de `manage.py compactar_ventas`.
+    """
+    global _hilo
+    intervalo = getattr(settings, 'VENTAS_EVENTOS_COMPACTAR_SEGUNDOS', 5)
+    if not intervalo or intervalo <= 0:
+        return
+    with _hilo_lock:
+        if _hilo is not None and _hilo.is_alive():
+            return
+        _hilo = threading.Thread(target=_bucle, args=(intervalo,), name='compactador-ventas', daemon=True)
+        _hilo.start()
+
@@ -1,8 +1,10 @@
 from ninja import Schema,ModelSchema
 from tienda.models import Tienda
 from typing import Optional
+from decimal import Decimal
 from datetime import datetime
-from .models import Venta
+import base_app.schemas  # noqa: F401  (registra CentavosField en ninja)
+from .models import EventoVenta, Venta
 from producto.models import Producto
 
 class VentaSchema(ModelSchema):
@@ -18,11 +20,17 @@ class VentaSchema(ModelSchema):
     def resolve_producto_imagen(venta: Venta) -> Optional[str]:
         return venta.producto.imagen if venta.producto else None
 
+class EventoVentaSchema(ModelSchema):
+    class Meta:
+        model=EventoVenta
+        fields='__all__'
+
 class VentaInSchema(Schema):
     producto_id: int
     cantidad: int
-    total_precio: Optional[float] = 0.0
+    total_precio: Optional[Decimal] = None  # sin él: precio del producto por la cantidad
     fecha_creacion: Optional[datetime] = None  # Opcional: fecha/hora para asignar en creación
+    version: Optional[int] = None  # la leída por el cliente, para detectar conflictos al actualizar
 
 class SimpleVentaSchema(Schema):
     id: int
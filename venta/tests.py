@@ -1,3 +1,271 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from base_app.archivo import anos_archivados, modelo_archivo, querysets
+from base_app.models import ClaveIdempotencia
+from base_app.testing import ApiTestCase, ApiTransactionTestCase, Presupuesto, PresupuestoConsultasTestCase
+from producto.models import MovimientoStock, Producto
+from tienda.models import Tienda
+
+from .models import EventoVenta, Venta
+from .registro import compactar_eventos, pendientes, sumar_a_fila
+
+
+def _huella_venta(producto_id, cantidad):
+    cuerpo = json.dumps({'producto_id': producto_id, 'cantidad': cantidad}).encode()
+    return hashlib.sha256(b'POST' + b'/api/venta/create/' + cuerpo).hexdigest()
+
+
+def _lote(ids, n):
+    return [{'producto_id': ids['producto'] + i, 'cantidad': 1} for i in range(n)]
+
+
+class PresupuestosVentaTest(PresupuestoConsultasTestCase):
+    presupuestos = [
+        Presupuesto('GET', '/api/venta/list/{tienda}/', 3),
+        Presupuesto('GET', '/api/venta/list/{tienda}/?mes=1', 3),
+        Presupuesto('GET', '/api/venta/get/{producto}/', 3),
+        Presupuesto('GET', '/api/venta/export/{tienda}/?desde={desde}&hasta={hoy}', 2),
+        Presupuesto('POST', '/api/venta/create/', 13, datos=lambda ids: {'producto_id': ids['producto'], 'cantidad': 1}),
+        # fijo + una escritura de la fila diaria y una del stock por elemento
+        Presupuesto('POST', '/api/venta/bulk/', 9, datos=_lote, por_elemento=2),
+        Presupuesto('PATCH', '/api/venta/update/{venta}/', 11, datos=lambda ids: {'producto_id': ids['producto'], 'cantidad': 2}),
+        Presupuesto('DELETE', '/api/venta/delete/{venta}/', 12, estado=204),
+    ]
+
+
+class StockVentaTest(ApiTestCase):
+
+    def setUp(self):
+        tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=tienda, nombre="Café", stock=5, precio=Decimal('2.00'))
+
+    def test_vender_mas_que_el_stock_es_conflicto(self):
+        respuesta = self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 6})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_aumentar_venta_por_encima_del_stock_es_conflicto(self):
+        venta = self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 2}).json()
+        respuesta = self.api('PATCH', f"/api/venta/update/{venta['id']}/", {'producto_id': self.producto.pk, 'cantidad': 9})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(Venta.objects.get(pk=venta['id']).cantidad, 2)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 3)
+
+    def test_borrar_venta_devuelve_el_stock(self):
+        venta = self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 2}).json()
+        self.assertEqual(self.api('DELETE', f"/api/venta/delete/{venta['id']}/").status_code, 204)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 5)
+        self.assertEqual(list(MovimientoStock.objects.filter(producto=self.producto).values_list('delta', flat=True)), [-2, 2])
+
+
+class VentasVisiblesTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=5, precio=Decimal('2.00'))
+        self.venta = self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': 1}).json()
+
+    def test_sumar_a_fila_no_cruza_con_productos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            sumar_a_fila(self.venta['id'], 1, Decimal('2.00'), Decimal('0'))
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('productos', consultas[0]['sql'])
+
+    def test_producto_pendiente_de_borrado_oculta_sus_ventas(self):
+        Producto._base_manager.filter(pk=self.producto.pk).update(eliminado=True)
+        self.assertEqual(self.api('GET', f'/api/venta/list/{self.tienda.pk}/').json()['count'], 0)
+        self.assertEqual(self.api('DELETE', f"/api/venta/delete/{self.venta['id']}/").status_code, 404)
+        # el borrador y las escrituras siguen viéndolas
+        self.assertTrue(Venta.objects.filter(pk=self.venta['id']).exists())
+
+
+class IdempotenciaVentaTest(ApiTestCase):
+
+    def setUp(self):
+        tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=tienda, nombre="Café", stock=5, precio=Decimal('2.00'))
+
+    def vender(self, cantidad, clave='clave-1', **extra):
+        return self.api('POST', '/api/venta/create/', {'producto_id': self.producto.pk, 'cantidad': cantidad}, HTTP_IDEMPOTENCY_KEY=clave, **extra)
+
+    def stock(self):
+        self.producto.refresh_from_db()
+        return self.producto.stock
+
+    def test_repeticion_devuelve_la_respuesta_guardada(self):
+        primera = self.vender(2)
+        repetida = self.vender(2)
+        self.assertEqual(repetida.status_code, 200)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertEqual(self.stock(), 3)
+
+    def test_misma_clave_con_otro_cuerpo(self):
+        self.vender(2)
+        self.assertEqual(self.vender(1).status_code, 422)
+
+    def test_peticion_en_curso(self):
+        ClaveIdempotencia.objects.create(llamante='ip:127.0.0.1', clave='clave-1', ruta='/api/venta/create/', huella='x', expira=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.vender(2).status_code, 422)
+        ClaveIdempotencia.objects.update(huella=_huella_venta(self.producto.pk, 2))
+        self.assertEqual(self.vender(2).status_code, 409)
+        self.assertEqual(self.stock(), 5)
+
+    def test_fallo_libera_la_clave(self):
+        self.assertEqual(self.vender(9).status_code, 409)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+        Producto.objects.filter(pk=self.producto.pk).update(stock=10)
+        self.assertEqual(self.vender(9).status_code, 200)
+        self.assertEqual(self.stock(), 1)
+
+    def test_claves_por_llamante(self):
+        self.vender(2)
+        otra = self.vender(2, REMOTE_ADDR='10.0.0.2')
+        self.assertFalse(otra.has_header('Idempotent-Replayed'))
+        self.assertEqual(self.stock(), 1)
+
+
+class ExportVentasTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        producto = Producto.objects.create(tienda=self.tienda, nombre="Café, molido", stock=10, precio=Decimal('2.00'))
+        otra = Producto.objects.create(tienda=Tienda.objects.create(nombre="Otra"), nombre="Té", stock=10, precio=Decimal('1.00'))
+        self.hoy = Venta.objects.create(producto=producto, cantidad=2, total_precio=Decimal('4.00'))
+        antigua = Venta.objects.create(producto=producto, cantidad=1, total_precio=Decimal('2.00'))
+        Venta.objects.filter(pk=antigua.pk).update(fecha_creacion=timezone.now() - timedelta(days=10))
+        Venta.objects.create(producto=otra, cantidad=1, total_precio=Decimal('1.00'))
+
+    def exportar(self, **datos):
+        hoy = timezone.localdate().isoformat()
+        return self.api('GET', f'/api/venta/export/{self.tienda.pk}/', {'desde': hoy, 'hasta': hoy, **datos})
+
+    def test_csv_del_rango_y_la_tienda(self):
+        respuesta = self.exportar()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        filas = list(csv.reader(io.StringIO(respuesta.contenido.decode('utf-8-sig'))))
+        self.assertEqual(filas[0], ['id', 'fecha', 'producto_id', 'producto', 'cantidad', 'total_precio'])
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][0], str(self.hoy.pk))
+        self.assertEqual(filas[1][3:], ['Café, molido', '2', '4.00'])
+
+    def test_rango_invertido(self):
+        ayer = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.exportar(hasta=ayer).status_code, 400)
+
+
+@override_settings(VENTAS_EVENTOS=True)
+class EventosVentaTest(ApiTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=10, precio=Decimal('2.00'))
+        self.api('POST', '/api/venta/evento/', {'producto_id': self.producto.pk, 'cantidad': 1})
+        self.api('POST', '/api/venta/evento/bulk/', [{'producto_id': self.producto.pk, 'cantidad': 2}] * 2)
+
+    def ganancia(self):
+        return self.api('GET', f'/api/dashboard/profit/{self.tienda.pk}/', {'period': 'today'}).json()['ventas_total']
+
+    def test_compactacion_en_la_fila_diaria(self):
+        self.assertFalse(Venta.objects.exists())
+        # los eventos pendientes ya cuentan en los totales
+        self.assertEqual(self.ganancia(), '10.00')
+        self.assertEqual(compactar_eventos(), 3)
+        venta = Venta.objects.get()
+        self.assertEqual((venta.cantidad, venta.total_precio), (5, Decimal('10.00')))
+        self.assertEqual(EventoVenta.objects.filter(venta=venta).count(), 3)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 5)
+        self.assertEqual(self.ganancia(), '10.00')
+        # nada pendiente: una segunda pasada no vuelve a contarlos
+        self.assertEqual(compactar_eventos(), 0)
+        self.assertEqual(Venta.objects.get().cantidad, 5)
+
+    def test_suma_a_la_fila_del_dia_existente(self):
+        compactar_eventos()
+        self.api('POST', '/api/venta/evento/', {'producto_id': self.producto.pk, 'cantidad': 1})
+        compactar_eventos()
+        self.assertEqual(list(Venta.objects.values_list('cantidad', flat=True)), [6])
+
+    def test_evento_sin_stock_no_bloquea_al_resto(self):
+        imposible = self.api('POST', '/api/venta/evento/', {'producto_id': self.producto.pk, 'cantidad': 100}).json()['id']
+        self.api('POST', '/api/venta/evento/', {'producto_id': self.producto.pk, 'cantidad': 1})
+        with self.assertLogs('venta.registro', 'WARNING') as registro:
+            self.assertEqual(compactar_eventos(), 5)
+        self.assertIn(str(imposible), registro.output[0])
+        # el resto del día se compacta y el evento imposible sale de los pendientes
+        self.assertEqual(list(Venta.objects.values_list('cantidad', flat=True)), [6])
+        self.assertTrue(EventoVenta.objects.get(pk=imposible).rechazado)
+        self.assertFalse(pendientes().exists())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 4)
+        self.assertEqual(self.ganancia(), '12.00')
+        # los eventos que llegan después se siguen compactando
+        self.api('POST', '/api/venta/evento/', {'producto_id': self.producto.pk, 'cantidad': 1})
+        self.assertEqual(compactar_eventos(), 1)
+        self.assertEqual(Venta.objects.get().cantidad, 7)
+
+
+class ArchivoVentasTest(ApiTransactionTestCase):
+
+    def setUp(self):
+        self.tienda = Tienda.objects.create(nombre="Tienda")
+        self.producto = Producto.objects.create(tienda=self.tienda, nombre="Café", stock=0, precio=Decimal('2.00'))
+        self.antigua = Venta.objects.create(producto=self.producto, cantidad=1, total_precio=Decimal('2.00'))
+        Venta.objects.filter(pk=self.antigua.pk).update(fecha_creacion=datetime(2020, 6, 1, 12, tzinfo=dt_timezone.utc))
+        self.reciente = Venta.objects.create(producto=self.producto, cantidad=2, total_precio=Decimal('4.00'))
+        self.addCleanup(self.borrar_archivo)
+
+    def borrar_archivo(self):
+        with connection.schema_editor() as editor:
+            for modelo in (Venta, EventoVenta):
+                if 2020 in anos_archivados(modelo):
+                    editor.delete_model(modelo_archivo(modelo, 2020))
+
+    def listar(self, **filtros):
+        return [v['id'] for v in self.api('GET', f'/api/venta/list/{self.tienda.pk}/', filtros).json()['items']]
+
+    def test_lecturas_unen_el_archivo(self):
+        call_command('archivar', dias=365, tabla='ventas', stdout=io.StringIO())
+        self.assertEqual(list(Venta.objects.values_list('pk', flat=True)), [self.reciente.pk])
+        self.assertEqual(list(modelo_archivo(Venta, 2020).objects.values_list('pk', flat=True)), [self.antigua.pk])
+        self.assertEqual(self.listar(), [self.reciente.pk, self.antigua.pk])
+        self.assertEqual(self.listar(ano=2020), [self.antigua.pk])
+        exportada = self.api('GET', f'/api/venta/export/{self.tienda.pk}/', {'desde': '2020-01-01', 'hasta': '2020-12-31'})
+        self.assertEqual(exportada.contenido.decode('utf-8-sig').splitlines()[1].split(',')[0], str(self.antigua.pk))
+        # las consultas del año en curso no tocan el archivo
+        self.assertEqual(len(querysets(Venta, timezone.now(), timezone.now())), 1)
+
+    def test_top_store_suma_el_archivo(self):
+        # 6 con la venta archivada frente a 5 de la otra tienda; sin ella, 4
+        otra = Producto.objects.create(tienda=Tienda.objects.create(nombre="Otra"), nombre="Té", stock=0)
+        Venta.objects.create(producto=otra, cantidad=1, total_precio=Decimal('5.00'))
+        call_command('archivar', dias=365, tabla='ventas', stdout=io.StringIO())
+        datos = self.api('GET', '/api/dashboard/top-store/').json()
+        self.assertEqual((datos['tienda_id'], datos['balance']), (self.tienda.pk, '6.00'))
+
+    def test_los_eventos_se_archivan_con_su_venta(self):
+        evento = EventoVenta.objects.create(
+            producto=self.producto, cantidad=1, total_precio=Decimal('2.00'), venta=self.antigua,
+            fecha_creacion=datetime(2020, 6, 1, 12, tzinfo=dt_timezone.utc),
+        )
+        call_command('archivar', dias=365, tabla='ventas', stdout=io.StringIO())
+        self.assertFalse(EventoVenta.objects.exists())
+        archivado = modelo_archivo(EventoVenta, 2020).objects.get()
+        self.assertEqual((archivado.pk, archivado.venta_id), (evento.pk, self.antigua.pk))
+        eventos = self.api('GET', f'/api/venta/evento/list/{self.tienda.pk}/').json()['items']
+        self.assertEqual([e['id'] for e in eventos], [evento.pk])